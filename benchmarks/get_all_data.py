@@ -0,0 +1,72 @@
+"""Benchmark loading a whole term at once against per-code lookups."""
+import argparse
+from statistics import median
+from time import perf_counter
+from typing import Callable
+
+from src.history.api import (
+    CourseData,
+    _get_set_of_all_codes,
+    _load_all_data,
+    connection_pool,
+    get_data,
+)
+
+
+def _per_code(year: str, semester: str, ug_gd: str) -> list[CourseData]:
+    """
+    Get data for all courses by calling get_data() once per course code.
+
+    This is how get_all_data() used to assemble its output.
+    """
+    with connection_pool.connection() as conn:
+        codes = sorted(_get_set_of_all_codes(year, semester, ug_gd, conn))
+        return [get_data(year, semester, ug_gd, code, conn) for code in codes]
+
+
+def _bulk(year: str, semester: str, ug_gd: str) -> list[CourseData]:
+    """Get data for all courses with a single query, bypassing the cache."""
+    return _load_all_data(year, semester, ug_gd)
+
+
+def _time(year: str, semester: str, ug_gd: str, repeat: int,
+          fn: Callable[[str, str, str], list[CourseData]]) -> float:
+    """Get the median wall time of a function over a number of runs."""
+    timings = []
+    for _ in range(repeat):
+        start_time = perf_counter()
+        fn(year, semester, ug_gd)
+        timings.append(perf_counter() - start_time)
+    return median(timings)
+
+
+def main() -> None:
+    """Time both ways of loading a term and print the speedup."""
+    parser = argparse.ArgumentParser(
+        description="Benchmark get_all_data() against per-code get_data() calls.")
+    parser.add_argument("--year", "-y", default="2324")
+    parser.add_argument("--semester", "-s", default="1")
+    parser.add_argument("--student-type", "-t", default="ug")
+    parser.add_argument("--repeat", "-n", type=int, default=5)
+    args = parser.parse_args()
+
+    before = _per_code(args.year, args.semester, args.student_type)
+    after = _bulk(args.year, args.semester, args.student_type)
+    if before != after:
+        error_msg = "get_all_data() does not match per-code get_data() calls."
+        raise AssertionError(error_msg)
+
+    before_time = _time(args.year, args.semester, args.student_type,
+                        args.repeat, _per_code)
+    after_time = _time(args.year, args.semester, args.student_type,
+                       args.repeat, _bulk)
+
+    print(f"{len(after)} courses in "  # noqa: T201
+          f"{args.year}/{args.semester}/{args.student_type}")
+    print(f"before (per-code get_data): {before_time * 1000:.1f} ms")  # noqa: T201
+    print(f"after (bulk get_all_data):  {after_time * 1000:.1f} ms")  # noqa: T201
+    print(f"speedup: {before_time / after_time:.1f}x")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
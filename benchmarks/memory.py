@@ -0,0 +1,81 @@
+"""Benchmark the memory held by the course data of a term."""
+import argparse
+import tracemalloc
+from typing import Callable
+
+from src.history.api import BLANK_ROUND, ClassDict, CourseData, _load_all_data
+
+
+def _as_dicts(courses: list[CourseData]) -> list[dict[str, object]]:
+    """
+    Copy course data into the representation used before RoundData.
+
+    Every round is a dict of its own, apart from one blank dict shared by the
+    classes of a course, and no strings are shared between courses.
+    """
+    output: list[dict[str, object]] = []
+    for course in courses:
+        blank = dict(BLANK_ROUND)
+        classes = {
+            _copy(class_name): [blank if round_data is BLANK_ROUND
+                                else dict(round_data)
+                                for round_data in rounds]
+            for class_name, rounds in _get_classes(course).items()}
+        output.append({"faculty": _copy(str(course["faculty"])),
+                       "department": _copy(str(course["department"])),
+                       "code": _copy(str(course["code"])),
+                       "title": _copy(str(course["title"])),
+                       "classes": classes})
+    return output
+
+
+def _copy(string: str) -> str:
+    """Copy a string, as strings read from different rows are not shared."""
+    return "".join(list(string))
+
+
+def _get_classes(course: CourseData) -> ClassDict:
+    """Get the class dict of a course."""
+    classes = course["classes"]
+    if isinstance(classes, str):
+        raise TypeError
+    return classes
+
+
+def _traced_bytes(fn: Callable[[], object]) -> int:
+    """Get the number of bytes still allocated by the result of a function."""
+    tracemalloc.start()
+    result = fn()
+    traced, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return traced
+
+
+def main() -> None:
+    """Measure a cached term with RoundData and with dicts, and print both."""
+    parser = argparse.ArgumentParser(
+        description="Report the memory held by a cached term of get_all_data().")
+    parser.add_argument("--year", "-y", default="2324")
+    parser.add_argument("--semester", "-s", default="1")
+    parser.add_argument("--student-type", "-t", default="ug")
+    args = parser.parse_args()
+
+    def load() -> list[CourseData]:
+        return _load_all_data(args.year, args.semester, args.student_type)
+
+    courses = load()
+    num_classes = sum(len(_get_classes(course)) for course in courses)
+
+    after = _traced_bytes(load)
+    before = _traced_bytes(lambda: _as_dicts(load()))
+
+    print(f"{len(courses)} courses, {num_classes} classes in "  # noqa: T201
+          f"{args.year}/{args.semester}/{args.student_type}")
+    print(f"before (dict per round): {before} bytes per term")  # noqa: T201
+    print(f"after (RoundData):       {after} bytes per term")  # noqa: T201
+    print(f"saved: {1 - after / before:.0%}")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
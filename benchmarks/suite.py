@@ -0,0 +1,139 @@
+"""Benchmark the API and the web page on synthetic databases of any scale."""
+import argparse
+import json
+import platform
+import sqlite3
+from datetime import datetime, timezone
+from pathlib import Path
+from statistics import median
+from time import perf_counter
+from typing import Any, Callable, Union
+
+from benchmarks.synthetic import (
+    generate_database,
+    get_database_path,
+    get_snapshots_dir,
+    use_database,
+)
+from src.history import api
+from src.history.api import (
+    _get_set_of_all_codes,
+    get_all_data,
+    get_data,
+)
+from src.web.app import app
+
+RESULTS_PATH = Path(__file__).resolve().parent / "results" / "latest.json"
+
+# The term every function is timed on
+YEAR, SEMESTER, STUDENT_TYPE = "2324", "1", "ug"
+
+
+def _time(fn: Callable[[], object],
+          repeat: int,
+          *,
+          cold: bool) -> dict[str, Union[int, float]]:
+    """
+    Time a function over a number of runs.
+
+    Args:
+    ----
+        fn (Callable[[], object]): The function to time.
+        repeat (int): The number of runs.
+        cold (bool): Whether to clear the caches of the API before each run.
+            Otherwise, the function is run once before the timed runs.
+
+    Returns:
+    -------
+        dict[str, Union[int, float]]: The runs, and the median and minimum
+            wall time in seconds.
+    """
+    if not cold:
+        fn()
+
+    timings = []
+    for _ in range(repeat):
+        if cold:
+            api.clear_caches()
+        start_time = perf_counter()
+        fn()
+        timings.append(perf_counter() - start_time)
+
+    return {"runs": repeat, "median": median(timings), "min": min(timings)}
+
+
+def run_scale(scale: int, repeat: int) -> list[dict[str, Any]]:
+    """
+    Time the API and a page render on the synthetic database of a scale.
+
+    Args:
+    ----
+        scale (int): The scale of the synthetic database.
+        repeat (int): The number of runs of each measurement.
+
+    Returns:
+    -------
+        list[dict[str, Any]]: A result for each function and state.
+    """
+    client = app.test_client()
+    form = {"year": YEAR, "semester": SEMESTER, "type": STUDENT_TYPE}
+
+    with use_database(get_database_path(scale)):
+        codes = sorted(_get_set_of_all_codes(YEAR, SEMESTER, STUDENT_TYPE))
+        code = codes[len(codes) // 2]
+
+        benchmarks: dict[str, Callable[[], object]] = {
+            "get_data": lambda: get_data(YEAR, SEMESTER, STUDENT_TYPE, code),
+            "get_all_data": lambda: get_all_data(YEAR, SEMESTER, STUDENT_TYPE),
+            "_get_set_of_all_codes": lambda: _get_set_of_all_codes(
+                YEAR, SEMESTER, STUDENT_TYPE),
+            "render_page": lambda: client.post("/", data=form).get_data(),
+        }
+
+        return [{"scale": scale,
+                 "courses_per_term": len(codes),
+                 "function": name,
+                 "state": state,
+                 **_time(fn, repeat, cold=state == "cold")}
+                for name, fn in benchmarks.items()
+                for state in ("cold", "warm")]
+
+
+def main() -> None:
+    """Run the benchmarks at each scale and save the results."""
+    parser = argparse.ArgumentParser(
+        description="Benchmark the API and the web page on synthetic databases.")
+    parser.add_argument("--scales", "-s", type=int, nargs="+", default=[1, 10, 100],
+                        help="Multiples of today's number of courses per term.")
+    parser.add_argument("--repeat", "-n", type=int, default=5)
+    parser.add_argument("--output", "-o", type=Path, default=RESULTS_PATH,
+                        help="JSON file to write the results to.")
+    parser.add_argument("--regenerate", action="store_true",
+                        help="Regenerate the synthetic databases if they exist.")
+    args = parser.parse_args()
+
+    results = []
+    for scale in args.scales:
+        path = get_database_path(scale)
+        # The snapshots are written last, so databases built by an older
+        # version of the generator, or interrupted, are regenerated
+        manifest_path = get_snapshots_dir(path) / "manifest.json"
+        if args.regenerate or not manifest_path.exists():
+            generate_database(path, scale)
+
+        for result in run_scale(scale, args.repeat):
+            print(f"{result['scale']}x {result['function']} "  # noqa: T201
+                  f"({result['state']}): {result['median'] * 1000:.2f} ms")
+            results.append(result)
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps({
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "results": results,
+    }, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
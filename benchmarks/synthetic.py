@@ -0,0 +1,251 @@
+"""Generate synthetic databases of any scale for the benchmarks."""
+import argparse
+import random
+import sqlite3
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+from src.history import api
+from src.history.analytics import write_analytics
+from src.history.api import (
+    INF,
+    NA,
+    ConnectionPool,
+    TermDataCache,
+    get_default_round_numbers,
+)
+from src.history.catalog import write_catalog
+from src.history.merge_db import (
+    create_deltas,
+    create_rankings,
+    create_search_index,
+    create_tables,
+)
+from src.history.payloads import write_payloads
+from src.history.snapshots import create_snapshots
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+
+# Roughly the size of database.db at 1x: 5 academic years of 2 semesters for
+# undergraduates and graduates, with about 2000 courses in each term
+YEARS = ("2122", "2223", "2324", "2425", "2526")
+SEMESTERS = ("1", "2")
+STUDENT_TYPES = ("ug", "gd")
+COURSES_PER_TERM = 2000
+
+FACULTIES = (
+    ("School of Computing", "Computer Science", ("CS", "IS", "IT")),
+    ("Faculty of Science", "Mathematics", ("MA", "ST", "QF")),
+    ("Faculty of Science", "Chemistry", ("CM", "LSM", "PC")),
+    ("College of Design and Engineering", "Electrical and Computer Engineering",
+     ("EE", "CG", "ME")),
+    ("NUS Business School", "Strategy and Policy", ("BSP", "ACC", "FIN")),
+    ("Faculty of Law", "FoL Dean's Office", ("LL", "LC")),
+    ("Faculty of Arts and Social Science", "Economics", ("EC", "PS", "SC")),
+)
+SUFFIXES = ("", "", "", "", "S", "X", "A", "T")
+
+# Probabilities of a course missing a round, of a class missing its
+# forecast (NA), and of a class having unlimited vacancies (INF)
+MISSING_ROUND_RATE = 0.1
+MISSING_FORECAST_RATE = 0.2
+UNLIMITED_VACANCY_RATE = 0.1
+
+
+def get_database_path(scale: int) -> Path:
+    """Get the path of the synthetic database of a scale."""
+    return DATA_DIR / f"synthetic_{scale}x.db"
+
+
+def get_snapshots_dir(path: Path) -> Path:
+    """Get the directory of the snapshots of a synthetic database."""
+    return path.with_name(f"{path.stem}_snapshots")
+
+
+@contextmanager
+def use_database(path: Path) -> Iterator[None]:
+    """Point the API, and so the web app, at another database."""
+    pool, cache = api.connection_pool, api.term_data_cache
+    database_path, snapshots_dir = api.DATABASE_PATH, api.SNAPSHOTS_DIR
+    api.connection_pool = ConnectionPool(path)
+    api.term_data_cache = TermDataCache(path)
+    api.DATABASE_PATH = path
+    api.SNAPSHOTS_DIR = get_snapshots_dir(path)
+    api.clear_caches()
+    try:
+        yield
+    finally:
+        api.connection_pool.close()
+        api.connection_pool, api.term_data_cache = pool, cache
+        api.DATABASE_PATH, api.SNAPSHOTS_DIR = database_path, snapshots_dir
+        api.clear_caches()
+
+
+def _generate_courses(scale: int,
+                      rng: random.Random) -> list[tuple[int, str, str, str, str]]:
+    """
+    Generate the rows of the courses table.
+
+    Args:
+    ----
+        scale (int): The multiple of COURSES_PER_TERM to generate.
+        rng (random.Random): The source of randomness.
+
+    Returns:
+    -------
+        list[tuple[int, str, str, str, str]]: The Course_Id, Code, Faculty,
+            Department and Title of each course, sorted by code.
+    """
+    prefixes = [(faculty, department, prefix)
+                for faculty, department, faculty_prefixes in FACULTIES
+                for prefix in faculty_prefixes]
+
+    codes = {}
+    for index in range(COURSES_PER_TERM * scale):
+        faculty, department, prefix = prefixes[index % len(prefixes)]
+        number = 1000 + index // len(prefixes)
+        code = f"{prefix}{number}{rng.choice(SUFFIXES)}"
+        codes[code] = (faculty, department, f"Synthetic {department} {number}")
+
+    return [(course_id, code, *codes[code])
+            for course_id, code in enumerate(sorted(codes), start=1)]
+
+
+def _generate_term(courses: list[tuple[int, str, str, str, str]],
+                   year: str,
+                   semester: str,
+                   student_type: str,
+                   rng: random.Random) -> list[tuple[object, ...]]:
+    """
+    Generate the merged rows of a term, in the order of the primary key.
+
+    Args:
+    ----
+        courses (list[tuple[int, str, str, str, str]]): The courses.
+        year (str): The academic year.
+        semester (str): The semester.
+        student_type (str): The student type.
+        rng (random.Random): The source of randomness.
+
+    Returns:
+    -------
+        list[tuple[object, ...]]: The rows of the merged table.
+    """
+    rows: list[tuple[object, ...]] = []
+    for course_id, code, *_ in courses:
+        classes = [f"L{number}" for number in range(1, rng.randint(2, 4))]
+        for round_number in get_default_round_numbers(year):
+            # Not every course is offered in every round
+            if rng.random() < MISSING_ROUND_RATE:
+                continue
+            for class_name in classes:
+                if rng.random() < MISSING_FORECAST_RATE:
+                    forecast = [NA] * 5
+                else:
+                    forecast = [rng.randint(0, 200) for _ in range(5)]
+                vacancy = (INF if rng.random() < UNLIMITED_VACANCY_RATE
+                           else rng.randint(0, 300))
+                demand = rng.randint(0, 400)
+                successful = min(demand, 300)
+                rows.append((year, semester, student_type, code, round_number,
+                             class_name, course_id, *forecast, vacancy, demand,
+                             successful, rng.randint(0, 3),
+                             max(0, demand - successful), rng.randint(0, 5),
+                             rng.randint(0, 2), rng.randint(0, 2)))
+    return rows
+
+
+def generate_database(path: Path, scale: int, seed: int = 0) -> None:
+    """
+    Generate a synthetic database with the layout of database.db.
+
+    The merged and courses tables are generated, then every later table
+    (catalog, rankings, deltas, full-text search index, payloads and
+    analytics) and the snapshots are created by the same stages as the
+    build, in the same order. Each term has COURSES_PER_TERM
+    times scale courses. One term is generated, then copied into the others
+    in SQL, with the demand shifted, which keeps even 100x quick to build.
+
+    Args:
+    ----
+        path (Path): The path of the database to create. It is replaced if
+            it exists.
+        scale (int): The multiple of today's number of courses per term.
+        seed (int): The seed of the random numbers.
+    """
+    rng = random.Random(seed)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.unlink(missing_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+
+    create_tables(conn)
+
+    courses = _generate_courses(scale, rng)
+    conn.executemany("INSERT INTO courses VALUES (?, ?, ?, ?, ?)", courses)
+
+    # The first year has the most rounds, so the others are subsets of it
+    template = (YEARS[0], SEMESTERS[0], STUDENT_TYPES[0])
+    # Only placeholders are interpolated into the queries
+    conn.executemany(
+        f"INSERT INTO merged VALUES ({', '.join('?' * 20)})",  # noqa: S608
+        _generate_term(courses, *template, rng))
+
+    terms = [(year, semester, student_type)
+             for year in YEARS
+             for semester in SEMESTERS
+             for student_type in STUDENT_TYPES]
+    for shift, (year, semester, student_type) in enumerate(terms):
+        if (year, semester, student_type) == template:
+            continue
+        round_numbers = get_default_round_numbers(year)
+        conn.execute(f"""
+            INSERT INTO merged
+            SELECT ?, ?, ?, Code, Round, Class, Course_Id,
+              UG, GD, DK, NG, CPE, Vacancy, (Demand + ?) % 400,
+              Successful_Main, Successful_Reserve, Quota_Exceeded,
+              Timetable_Clashes, Workload_Exceeded, Others
+            FROM merged
+            WHERE Year = ? AND Semester = ? AND Student_Type = ?
+              AND Round IN ({', '.join('?' * len(round_numbers))})
+        """, (year, semester, student_type, shift * 7, *template,  # noqa: S608
+              *round_numbers))
+    conn.commit()
+
+    # Every round of every term has a PDF
+    write_catalog(conn, {(year, semester, student_type, round_number)
+                         for year, semester, student_type in terms
+                         for round_number in get_default_round_numbers(year)})
+    create_rankings(conn)
+    create_deltas(conn)
+    create_search_index(conn)
+
+    # The payloads and snapshots include the rounds in the catalog of the
+    # API, so it must read this database
+    with use_database(path):
+        conn.row_factory = sqlite3.Row
+        write_payloads(conn)
+        write_analytics(conn)
+        conn.close()
+        create_snapshots(get_snapshots_dir(path), path)
+
+
+def main() -> None:
+    """Generate a synthetic database for each scale."""
+    parser = argparse.ArgumentParser(
+        description="Generate synthetic databases with the layout of database.db.")
+    parser.add_argument("--scales", "-s", type=int, nargs="+", default=[1, 10, 100],
+                        help="Multiples of today's number of courses per term.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for scale in args.scales:
+        generate_database(get_database_path(scale), scale, args.seed)
+        print(f"{scale}x: {get_database_path(scale)}")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Aggregate the merged data into the analytics table."""
+import argparse
+import sqlite3
+
+from src.history.api import DATABASE_PATH, INF, NA, clear_caches
+
+
+def _known(column: str) -> str:
+    """Get the SQL value of a column of the merged table, with NA as 0."""
+    return f"(CASE WHEN {column} = {NA} THEN 0 ELSE {column} END)"
+
+
+# Condition on the classes with a known, limited vacancy
+_LIMITED = f"Vacancy NOT IN ({NA}, {INF})"
+
+# Columns of the analytics table, and how they aggregate the merged rows
+MEASURES = (
+    ("Classes", "COUNT(*)"),
+    ("Limited_Classes", f"SUM({_LIMITED})"),
+    ("Unlimited_Classes", f"SUM(Vacancy = {INF})"),
+    ("Unknown_Vacancy_Classes", f"SUM(Vacancy = {NA})"),
+    ("Demand", f"SUM({_known('Demand')})"),
+    ("Vacancy", f"SUM(CASE WHEN {_LIMITED} THEN Vacancy ELSE 0 END)"),
+    ("Limited_Demand",
+     f"SUM(CASE WHEN {_LIMITED} THEN {_known('Demand')} ELSE 0 END)"),
+    ("Limited_Successful",
+     f"SUM(CASE WHEN {_LIMITED} THEN {_known('Successful_Main')}"
+     f" + {_known('Successful_Reserve')} ELSE 0 END)"),
+    ("Successful_Main", f"SUM({_known('Successful_Main')})"),
+    ("Successful_Reserve", f"SUM({_known('Successful_Reserve')})"),
+    ("Quota_Exceeded", f"SUM({_known('Quota_Exceeded')})"),
+    ("Timetable_Clashes", f"SUM({_known('Timetable_Clashes')})"),
+    ("Workload_Exceeded", f"SUM({_known('Workload_Exceeded')})"),
+    ("Others", f"SUM({_known('Others')})"),
+)
+
+# Levels of the analytics table, and the columns grouped by at each. The
+# columns which are not grouped by are empty, and the Level tells the rows
+# of a level apart from those of a faculty or department with an empty name.
+LEVELS = (
+    ("Department", "courses.Faculty", "courses.Department"),
+    ("Faculty", "courses.Faculty", "''"),
+    ("Round", "''", "''"),
+)
+
+
+def write_analytics(conn: sqlite3.Connection) -> None:
+    """
+    Rebuild the analytics table, from the merged data and the catalog.
+
+    Args:
+    ----
+        conn (sqlite3.Connection): The connection to the database.
+    """
+    conn.execute("DROP TABLE IF EXISTS analytics")
+    conn.execute(f"""
+        CREATE TABLE analytics (
+          Year TEXT NOT NULL,
+          Semester TEXT NOT NULL,
+          Student_Type TEXT NOT NULL,
+          Round INTEGER NOT NULL,
+          Level TEXT NOT NULL,
+          Faculty TEXT NOT NULL,
+          Department TEXT NOT NULL,
+          {", ".join(f"{column} INTEGER NOT NULL" for column, _ in MEASURES)},
+          PRIMARY KEY (Year, Semester, Student_Type, Round, Level, Faculty,
+                       Department)
+        ) WITHOUT ROWID;
+    """)
+
+    # Only the known LEVELS and MEASURES are interpolated
+    measures = ", ".join(expression for _, expression in MEASURES)
+    conn.execute(f"""
+        INSERT INTO analytics
+        {" UNION ALL ".join(f'''
+        SELECT merged.Year, merged.Semester, merged.Student_Type, merged.Round,
+          '{level}', {faculty}, {department}, {measures}
+        FROM merged
+        JOIN courses ON courses.Course_Id = merged.Course_Id
+        JOIN catalog ON catalog.Year = merged.Year
+          AND catalog.Semester = merged.Semester
+          AND catalog.Student_Type = merged.Student_Type
+          AND catalog.Round = merged.Round
+        WHERE catalog.Has_Pdf
+        GROUP BY merged.Year, merged.Semester, merged.Student_Type,
+          merged.Round, {faculty}, {department}
+        ''' for level, faculty, department in LEVELS)}
+    """)  # noqa: S608
+    conn.commit()
+
+
+def create_analytics() -> None:
+    """
+    Aggregate the merged data by faculty, department, term and round.
+
+    The analytics table has the MEASURES of every round with a PDF, for
+    each department of each faculty, for each faculty and for the whole
+    round, at the LEVELS "Department", "Faculty" and "Round". They are
+    computed with GROUP BY over the merged table, in SQL.
+
+    NA values count as 0, and vacancies are only summed over classes with a
+    limited, known vacancy. Classes with unlimited (INF) or unknown (NA)
+    vacancies are counted separately, and the demand and successful
+    allocations of the limited classes are kept apart for ratios.
+
+    The table is rebuilt from scratch, after the catalog.
+    """
+    conn = sqlite3.connect(DATABASE_PATH)
+
+    write_analytics(conn)
+
+    conn.close()
+
+    clear_caches()
+
+
+def main() -> None:
+    """Rebuild the analytics table of the database."""
+    parser = argparse.ArgumentParser(
+        description="Aggregate the merged data by faculty, department, term and round.")
+    parser.parse_args()
+
+    create_analytics()
@@ -1,356 +1,2911 @@
+import bisect
 import functools
+import hashlib
+import itertools
+import json
+import marshal
 import re
 import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import (
+    Generator,
+    Hashable,
+    Iterable,
+    Iterator,
+    Mapping,
+    Sequence,
+)
+from contextlib import AbstractContextManager, contextmanager, nullcontext
+from contextvars import ContextVar
 from datetime import datetime
 from pathlib import Path
-from typing import Union
+from typing import Any, Callable, ClassVar, Generic, NamedTuple, TypeVar, Union, cast
+
+from src.history import logger
 
 # Round 0 was discontinued in AY 24/25
 PRE_2425_YEARS = ("2122", "2223", "2324")
+# Calendar year in which the earliest academic year with data starts
+EARLIEST_CALENDAR_YEAR = 2021
 PRE_2425_ROUNDS = (0, 1, 2, 3)
 POST_2425_ROUNDS = (1, 2, 3)
 
 INF = 2147483647
 NA = -1
 BASE_DIR = Path(Path(__file__).resolve()).parent
+DATABASE_PATH = BASE_DIR / "database.db"
+PDFS_DIR = BASE_DIR / "coursereg_history" / "data" / "pdfs"
+SNAPSHOTS_DIR = BASE_DIR / "snapshots"
+
+# Maximum number of course codes bound to a single query
+MAX_CODES_PER_QUERY = 500
+
+# Minimum number of seconds between checks of the data for changes
+DATA_CHECK_INTERVAL = 60.0
+
+# Number of bytes of the database read at once when hashing it
+HASH_CHUNK_SIZE = 1024 * 1024  # 1 MiB
+
+# Approximate number of bytes of get_all_data() results kept in memory
+TERM_CACHE_MAX_BYTES = 128 * 1024 * 1024  # 128 MiB
+
+# Pragmas of the pooled read-only connections
+CONNECTION_PRAGMAS = (
+    "PRAGMA query_only = ON",
+    "PRAGMA mmap_size = 268435456",  # 256 MiB
+    "PRAGMA cache_size = -16384",  # 16 MiB
+)
+
+
+def _clean_year(year: Union[str, int]) -> str:
+    """
+    Year strings are either "YYYY[ /-]YYYY" or "YYYY".
+
+    Clean the year string by standardising all input to YYYY, e.g. 2223.
+
+    Args:
+    ----
+        year (Union[str, int]): The year string or integer.
+
+    Returns:
+    -------
+        str: The cleaned year string.
+    """
+    year = str(year).strip().replace("/", "").replace(" ", "").replace("-", "")
+
+    # If the year string is YYYY[ /-]YYYY, standardise it.
+    if re.match(r"[0-9]{8}", year):
+        year = year[2:4] + year[6:]
+
+    return year
+
+
+def _clean_semester(semester: Union[str, int]) -> str:
+    """
+    Clean the string to 1 or 2.
+
+    Clean the semester string by removing leading/trailing spaces.
+
+    Args:
+    ----
+        semester (Union[str, int]): The semester string or integer.
+
+    Returns:
+    -------
+        str: The cleaned semester string.
+    """
+    return str(semester).strip()
+
+
+def _clean_ug_gd(ug_gd: str) -> str:
+    """
+    Clean the string to "UG" or "GD".
+
+    Clean the undergraduate/graduate string by converting to lowercase and
+    removing leading/trailing spaces.
+
+    Args:
+    ----
+        ug_gd (str): The undergraduate/graduate string.
+
+    Returns:
+    -------
+        str: The cleaned undergraduate/graduate string.
+    """
+    return ug_gd.strip().lower()
+
+
+def _clean_code(code: str) -> str:
+    """
+    Clean the course code to XX1234X.
+
+    Clean the course code string by converting to uppercase and
+    removing leading/trailing spaces.
+
+    Args:
+    ----
+        code (str): The course code string.
+
+    Returns:
+    -------
+        str: The cleaned course code string.
+    """
+    return code.strip().upper()
+
+
+# Keys of the information of a class in a round, in the order it is stored
+ROUND_FIELDS = ("ug", "gd", "dk", "ng", "cpe",
+                "demand", "vacancy",
+                "successful_main", "successful_reserve",
+                "quota_exceeded", "timetable_clashes", "workload_exceeded",
+                "others")
+# Columns of the merged table holding each of ROUND_FIELDS
+ROUND_COLUMNS = ("UG", "GD", "DK", "NG", "CPE",
+                 "Demand", "Vacancy",
+                 "Successful_Main", "Successful_Reserve",
+                 "Quota_Exceeded", "Timetable_Clashes", "Workload_Exceeded",
+                 "Others")
+_ROUND_FIELD_INDICES = {field: index for index, field in enumerate(ROUND_FIELDS)}
+
+
+class RoundData(Mapping[str, int]):
+    """
+    The information of a class in a round, stored as a tuple of ints.
+
+    It is a read-only mapping from ROUND_FIELDS to their values, so it can
+    be used like a dict, and compares equal to a dict with the same items.
+    Projections to fewer fields are subclasses, given by _get_round_type().
+    """
+
+    __slots__ = ("_values",)
+
+    # The fields held, their columns in the merged table, and their indices
+    _fields: ClassVar[tuple[str, ...]] = ROUND_FIELDS
+    _columns: ClassVar[tuple[str, ...]] = ROUND_COLUMNS
+    _indices: ClassVar[dict[str, int]] = _ROUND_FIELD_INDICES
+
+    def __init__(self, values: tuple[int, ...]) -> None:
+        """
+        Wrap the values of the fields of a class in a round.
+
+        Args:
+        ----
+            values (tuple[int, ...]): The values, in the order of _fields.
+        """
+        self._values = values
+
+    @classmethod
+    def from_row(cls: type["RoundData"], row: sqlite3.Row) -> "RoundData":
+        """
+        Get the information of a class from a row of the merged table.
+
+        Args:
+        ----
+            row (sqlite3.Row): The row of the merged table.
+
+        Returns:
+        -------
+            RoundData: The information of the class in the round.
+        """
+        return cls(tuple(row[column] for column in cls._columns))
+
+    def __getitem__(self, key: str) -> int:
+        """Get the value of a field, such as "demand"."""
+        index = self._indices.get(key)
+        if index is None:
+            raise KeyError(key)
+        return self._values[index]
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the fields, in the order of ROUND_FIELDS."""
+        return iter(self._fields)
+
+    def __len__(self) -> int:
+        """Get the number of fields."""
+        return len(self._fields)
+
+    def __eq__(self, other: object) -> bool:
+        """Compare by value with another RoundData or mapping."""
+        if isinstance(other, RoundData):
+            return (self._fields == other._fields
+                    and self._values == other._values)
+        return super().__eq__(other)
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        """Represent the information as a dict."""
+        return f"RoundData({dict(self)!r})"
+
+
+# The information used for rounds without data, shared by every class
+BLANK_ROUND = RoundData((NA,) * len(ROUND_FIELDS))
+
+
+def _clean_fields(fields: Union[Iterable[str], None]) -> tuple[str, ...]:
+    """
+    Clean the fields to project the information of a class in a round to.
+
+    Args:
+    ----
+        fields (Optional[Iterable[str]]): Some of ROUND_FIELDS, or None for
+            all of them.
+
+    Returns:
+    -------
+        tuple[str, ...]: The fields, without duplicates, in the order of
+            ROUND_FIELDS.
+    """
+    if fields is None:
+        return ROUND_FIELDS
+
+    fields = set(fields)
+    unknown = fields.difference(ROUND_FIELDS)
+    if unknown:
+        error_msg = f"Unknown fields: {', '.join(sorted(unknown))}."
+        raise ValueError(error_msg)
+
+    return tuple(field for field in ROUND_FIELDS if field in fields)
+
+
+@functools.cache
+def _get_round_type(fields: tuple[str, ...]) -> type[RoundData]:
+    """
+    Get the RoundData type holding only some fields.
+
+    Args:
+    ----
+        fields (tuple[str, ...]): The cleaned fields.
+
+    Returns:
+    -------
+        type[RoundData]: RoundData itself for every field, or a subclass
+            holding the values of the fields only.
+    """
+    if fields == ROUND_FIELDS:
+        return RoundData
+
+    return type("RoundData", (RoundData,), {
+        "__slots__": (),
+        "_fields": fields,
+        "_columns": tuple(ROUND_COLUMNS[_ROUND_FIELD_INDICES[field]]
+                          for field in fields),
+        "_indices": {field: index for index, field in enumerate(fields)},
+    })
+
+
+@functools.cache
+def _get_blank_round(fields: tuple[str, ...]) -> RoundData:
+    """Get the information used for rounds without data, for some fields."""
+    if fields == ROUND_FIELDS:
+        return BLANK_ROUND
+    return _get_round_type(fields)((NA,) * len(fields))
+
+ClassDict = dict[str, list[RoundData]]
+CourseData = dict[str, Union[str, ClassDict]]
+
+
+def get_default_round_numbers(year: Union[str, int]) -> tuple[int, ...]:
+    """
+    Get the round numbers that were held in a particular academic year.
+
+    Args:
+    ----
+        year (Union[str, int]): The academic year.
+
+    Returns:
+    -------
+        tuple[int]: A tuple of round numbers.
+    """
+    year = _clean_year(year)
+    return PRE_2425_ROUNDS if year in PRE_2425_YEARS else POST_2425_ROUNDS
+
+
+def get_round_numbers(year: Union[str, int],
+                      conn: Union[sqlite3.Connection, None] = None,
+                      ) -> tuple[int, ...]:
+    """
+    Get a tuple of round numbers for a particular academic year.
+
+    The round numbers are taken from the catalog, falling back to
+    get_default_round_numbers() for years which are not catalogued.
+
+    Args:
+    ----
+        year (Union[str, int]): The academic year.
+        conn (Optional[sqlite3.Connection]):
+            Optional database connection object.
+
+    Returns:
+    -------
+        tuple[int]: A tuple of round numbers.
+    """
+    year = _clean_year(year)
+
+    round_numbers = get_catalog(conn).round_numbers.get(year)
+    if round_numbers is None:
+        return get_default_round_numbers(year)
+    return round_numbers
+
+
+def _add_round(class_dict: ClassDict,
+               class_name: str,
+               index: int,
+               result: RoundData,
+               blank: RoundData = BLANK_ROUND) -> None:
+    """
+    Add the round information of a class to the class dict.
+
+    Skipped rounds are padded with blanks to ensure that the list stays at
+    the correct length, corresponding to each round.
+
+    Args:
+    ----
+        class_dict (ClassDict): The class dict to add to.
+        class_name (str): The name of the class, such as "SG01".
+        index (int): The index of the round in get_round_numbers().
+        result (RoundData): The round information of the class.
+        blank (RoundData): The information of the skipped rounds.
+    """
+    rounds = class_dict.setdefault(class_name, [])
+    rounds.extend([blank] * (index - len(rounds)))
+    rounds.append(result)
+
+
+def _pad_rounds(class_dict: ClassDict,
+                num_rounds: int,
+                blank: RoundData = BLANK_ROUND) -> None:
+    """
+    Pad classes that don't have all the round information with blanks.
+
+    Args:
+    ----
+        class_dict (ClassDict): The class dict to pad.
+        num_rounds (int): The number of rounds in the academic year.
+        blank (RoundData): The information of the missing rounds.
+    """
+    for rounds in class_dict.values():
+        rounds.extend([blank] * (num_rounds - len(rounds)))
+
+
+class PooledConnection(sqlite3.Connection):
+    """A connection of a pool, which knows which database it reads."""
+
+    # Identifies the database, e.g. to key what is cached from it
+    database_key = ""
+
+
+def _get_database_key(conn: sqlite3.Connection) -> str:
+    """
+    Get a key identifying the database a connection reads.
+
+    Connections of a pool are identified by the pool. Others are identified
+    by the path of their database file, or by "" if they read a database in
+    memory, which cannot be told apart from other ones.
+
+    Args:
+    ----
+        conn (sqlite3.Connection): The database connection object.
+
+    Returns:
+    -------
+        str: The key of the database.
+    """
+    if isinstance(conn, PooledConnection):
+        return conn.database_key
+    return str(conn.execute("PRAGMA database_list").fetchone()[2])
+
+
+class ConnectionPool:
+    """
+    A thread-safe pool of read-only connections to the database.
+
+    A connection is used by one thread at a time. It is borrowed with
+    connection() and returned to the pool when the block exits, so the
+    threads of a threaded server reuse connections instead of opening their
+    own. At most max_idle connections are kept open between uses.
+
+    Connections opened before the last close() are closed when they are
+    returned, instead of being kept idle.
+    """
+
+    def __init__(self, path: Path, max_idle: int = 8) -> None:
+        """
+        Create an empty pool of connections to a database.
+
+        Args:
+        ----
+            path (Path): The path of the database file.
+            max_idle (int): The maximum number of idle connections kept open.
+        """
+        self.path = path
+        self.max_idle = max_idle
+        self.opened = 0
+        self.closed = 0
+        self.reused = 0
+        self._idle: list[sqlite3.Connection] = []
+        # The connections opened since the last close()
+        self._current: set[sqlite3.Connection] = set()
+        self._lock = threading.Lock()
+
+    def _open(self) -> sqlite3.Connection:
+        """Open a read-only connection to the database."""
+        # The build rewrites the database in place, so it is not opened as
+        # immutable, and SQLite notices when it changes.
+        conn = cast(PooledConnection,
+                    sqlite3.connect(f"{self.path.as_uri()}?mode=ro",
+                                    uri=True,
+                                    check_same_thread=False,
+                                    factory=PooledConnection))
+        conn.database_key = str(self.path)
+        conn.row_factory = sqlite3.Row
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+
+        with self._lock:
+            self.opened += 1
+            self._current.add(conn)
+        return conn
+
+    def _close(self, conn: sqlite3.Connection) -> None:
+        """Close a connection of the pool."""
+        conn.close()
+
+        with self._lock:
+            self.closed += 1
+            self._current.discard(conn)
+
+    def _is_current(self, conn: sqlite3.Connection) -> bool:
+        """Check if a returned connection was opened since the last close()."""
+        return conn in self._current
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        Borrow a connection from the pool for the duration of the block.
+
+        Yields
+        ------
+            sqlite3.Connection: The borrowed connection.
+        """
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+            if conn is not None:
+                self.reused += 1
+
+        if conn is None:
+            conn = self._open()
+
+        try:
+            yield conn
+        finally:
+            with self._lock:
+                is_kept = (len(self._idle) < self.max_idle
+                           and self._is_current(conn))
+                if is_kept:
+                    self._idle.append(conn)
+
+            if not is_kept:
+                self._close(conn)
+
+    def close(self) -> None:
+        """
+        Close every idle connection of the pool.
+
+        This should be called after the database is rebuilt, so that no
+        connection reads from the replaced file. Connections borrowed at the
+        time are closed when they are returned.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._current = set()
+
+        for conn in idle:
+            self._close(conn)
+
+    def stats(self) -> dict[str, int]:
+        """
+        Get the number of connections opened, closed, reused and kept idle.
+
+        Returns
+        -------
+            dict[str, int]: The counts of the pool.
+        """
+        with self._lock:
+            return {"opened": self.opened,
+                    "closed": self.closed,
+                    "reused": self.reused,
+                    "idle": len(self._idle)}
+
+
+connection_pool = ConnectionPool(DATABASE_PATH)
+
+
+class InMemoryConnectionPool(ConnectionPool):
+    """
+    A pool of connections to a shared in-memory copy of the database.
+
+    The database file is copied into a named in-memory database with the
+    SQLite backup API, and every connection of the pool opens that copy, so
+    queries never touch the file. The copy lives as long as the pool.
+
+    At most every check_interval seconds, borrowing a connection stats the
+    file. If it was replaced or modified, a new copy is loaded, then swapped
+    in at once. Connections borrowed before the swap keep reading the old
+    copy until they are returned, when they are closed.
+    """
+
+    _names = itertools.count()
+
+    def __init__(self,
+                 path: Path,
+                 max_idle: int = 8,
+                 check_interval: float = DATA_CHECK_INTERVAL) -> None:
+        """
+        Create a pool of connections to an in-memory copy of a database.
+
+        Args:
+        ----
+            path (Path): The path of the database file to copy.
+            max_idle (int): The maximum number of idle connections kept open.
+            check_interval (float): The minimum number of seconds between
+                checks of the database file for changes.
+        """
+        super().__init__(path, max_idle)
+        self.check_interval = check_interval
+        self.loads = 0
+        self.load_time = 0.0
+        self.size = 0
+        self._uri = ""
+        # The connection keeping the copy alive, and the connections to it
+        self._anchor: Union[sqlite3.Connection, None] = None
+        self._identity: Union[tuple[int, ...], None] = None
+        self._checked_at = 0.0
+        self._reload_lock = threading.Lock()
+        self.reload()
+
+    def _get_identity(self) -> tuple[int, ...]:
+        """Get the device, inode, mtime and size of the database file."""
+        stat = self.path.stat()
+        return (stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def reload(self) -> None:
+        """
+        Copy the database file into a new in-memory database, and use it.
+
+        The file is read through a read-only connection, so a rebuild in
+        progress is never copied half-way.
+        """
+        with self._reload_lock:
+            self._load()
+
+    def _load(self) -> None:
+        """Copy the database file into memory, with _reload_lock held."""
+        start_time = time.perf_counter()
+        identity = self._get_identity()
+
+        uri = (f"file:history-{id(self)}-{next(self._names)}"
+               "?mode=memory&cache=shared")
+        anchor = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        source = sqlite3.connect(f"{self.path.as_uri()}?mode=ro", uri=True)
+        try:
+            source.backup(anchor)
+        except sqlite3.Error:
+            anchor.close()
+            raise
+        finally:
+            source.close()
+
+        page_count = anchor.execute("PRAGMA page_count").fetchone()[0]
+        page_size = anchor.execute("PRAGMA page_size").fetchone()[0]
+
+        with self._lock:
+            old_anchor, self._anchor = self._anchor, anchor
+            self._uri = uri
+            self._current = set()
+            self._identity = identity
+            self._checked_at = time.monotonic()
+            self.loads += 1
+            self.load_time = time.perf_counter() - start_time
+            self.size = page_count * page_size
+
+        logger.info("Loaded %s into memory in %.3f seconds (%d bytes).",
+                    self.path, self.load_time, self.size)
+
+        # Idle connections read the old copy, which is freed once the last
+        # borrowed connection to it is returned
+        self.close()
+        if old_anchor is not None:
+            old_anchor.close()
+
+    def reload_if_changed(self) -> bool:
+        """
+        Reload the database if the file changed since it was loaded.
+
+        Returns
+        -------
+            bool: True if and only if the database was reloaded.
+        """
+        try:
+            if self._get_identity() == self._identity:
+                return False
+            with self._reload_lock:
+                # Another thread may have reloaded it while this one waited
+                if self._get_identity() == self._identity:
+                    return False
+                self._load()
+        except (OSError, sqlite3.Error):
+            # Keep serving the loaded copy until the file can be read
+            return False
+
+        # Everything derived from the old copy is stale
+        clear_caches()
+        return True
+
+    def _open(self) -> sqlite3.Connection:
+        """Open a read-only connection to the in-memory database."""
+        with self._lock:
+            uri = self._uri
+        conn = cast(PooledConnection,
+                    sqlite3.connect(uri, uri=True, check_same_thread=False,
+                                    factory=PooledConnection))
+        # Every copy has its own name, so nothing cached from an old copy
+        # is used for a new one
+        conn.database_key = uri
+        conn.row_factory = sqlite3.Row
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+
+        with self._lock:
+            self.opened += 1
+            # Connections to a copy swapped out meanwhile are not current
+            if uri == self._uri:
+                self._current.add(conn)
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        Borrow a connection from the pool for the duration of the block.
+
+        Yields
+        ------
+            sqlite3.Connection: The borrowed connection.
+        """
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            self.reload_if_changed()
+
+        with super().connection() as conn:
+            yield conn
+
+    def stats(self) -> dict[str, int]:
+        """
+        Get the counts of the pool, and the loads and size of the database.
+
+        Returns
+        -------
+            dict[str, int]: The counts of the pool, the number of loads, and
+                the size of the in-memory database in bytes.
+        """
+        stats = super().stats()
+        with self._lock:
+            return {**stats, "loads": self.loads, "bytes": self.size}
+
+
+def use_in_memory_database(path: Path = DATABASE_PATH,
+                           check_interval: float = DATA_CHECK_INTERVAL,
+                           ) -> InMemoryConnectionPool:
+    """
+    Serve every query of the API from an in-memory copy of the database.
+
+    This replaces connection_pool, so it should be called at startup,
+    before the server handles requests.
+
+    Args:
+    ----
+        path (Path): The path of the database file to load.
+        check_interval (float): The minimum number of seconds between
+            checks of the file for changes.
+
+    Returns:
+    -------
+        InMemoryConnectionPool: The new connection pool. Its load_time and
+            size are those of the latest load.
+    """
+    global connection_pool
+
+    pool = InMemoryConnectionPool(path, check_interval=check_interval)
+    old_pool, connection_pool = connection_pool, pool
+    old_pool.close()
+    clear_caches()
+    return pool
+
+
+def _connect(conn: Union[sqlite3.Connection, None],
+             ) -> AbstractContextManager[sqlite3.Connection]:
+    """
+    Use the given connection, or borrow one from the connection pool.
+
+    Args:
+    ----
+        conn (Optional[sqlite3.Connection]):
+            Optional database connection object.
+
+    Returns:
+    -------
+        AbstractContextManager[sqlite3.Connection]: The connection to use.
+    """
+    if conn is None:
+        return connection_pool.connection()
+
+    conn.row_factory = sqlite3.Row
+    return nullcontext(conn)
+
+
+class CallMetrics:
+    """
+    What a call of an instrumented function of the API spent its time on.
+
+    wall_time is the time of the whole call. sql_time covers executing the
+    statements and stepping through their rows, and stat_time covers the
+    filesystem checks. The rest of wall_time is spent in Python, cleaning
+    arguments and assembling the course data.
+    """
+
+    __slots__ = ("function", "wall_time", "sql_statements", "sql_time",
+                 "rows", "stat_calls", "stat_time", "cache_hits")
+
+    def __init__(self, function: str) -> None:
+        """
+        Start the metrics of a call at zero.
+
+        Args:
+        ----
+            function (str): The name of the function called.
+        """
+        self.function = function
+        self.wall_time = 0.0
+        self.sql_statements = 0
+        self.sql_time = 0.0
+        self.rows = 0
+        self.stat_calls = 0
+        self.stat_time = 0.0
+        self.cache_hits = 0
+
+    def as_dict(self) -> dict[str, Union[str, int, float]]:
+        """
+        Get the metrics as a dict, to forward to logs or a metrics sink.
+
+        Returns
+        -------
+            dict[str, Union[str, int, float]]: The metrics, by name.
+        """
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self) -> str:
+        """Get the metrics as a string, for debugging."""
+        return f"CallMetrics({self.as_dict()})"
+
+
+InstrumentationHook = Callable[[CallMetrics], None]
+
+# Called with the metrics of every call of an instrumented function. It is a
+# tuple, replaced as a whole, so that calls read it without a lock.
+_instrumentation_hooks: tuple[InstrumentationHook, ...] = ()
+_instrumentation_lock = threading.Lock()
+# The metrics of the instrumented call running in the current context
+_current_metrics: ContextVar[Union[CallMetrics, None]] = ContextVar(
+    "_current_metrics", default=None)
+
+_F = TypeVar("_F", bound=Callable[..., Any])
+
+
+def add_instrumentation_hook(hook: InstrumentationHook) -> None:
+    """
+    Call a function with the metrics of every instrumented call.
+
+    The instrumented functions are get_data(), get_all_data() and
+    _get_set_of_all_codes(), called from any thread. Hooks run in the
+    calling thread once the call is done, and should be quick and not
+    raise. Without hooks, the functions are not instrumented.
+
+    Args:
+    ----
+        hook (InstrumentationHook): The function to call.
+    """
+    global _instrumentation_hooks  # noqa: PLW0603
+    with _instrumentation_lock:
+        _instrumentation_hooks = (*_instrumentation_hooks, hook)
+
+
+def remove_instrumentation_hook(hook: InstrumentationHook) -> None:
+    """
+    Stop calling a function added by add_instrumentation_hook().
+
+    Args:
+    ----
+        hook (InstrumentationHook): The function to stop calling.
+    """
+    global _instrumentation_hooks  # noqa: PLW0603
+    with _instrumentation_lock:
+        hooks = list(_instrumentation_hooks)
+        hooks.remove(hook)
+        _instrumentation_hooks = tuple(hooks)
+
+
+@contextmanager
+def instrument() -> Iterator[list[CallMetrics]]:
+    """
+    Collect the metrics of the instrumented calls made within the block.
+
+    Calls made by other threads during the block are collected too.
+
+    Yields
+    ------
+        list[CallMetrics]: The metrics of the calls, appended as they end.
+    """
+    calls: list[CallMetrics] = []
+    hook = calls.append
+    add_instrumentation_hook(hook)
+    try:
+        yield calls
+    finally:
+        remove_instrumentation_hook(hook)
+
+
+def _instrumented(function: _F) -> _F:
+    """
+    Record the metrics of every call of a function, if there are any hooks.
+
+    When there are none, this costs a single check per call.
+    """
+    @functools.wraps(function)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:  # noqa: ANN401
+        hooks = _instrumentation_hooks
+        if not hooks:
+            return function(*args, **kwargs)
+
+        metrics = CallMetrics(function.__name__)
+        token = _current_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            metrics.wall_time = time.perf_counter() - start
+            _current_metrics.reset(token)
+            for hook in hooks:
+                hook(metrics)
+
+    return cast(_F, wrapper)
+
+
+def _traced_rows(cursor: sqlite3.Cursor,
+                 metrics: CallMetrics) -> Iterator[sqlite3.Row]:
+    """Yield the rows of a cursor, recording their number and fetch time."""
+    while True:
+        start = time.perf_counter()
+        row = cursor.fetchone()
+        metrics.sql_time += time.perf_counter() - start
+        if row is None:
+            return
+        metrics.rows += 1
+        yield row
+
+
+def _execute(conn: sqlite3.Connection,
+             query: str,
+             params: Sequence[Union[str, int]] = (),
+             ) -> Iterable[sqlite3.Row]:
+    """
+    Execute a statement, recording it in the metrics of the current call.
+
+    Args:
+    ----
+        conn (sqlite3.Connection): The database connection object.
+        query (str): The SQL query.
+        params (Sequence[Union[str, int]]): The parameters of the query.
+
+    Returns:
+    -------
+        Iterable[sqlite3.Row]: The rows of the result.
+    """
+    metrics = _current_metrics.get()
+    if metrics is None:
+        return conn.execute(query, params)
+
+    start = time.perf_counter()
+    cursor = conn.execute(query, params)
+    metrics.sql_time += time.perf_counter() - start
+    metrics.sql_statements += 1
+    return _traced_rows(cursor, metrics)
+
+
+_T = TypeVar("_T")
+
+
+class _PerDatabase(Generic[_T]):
+    """
+    Caches what a function reads from a database, once for each database.
+
+    The wrapped function is called with a connection, which defaults to one
+    borrowed from connection_pool. Its result is kept under the key of the
+    database the connection reads, from _get_database_key(), except for
+    databases in memory without a key, which are read on every call.
+    Call cache_clear() after the database is rebuilt.
+    """
+
+    def __init__(self, read: Callable[[sqlite3.Connection], _T]) -> None:
+        """
+        Wrap a function reading a value from a database.
+
+        Args:
+        ----
+            read (Callable[[sqlite3.Connection], _T]): Reads the value.
+        """
+        functools.update_wrapper(self, read)
+        self._read = read
+        self._values: dict[str, _T] = {}
+
+    def __call__(self, conn: Union[sqlite3.Connection, None] = None) -> _T:
+        """
+        Get the value of a database, reading it if it is not cached.
+
+        Args:
+        ----
+            conn (Optional[sqlite3.Connection]):
+                Optional database connection object.
+
+        Returns:
+        -------
+            _T: The value of the database.
+        """
+        # Borrow a connection from the pool if not provided
+        with _connect(conn) as conn:
+            key = _get_database_key(conn)
+            if not key:
+                return self._read(conn)
+
+            # Concurrent misses may both read it, as with functools.cache
+            if key not in self._values:
+                self._values[key] = self._read(conn)
+            return self._values[key]
+
+    def cache_clear(self) -> None:
+        """Drop the values of every database."""
+        self._values.clear()
+
+
+CatalogKey = tuple[str, str, str, str]
+
+
+class CatalogEntry(NamedTuple):
+    """Availability of the data of a round, as recorded by the build."""
+
+    has_pdf: bool
+    row_count: int
+
+
+class Catalog(NamedTuple):
+    """In-process copy of the catalog table."""
+
+    # Keyed by (year, semester, student type, round), all cleaned
+    entries: dict[CatalogKey, CatalogEntry]
+    # Round numbers of each catalogued academic year
+    round_numbers: dict[str, tuple[int, ...]]
+    # False if the database has no catalog, e.g. before the first build
+    is_loaded: bool
+
+
+@_PerDatabase
+def get_catalog(conn: sqlite3.Connection) -> Catalog:
+    """
+    Get the catalog of which rounds have PDFs and merged rows.
+
+    The catalog is read once per process from each database, so availability
+    checks on the request path need no filesystem or schema queries.
+    Call get_catalog.cache_clear() after the database is rebuilt.
+
+    Args:
+    ----
+        conn (Optional[sqlite3.Connection]): The connection to the database
+            to get the catalog of. Defaults to one of connection_pool.
+
+    Returns:
+    -------
+        Catalog: The catalog.
+    """
+    entries: dict[CatalogKey, CatalogEntry] = {}
+    round_numbers: dict[str, set[int]] = {}
+
+    try:
+        rows = conn.execute("""
+            SELECT Year, Semester, Student_Type, Round, Has_Pdf, Row_Count
+            FROM catalog
+        """).fetchall()
+    except sqlite3.Error:
+        return Catalog(entries={}, round_numbers={}, is_loaded=False)
+
+    for row in rows:
+        key = (row["Year"], row["Semester"], row["Student_Type"], str(row["Round"]))
+        entries[key] = CatalogEntry(has_pdf=bool(row["Has_Pdf"]),
+                                    row_count=row["Row_Count"])
+        round_numbers.setdefault(row["Year"], set()).add(row["Round"])
+
+    return Catalog(entries=entries,
+                   round_numbers={year: tuple(sorted(rounds))
+                                  for year, rounds in round_numbers.items()},
+                   is_loaded=True)
+
+
+# Every merged row, together with the strings describing its course
+_SELECT_MERGED = """
+    SELECT merged.*, courses.Faculty, courses.Department, courses.Title
+    FROM merged
+    JOIN courses ON courses.Course_Id = merged.Course_Id
+"""
+
+# Every course code of a term
+_ALL_CODES_QUERY = """
+    SELECT DISTINCT Code
+    FROM merged
+    WHERE Year = ? AND Semester = ? AND Student_Type = ?
+"""
+
+
+def _get_courses_query(year: str,  # noqa: PLR0913
+                       semester: str,
+                       ug_gd: str,
+                       round_numbers: tuple[int, ...],
+                       codes: Union[Sequence[str], None] = None,
+                       fields: tuple[str, ...] = ROUND_FIELDS,
+                       ) -> tuple[str, list[Union[str, int]]]:
+    """
+    Get the SQL query, and its parameters, for the merged rows of a term.
+
+    The rows are ordered by Code, Round and Class. This is the order of the
+    primary key of the merged table, so no sorting is needed. Only the
+    columns of the fields are selected, besides the key and the course.
+
+    Args:
+    ----
+        year (str): The cleaned academic year.
+        semester (str): The cleaned semester.
+        ug_gd (str): The cleaned undergraduate/graduate indicator.
+        round_numbers (tuple[int, ...]): The rounds to include.
+        codes (Optional[Sequence[str]]): The cleaned course codes, if only
+            some courses are to be queried.
+        fields (tuple[str, ...]): The cleaned fields to select.
+
+    Returns:
+    -------
+        tuple[str, list[Union[str, int]]]: The SQL query and its parameters.
+    """
+    columns = "".join(f", merged.{ROUND_COLUMNS[_ROUND_FIELD_INDICES[field]]}"
+                      for field in fields)
+    conditions = ["merged.Year = ?",
+                  "merged.Semester = ?",
+                  "merged.Student_Type = ?"]
+    params: list[Union[str, int]] = [year, semester, ug_gd]
+    if codes is not None:
+        conditions.append(f"merged.Code IN ({', '.join('?' * len(codes))})")
+        params.extend(codes)
+    conditions.append(f"merged.Round IN ({', '.join('?' * len(round_numbers))})")
+    params.extend(round_numbers)
+
+    # Only known columns and placeholders are interpolated
+    query = f"""
+        SELECT merged.Code, merged.Round, merged.Class{columns},
+          courses.Faculty, courses.Department, courses.Title
+        FROM merged
+        JOIN courses ON courses.Course_Id = merged.Course_Id
+        WHERE {" AND ".join(conditions)}
+        ORDER BY merged.Code, merged.Round, merged.Class
+    """  # noqa: S608
+    return query, params
+
+
+def _get_round_indices(year: str,
+                       semester: str,
+                       ug_gd: str,
+                       conn: Union[sqlite3.Connection, None] = None,
+                       ) -> dict[int, int]:
+    """
+    Get the index in get_round_numbers() of every round which has a PDF.
+
+    Args:
+    ----
+        year (str): The cleaned academic year.
+        semester (str): The cleaned semester.
+        ug_gd (str): The cleaned undergraduate/graduate indicator.
+        conn (Optional[sqlite3.Connection]):
+            Optional database connection object.
+
+    Returns:
+    -------
+        dict[int, int]: The index of each round number with a PDF.
+    """
+    return {round_number: index
+            for index, round_number in enumerate(get_round_numbers(year, conn))
+            if pdf_exists(year, semester, ug_gd, round_number, conn)}
+
+
+def _query_courses(conn: sqlite3.Connection,  # noqa: PLR0913
+                   year: str,
+                   semester: str,
+                   ug_gd: str,
+                   codes: Union[Sequence[str], None] = None,
+                   fields: tuple[str, ...] = ROUND_FIELDS,
+                   ) -> Iterator[CourseData]:
+    """
+    Query the merged data of a term, assembled course by course.
+
+    Only rounds with a PDF are included. The courses are yielded in order of
+    their course code, each in the form of the output from get_data().
+
+    Args:
+    ----
+        conn (sqlite3.Connection): The database connection object.
+        year (str): The cleaned academic year.
+        semester (str): The cleaned semester.
+        ug_gd (str): The cleaned undergraduate/graduate indicator.
+        codes (Optional[Sequence[str]]): The cleaned course codes, if only
+            some courses are to be queried.
+        fields (tuple[str, ...]): The cleaned fields of each round to query.
+
+    Yields:
+    ------
+        CourseData: The course data of each course.
+    """
+    round_indices = _get_round_indices(year, semester, ug_gd, conn)
+
+    if not round_indices:
+        return
+
+    cursor = _execute(conn, *_get_courses_query(
+        year, semester, ug_gd, tuple(round_indices), codes, fields))
+
+    yield from _assemble_courses(cursor,
+                                 len(get_round_numbers(year, conn)),
+                                 round_indices,
+                                 fields)
+
+
+def _assemble_courses(rows: Iterable[sqlite3.Row],
+                      num_rounds: int,
+                      round_indices: dict[int, int],
+                      fields: tuple[str, ...] = ROUND_FIELDS,
+                      ) -> Iterator[CourseData]:
+    """
+    Assemble merged rows of a term into course data, course by course.
+
+    Args:
+    ----
+        rows (Iterable[sqlite3.Row]): The merged rows, ordered by Code,
+            Round and Class.
+        num_rounds (int): The number of rounds in the academic year.
+        round_indices (dict[int, int]): The index of each round number with
+            a PDF. Rows of other rounds are skipped.
+        fields (tuple[str, ...]): The cleaned fields of each round to keep.
+
+    Yields:
+    ------
+        CourseData: The course data of each course.
+    """
+    round_type = _get_round_type(fields)
+    blank = _get_blank_round(fields)
+    course: Union[CourseData, None] = None
+    class_dict: ClassDict = {}
+
+    for row in rows:
+        round_index = round_indices.get(row["Round"])
+        if round_index is None:
+            continue
+
+        if course is None or course["code"] != row["Code"]:
+            if course is not None:
+                _pad_rounds(class_dict, num_rounds, blank)
+                yield course
+
+            # Prepare the structure of the next course
+            class_dict = {}
+            course = {"faculty": "",
+                      "department": "",
+                      "code": row["Code"],
+                      "title": "",
+                      "classes": class_dict}
+
+        # Later rows take precedence. The strings are interned, so courses
+        # of the same faculty and department share them.
+        course["faculty"] = sys.intern(row["Faculty"])
+        course["department"] = sys.intern(row["Department"])
+        course["title"] = sys.intern(row["Title"])
+
+        _add_round(class_dict, sys.intern(row["Class"]), round_index,
+                   round_type.from_row(row), blank)
+
+    if course is not None:
+        _pad_rounds(class_dict, num_rounds, blank)
+        yield course
+
+
+@_PerDatabase
+def _has_payloads(conn: sqlite3.Connection) -> bool:
+    """
+    Check if a database has the payloads table, written by payloads.py.
+
+    This is checked once per process for each database. Call
+    _has_payloads.cache_clear() after the database is rebuilt.
+
+    Args:
+    ----
+        conn (Optional[sqlite3.Connection]): The connection to the database
+            to check. Defaults to one of connection_pool.
+
+    Returns:
+    -------
+        bool: True if and only if the payloads table exists.
+    """
+    try:
+        row = conn.execute("""
+            SELECT 1 FROM sqlite_master
+            WHERE type = 'table' AND name = 'payloads'
+        """).fetchone()
+    except sqlite3.Error:
+        return False
+
+    return row is not None
+
+
+def _get_payloads_query(year: str,
+                        semester: str,
+                        ug_gd: str,
+                        codes: Union[Sequence[str], None] = None,
+                        ) -> tuple[str, list[Union[str, int]]]:
+    """
+    Get the SQL query, and its parameters, for the payloads of a term.
+
+    Args:
+    ----
+        year (str): The cleaned academic year.
+        semester (str): The cleaned semester.
+        ug_gd (str): The cleaned undergraduate/graduate indicator.
+        codes (Optional[Sequence[str]]): The cleaned course codes, if only
+            some courses are to be queried.
+
+    Returns:
+    -------
+        tuple[str, list[Union[str, int]]]: The SQL query and its parameters.
+    """
+    params: list[Union[str, int]] = [year, semester, ug_gd]
+    condition = ""
+    if codes is not None:
+        condition = f"AND Code IN ({', '.join('?' * len(codes))})"
+        params.extend(codes)
+
+    # Only placeholders are interpolated
+    query = f"""
+        SELECT Code, Payload
+        FROM payloads
+        WHERE Year = ? AND Semester = ? AND Student_Type = ?
+          {condition}
+        ORDER BY Code
+    """  # noqa: S608
+    return query, params
+
+
+def _decode_payload(code: str,
+                    payload: str,
+                    fields: tuple[str, ...] = ROUND_FIELDS) -> CourseData:
+    """
+    Decode the payload of a course, as encoded by payloads.py.
+
+    The payload is a JSON array of the faculty, department and title, and an
+    object with the rounds of each class. Each round is an array of the
+    values of ROUND_FIELDS, or null for a padded blank round.
+
+    Args:
+    ----
+        code (str): The course code.
+        payload (str): The payload.
+        fields (tuple[str, ...]): The cleaned fields of each round to keep.
+
+    Returns:
+    -------
+        CourseData: The course data, in the form of the output from get_data().
+    """
+    faculty, department, title, classes = json.loads(payload)
+    return _decode_course(code, faculty, department, title, classes, fields)
+
+
+def _decode_course(code: str,  # noqa: PLR0913
+                   faculty: str,
+                   department: str,
+                   title: str,
+                   classes: dict[str, list[Union[Sequence[int], None]]],
+                   fields: tuple[str, ...] = ROUND_FIELDS) -> CourseData:
+    """
+    Build the data of a course from its decoded payload or snapshot.
+
+    Args:
+    ----
+        code (str): The course code.
+        faculty (str): The faculty.
+        department (str): The department.
+        title (str): The title.
+        classes (dict[str, list[Optional[Sequence[int]]]]): The rounds of
+            each class, as the values of ROUND_FIELDS, or None for a padded
+            blank round.
+        fields (tuple[str, ...]): The cleaned fields of each round to keep.
+
+    Returns:
+    -------
+        CourseData: The course data, in the form of the output from get_data().
+    """
+    if fields == ROUND_FIELDS:
+        class_dict: ClassDict = {
+            sys.intern(class_name): [BLANK_ROUND if values is None
+                                     else RoundData(tuple(values))
+                                     for values in rounds]
+            for class_name, rounds in classes.items()}
+    else:
+        round_type = _get_round_type(fields)
+        blank = _get_blank_round(fields)
+        indices = [_ROUND_FIELD_INDICES[field] for field in fields]
+        class_dict = {
+            sys.intern(class_name): [
+                blank if values is None
+                else round_type(tuple(values[index] for index in indices))
+                for values in rounds]
+            for class_name, rounds in classes.items()}
+    return {"faculty": sys.intern(faculty),
+            "department": sys.intern(department),
+            "code": code,
+            "title": sys.intern(title),
+            "classes": class_dict}
+
+
+def _query_payloads(conn: sqlite3.Connection,  # noqa: PLR0913
+                    year: str,
+                    semester: str,
+                    ug_gd: str,
+                    codes: Union[Sequence[str], None] = None,
+                    fields: tuple[str, ...] = ROUND_FIELDS,
+                    ) -> Iterator[CourseData]:
+    """
+    Query the materialized data of a term.
+
+    This gives the same courses as _query_courses(), which remains the
+    reference implementation, without assembling them from merged rows.
+
+    Args:
+    ----
+        conn (sqlite3.Connection): The database connection object.
+        year (str): The cleaned academic year.
+        semester (str): The cleaned semester.
+        ug_gd (str): The cleaned undergraduate/graduate indicator.
+        codes (Optional[Sequence[str]]): The cleaned course codes, if only
+            some courses are to be queried.
+        fields (tuple[str, ...]): The cleaned fields of each round to keep.
+
+    Yields:
+    ------
+        CourseData: The course data of each course, in order of course code.
+    """
+    for row in _execute(conn, *_get_payloads_query(year, semester, ug_gd, codes)):
+        yield _decode_payload(row["Code"], row["Payload"], fields)
+
+
+def _query_stored_courses(conn: sqlite3.Connection,  # noqa: PLR0913
+                          year: str,
+                          semester: str,
+                          ug_gd: str,
+                          codes: Union[Sequence[str], None] = None,
+                          fields: tuple[str, ...] = ROUND_FIELDS,
+                          ) -> Iterator[CourseData]:
+    """
+    Query the courses of a term, from the payloads table if there is one.
+
+    Otherwise, they are assembled from merged rows by _query_courses().
+
+    Args:
+    ----
+        conn (sqlite3.Connection): The database connection object.
+        year (str): The cleaned academic year.
+        semester (str): The cleaned semester.
+        ug_gd (str): The cleaned undergraduate/graduate indicator.
+        codes (Optional[Sequence[str]]): The cleaned course codes, if only
+            some courses are to be queried.
+        fields (tuple[str, ...]): The cleaned fields of each round to keep.
+
+    Returns:
+    -------
+        Iterator[CourseData]: The course data of each course, in order of
+            course code.
+    """
+    if _has_payloads(conn):
+        return _query_payloads(conn, year, semester, ug_gd, codes, fields)
+    return _query_courses(conn, year, semester, ug_gd, codes, fields)
+
+
+@_instrumented
+def get_data(year: Union[str, int],  # noqa: PLR0913
+             semester: Union[str, int],
+             ug_gd: str,
+             code: str,
+             conn: Union[sqlite3.Connection, None] = None,
+             fields: Union[Iterable[str], None] = None,
+             ) -> CourseData:
+    """
+    Retrieve data for a specific course from the database.
+
+    If the database has the payloads table, the course data is a single
+    indexed lookup and decode. Otherwise it is assembled from merged rows.
+
+    If fields are given, each round only has those of ROUND_FIELDS, with the
+    same values. Only their columns are read from the merged table, and only
+    their values are kept from the payload.
+
+    The data is in the format of the following:
+        'faculty': str,
+        'department': str,
+        'code': str,
+        'title': str,
+        'classes': class_dict
+
+    The class dict has keys of the class name, for example "SG01" (Sectional
+    teaching group 1). Its value is a list of length 4.
+
+    Each element corresponds to the information in round 0, 1, 2 and 3.
+    They are read-only RoundData mappings, which compare equal to dicts,
+    and have the following format:
+        'demand': int,
+        'vacancy': int,
+        'successful_main': int,
+        'successful_reserve': int,
+        'quota_exceeded': int,
+        'timetable_clashes': int,
+        'workload_exceeded': int,
+        'others': int,
+
+    Args:
+    ----
+        year (Union[str, int]): The academic year.
+        semester (Union[str, int]): The semester.
+        ug_gd (str): The undergraduate/graduate indicator.
+        code (str): The course code.
+        conn (Optional[sqlite3.Connection]):
+            Optional database connection object.
+        fields (Optional[Iterable[str]]): The fields of each round to get,
+            such as ("demand", "vacancy"). All of them if None.
+
+    Returns:
+    -------
+        CourseData: The course data.
+    """
+    # Clean arguments
+    year = _clean_year(year)
+    semester = _clean_semester(semester)
+    ug_gd = _clean_ug_gd(ug_gd)
+    code = _clean_code(code)
+    cleaned_fields = _clean_fields(fields)
+
+    # Borrow a connection from the pool if not provided
+    with _connect(conn) as conn:
+        output = next(_query_stored_courses(conn, year, semester, ug_gd,
+                                            (code,), cleaned_fields),
+                      None)
+
+    # If nothing was found, throw an error.
+    if output is None:
+        error_msg = f"Course {code} not found."
+        raise ValueError(error_msg)
+
+    return output
+
+
+class CourseDataBatch(NamedTuple):
+    """The data of several courses of a term."""
+
+    # Keyed by the cleaned course code, in the order they were asked for
+    found: dict[str, CourseData]
+    # Cleaned course codes without data, in the order they were asked for
+    missing: list[str]
+
+
+def get_data_many(year: Union[str, int],
+                  semester: Union[str, int],
+                  ug_gd: str,
+                  codes: Iterable[str],
+                  conn: Union[sqlite3.Connection, None] = None,
+                  ) -> CourseDataBatch:
+    """
+    Retrieve data for several courses of a term from the database.
+
+    Each course is in the form of the output from get_data(). Instead of
+    raising ValueError, codes without data are listed in the result.
+
+    The courses are read with one query per MAX_CODES_PER_QUERY codes, from
+    the payloads table if the database has one.
+
+    Args:
+    ----
+        year (Union[str, int]): The academic year.
+        semester (Union[str, int]): The semester.
+        ug_gd (str): The undergraduate/graduate indicator.
+        codes (Iterable[str]): The course codes.
+        conn (Optional[sqlite3.Connection]):
+            Optional database connection object.
+
+    Returns:
+    -------
+        CourseDataBatch: The course data found, and the codes missing.
+    """
+    # Clean arguments
+    year = _clean_year(year)
+    semester = _clean_semester(semester)
+    ug_gd = _clean_ug_gd(ug_gd)
+    cleaned_codes = list(dict.fromkeys(_clean_code(code) for code in codes))
+
+    courses: dict[str, CourseData] = {}
+
+    # Borrow a connection from the pool if not provided
+    with _connect(conn) as conn:
+        for start in range(0, len(cleaned_codes), MAX_CODES_PER_QUERY):
+            chunk = cleaned_codes[start:start + MAX_CODES_PER_QUERY]
+            for course in _query_stored_courses(conn, year, semester, ug_gd,
+                                                chunk):
+                courses[str(course["code"])] = course
+
+    return CourseDataBatch(
+        found={code: courses[code] for code in cleaned_codes if code in courses},
+        missing=[code for code in cleaned_codes if code not in courses])
+
+
+@_instrumented
+def _get_set_of_all_codes(year: Union[str, int],
+                          semester: Union[str, int],
+                          ug_gd: str,
+                          conn: Union[sqlite3.Connection, None] = None,
+                          ) -> set[str]:
+    """
+    Get the set of all known course codes satisfying the arguments.
+
+    Args:
+    ----
+        year (Union[str, int]): The academic year.
+        semester (Union[str, int]): The semester.
+        ug_gd (str): The undergraduate/graduate indicator.
+        conn (Optional[sqlite3.Connection]):
+            Optional database connection object.
+
+    Returns:
+    -------
+        set[str]: A set of course codes.
+    """
+    # Clean arguments
+    year = _clean_year(year)
+    semester = _clean_semester(semester)
+    ug_gd = _clean_ug_gd(ug_gd)
+
+    # Borrow a connection from the pool if not provided
+    with _connect(conn) as conn:
+        cursor = _execute(conn, _ALL_CODES_QUERY, (year, semester, ug_gd))
+        codes: set[str] = {row["Code"] for row in cursor}
+
+    # If nothing was found, throw an error.
+    if not codes:
+        error_msg = "Data not found."
+        raise ValueError(error_msg)
+
+    return codes
+
+
+class CodeIndex:
+    """
+    Sorted course codes of a term, searched by prefix.
+
+    The codes starting with a prefix are adjacent in sorted order, so each
+    prefix is answered with two binary searches, in O(log n + k).
+    """
+
+    __slots__ = ("codes",)
+
+    def __init__(self, codes: Iterable[str]) -> None:
+        """
+        Sort the codes of a term into an index.
+
+        Args:
+        ----
+            codes (Iterable[str]): The codes of the courses of the term.
+        """
+        self.codes = sorted(codes)
+
+    def _get_range(self, prefix: str) -> tuple[int, int]:
+        """Get the start and stop indices of the codes starting with prefix."""
+        start = bisect.bisect_left(self.codes, prefix)
+        stop = bisect.bisect_left(self.codes, prefix + chr(sys.maxunicode),
+                                  start)
+        return start, stop
+
+    def match(self, prefixes: Iterable[str]) -> list[str]:
+        """
+        Get the codes starting with any of the prefixes.
+
+        Args:
+        ----
+            prefixes (Iterable[str]): The cleaned prefixes. If there are
+                none, every code matches.
+
+        Returns:
+        -------
+            list[str]: The matching codes, sorted and without duplicates.
+        """
+        ranges = sorted(self._get_range(prefix) for prefix in set(prefixes))
+        if not ranges:
+            return list(self.codes)
+
+        # Overlapping ranges, such as those of "CS" and "CS2", are merged
+        output: list[str] = []
+        end = 0
+        for start, stop in ranges:
+            output.extend(self.codes[max(start, end):stop])
+            end = max(end, stop)
+        return output
+
+
+@functools.cache
+def _get_code_index(year: str, semester: str, ug_gd: str) -> CodeIndex:
+    """
+    Get the index of the codes of a term, built once per process.
+
+    Call _get_code_index.cache_clear() after the database is rebuilt.
+
+    Args:
+    ----
+        year (str): The cleaned academic year.
+        semester (str): The cleaned semester.
+        ug_gd (str): The cleaned undergraduate/graduate indicator.
+
+    Returns:
+    -------
+        CodeIndex: The index of the course codes.
+    """
+    return CodeIndex(_get_set_of_all_codes(year, semester, ug_gd))
+
+
+def search_codes(year: Union[str, int],
+                 semester: Union[str, int],
+                 ug_gd: str,
+                 query: str) -> list[str]:
+    """
+    Search the course codes of a term by prefix.
+
+    The query is split on whitespace into prefixes, and a code matches if it
+    starts with any of them, ignoring case. This is the same matching as the
+    search bar of the web page. An empty query matches every code.
+
+    Args:
+    ----
+        year (Union[str, int]): The academic year.
+        semester (Union[str, int]): The semester.
+        ug_gd (str): The undergraduate/graduate indicator.
+        query (str): The space-separated prefixes, such as "CS2 MA1".
+
+    Returns:
+    -------
+        list[str]: The matching course codes, sorted.
+    """
+    # Clean arguments
+    year = _clean_year(year)
+    semester = _clean_semester(semester)
+    ug_gd = _clean_ug_gd(ug_gd)
+
+    index = _get_code_index(year, semester, ug_gd)
+    return index.match(_clean_code(prefix) for prefix in query.split())
+
+
+class CourseMatch(NamedTuple):
+    """A course matching a full-text search."""
+
+    code: str
+    title: str
+    faculty: str
+    department: str
+
+
+def _get_match_expression(query: str) -> str:
+    """
+    Get the FTS5 match expression of a search query.
+
+    Each word of the query is quoted, so that characters of the FTS5 query
+    syntax are matched literally, and matched as a prefix, so that the last
+    word can be partially typed.
+
+    Args:
+    ----
+        query (str): The search query, such as "programming method".
+
+    Returns:
+    -------
+        str: The match expression, such as '"programming"* "method"*'.
+    """
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", query))
+
+
+def search_courses(query: str,  # noqa: PLR0913
+                   year: Union[str, int, None] = None,
+                   semester: Union[str, int, None] = None,
+                   ug_gd: Union[str, None] = None,
+                   limit: int = 20,
+                   conn: Union[sqlite3.Connection, None] = None,
+                   ) -> list[CourseMatch]:
+    """
+    Search courses by words of their code, title, faculty and department.
+
+    The course_search full-text index, created by the merge stage, is
+    searched for courses containing every word of the query, with the last
+    letters of each word optional. The courses are ranked by BM25, weighted
+    by SEARCH_WEIGHTS of merge_db.py, so matches in the code and title count
+    more than in the faculty and department.
+
+    Args:
+    ----
+        query (str): The search query, such as "programming methodology".
+        year (Optional[Union[str, int]]): Only search the courses of this
+            academic year.
+        semester (Optional[Union[str, int]]): Only search the courses of
+            this semester.
+        ug_gd (Optional[str]): Only search the courses of this
+            undergraduate/graduate indicator.
+        limit (int): The maximum number of courses.
+        conn (Optional[sqlite3.Connection]):
+            Optional database connection object.
+
+    Returns:
+    -------
+        list[CourseMatch]: The matching courses, from the best match. A
+            course whose title changed is listed once, with its best match.
+    """
+    expression = _get_match_expression(query)
+    if not expression or limit <= 0:
+        return []
+
+    conditions = ["course_search MATCH ?"]
+    params: list[Union[str, int]] = [expression]
+
+    # Only keep the courses with data in the given terms
+    term_conditions = []
+    for column, value in (("Year", None if year is None else _clean_year(year)),
+                          ("Semester",
+                           None if semester is None else _clean_semester(semester)),
+                          ("Student_Type",
+                           None if ug_gd is None else _clean_ug_gd(ug_gd))):
+        if value is not None:
+            term_conditions.append(f"merged.{column} = ?")
+            params.append(value)
+    # Only known conditions with placeholders are interpolated
+    if term_conditions:
+        conditions.append(f"""EXISTS (
+            SELECT 1 FROM merged
+            WHERE merged.Code = course_search.Code
+              AND {" AND ".join(term_conditions)})""")  # noqa: S608
+
+    query = f"""
+        SELECT Code, Title, Faculty, Department
+        FROM course_search
+        WHERE {" AND ".join(conditions)}
+        ORDER BY rank
+    """  # noqa: S608
+
+    matches: dict[str, CourseMatch] = {}
+
+    # Borrow a connection from the pool if not provided
+    with _connect(conn) as conn:
+        for row in _execute(conn, query, params):
+            if row["Code"] not in matches:
+                matches[row["Code"]] = CourseMatch(
+                    row["Code"], row["Title"], row["Faculty"], row["Department"])
+                if len(matches) == limit:
+                    break
+
+    return list(matches.values())
+
+
+_V = TypeVar("_V")
+
+
+class _Flight(Generic[_V]):
+    """A computation in progress, and the threads waiting for its result."""
+
+    __slots__ = ("done", "error", "value", "waiters")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.value: Union[_V, None] = None
+        self.error: Union[BaseException, None] = None
+        self.waiters = 0
+
+
+class SingleFlight(Generic[_V]):
+    """
+    Coalesces concurrent computations of the same key.
+
+    The first thread to ask for a key computes its value. Threads asking for
+    the key before it is done wait for that value, or error, instead of
+    computing it again. Nothing is kept once the computation is done.
+    """
+
+    def __init__(self) -> None:
+        """Create a group with no calls in flight."""
+        self.calls = 0
+        self.coalesced = 0
+        self._flights: dict[Hashable, _Flight[_V]] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, compute: Callable[[], _V]) -> _V:
+        """
+        Compute the value of a key, or wait for the thread computing it.
+
+        Args:
+        ----
+            key (Hashable): The key.
+            compute (Callable[[], _V]): Computes the value of the key.
+
+        Returns:
+        -------
+            _V: The value computed by this thread, or by the thread already
+                computing it.
+        """
+        with self._lock:
+            self.calls += 1
+            flight = self._flights.get(key)
+            is_leader = flight is None
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+            else:
+                flight.waiters += 1
+                self.coalesced += 1
+
+        if not is_leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return cast(_V, flight.value)
+
+        try:
+            flight.value = compute()
+        except BaseException as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+        return flight.value
+
+    def stats(self) -> dict[str, int]:
+        """
+        Get the number of calls, and how many waited for another thread.
+
+        Returns
+        -------
+            dict[str, int]: The number of calls, of calls coalesced, of keys
+                being computed, and of threads waiting for them.
+        """
+        with self._lock:
+            return {"calls": self.calls,
+                    "coalesced": self.coalesced,
+                    "in_flight": len(self._flights),
+                    "waiting": sum(flight.waiters
+                                   for flight in self._flights.values())}
+
+
+TermKey = tuple[str, str, str, tuple[str, ...]]
+
+# Approximate sizes in memory of the parts of the course data
+_COURSE_BYTES = 400
+_CLASS_BYTES = 150
+_ROUND_BYTES = 200
+
+
+def _estimate_size(courses: list[CourseData]) -> int:
+    """
+    Estimate the number of bytes held by the data of some courses.
+
+    Args:
+    ----
+        courses (list[CourseData]): The course data.
+
+    Returns:
+    -------
+        int: The approximate number of bytes.
+    """
+    size = 0
+    for course in courses:
+        classes = course["classes"]
+        size += _COURSE_BYTES
+        if isinstance(classes, dict):
+            size += _CLASS_BYTES * len(classes)
+            size += _ROUND_BYTES * sum(len(rounds) for rounds in classes.values())
+    return size
+
+
+class TermDataCache:
+    """
+    Cache of get_all_data() results, keyed by the cleaned arguments.
+
+    The least recently used terms are evicted once the approximate size of
+    the cached terms exceeds max_bytes. Every lookup stats the database file,
+    and everything cached is dropped when its identity or mtime changes.
+
+    Concurrent misses of a term are coalesced, so a burst of requests for
+    an uncached term computes it once, and flights.stats() reports how many
+    calls waited for another thread.
+    """
+
+    def __init__(self,
+                 path: Path,
+                 max_bytes: int = TERM_CACHE_MAX_BYTES) -> None:
+        """
+        Create an empty cache of the terms of a database.
+
+        Args:
+        ----
+            path (Path): The path of the database file.
+            max_bytes (int): The approximate size above which terms are
+                evicted.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries: OrderedDict[TermKey, tuple[list[CourseData], int]] = (
+            OrderedDict())
+        self._identity: Union[tuple[int, ...], None] = None
+        self._checked = False
+        self._lock = threading.Lock()
+        self.flights: SingleFlight[list[CourseData]] = SingleFlight()
+
+    def _get_identity(self) -> Union[tuple[int, ...], None]:
+        """Get the device, inode, mtime and size of the database file."""
+        metrics = _current_metrics.get()
+        start = time.perf_counter() if metrics is not None else 0.0
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return None
+        finally:
+            if metrics is not None:
+                metrics.stat_calls += 1
+                metrics.stat_time += time.perf_counter() - start
+        return (stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def get(self,
+            key: TermKey,
+            compute: Callable[[str, str, str, tuple[str, ...]], list[CourseData]],
+            ) -> list[CourseData]:
+        """
+        Get the cached value of a term, computing it if it is missing.
+
+        Args:
+        ----
+            key (TermKey): The cleaned year, semester, student type and
+                fields.
+            compute (Callable[[str, str, str, tuple[str, ...]], list[CourseData]]):
+                Computes the value from the key.
+
+        Returns:
+        -------
+            list[CourseData]: A list of course data.
+        """
+        identity = self._get_identity()
+        with self._lock:
+            changed = self._checked and identity != self._identity
+            if changed:
+                self._entries.clear()
+                self.size = 0
+                self.invalidations += 1
+            self._identity = identity
+            self._checked = True
+
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                metrics = _current_metrics.get()
+                if metrics is not None:
+                    metrics.cache_hits += 1
+                return entry[0]
+            self.misses += 1
+
+        # The database was rebuilt, so everything derived from it is stale
+        if changed:
+            clear_caches()
+
+        return self.flights.do(key, functools.partial(self._compute, key, compute))
+
+    def _compute(self,
+                 key: TermKey,
+                 compute: Callable[[str, str, str, tuple[str, ...]], list[CourseData]],
+                 ) -> list[CourseData]:
+        """Compute the value of a term, and cache it if it fits."""
+        value = compute(*key)
+        size = _estimate_size(value)
+
+        with self._lock:
+            if size > self.max_bytes or key in self._entries:
+                return value
+
+            self._entries[key] = (value, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+
+        return value
+
+    def clear(self) -> None:
+        """Discard every cached value."""
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self) -> dict[str, int]:
+        """
+        Get the number of hits, misses, evictions and invalidations.
+
+        Returns
+        -------
+            dict[str, int]: The counts of the cache, with the number of
+                cached terms and their approximate size in bytes.
+        """
+        with self._lock:
+            return {"hits": self.hits,
+                    "misses": self.misses,
+                    "evictions": self.evictions,
+                    "invalidations": self.invalidations,
+                    "coalesced": self.flights.coalesced,
+                    "entries": len(self._entries),
+                    "bytes": self.size}
+
+
+term_data_cache = TermDataCache(DATABASE_PATH)
+
+
+def _load_all_data(year: Union[str, int],
+                   semester: Union[str, int],
+                   ug_gd: str,
+                   fields: Union[Iterable[str], None] = None,
+                   conn: Union[sqlite3.Connection, None] = None,
+                   ) -> list[CourseData]:
+    """
+    Get data for all courses satisfying the arguments, bypassing the cache.
+
+    The courses are decoded from the payloads table if there is one, and
+    otherwise assembled from merged rows.
+
+    Args:
+    ----
+        year (Union[str, int]): The academic year.
+        semester (Union[str, int]): The semester.
+        ug_gd (str): The undergraduate/graduate indicator.
+        fields (Optional[Iterable[str]]): The fields of each round to get.
+            All of them if None.
+        conn (Optional[sqlite3.Connection]):
+            Optional database connection object.
+
+    Returns:
+    -------
+        list[CourseData]: A list of course data.
+    """
+    # Clean arguments
+    year = _clean_year(year)
+    semester = _clean_semester(semester)
+    ug_gd = _clean_ug_gd(ug_gd)
+    cleaned_fields = _clean_fields(fields)
+
+    # Borrow a connection from the pool if not provided
+    with _connect(conn) as conn:
+        output = list(_query_stored_courses(conn, year, semester, ug_gd,
+                                            fields=cleaned_fields))
+
+    # If nothing was found, throw an error.
+    if not output:
+        error_msg = "Data not found."
+        raise ValueError(error_msg)
+
+    return output
+
+
+def _hash_database(path: Path = DATABASE_PATH) -> str:
+    """
+    Get the SHA-256 hash of the database file, which versions the snapshots.
+
+    Args:
+    ----
+        path (Path): The path of the database file.
+
+    Returns:
+    -------
+        str: The hash, in hexadecimal.
+    """
+    digest = hashlib.sha256()
+    with path.open("rb") as file:
+        for chunk in iter(functools.partial(file.read, HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _get_snapshot_path(year: str,
+                       semester: str,
+                       ug_gd: str,
+                       path: Path) -> Path:
+    """Get the path of the snapshot of a term in a directory of snapshots."""
+    return path / f"{year}_{semester}_{ug_gd}.marshal"
+
+
+def _get_manifest_version(path: Path, directory: Path) -> Union[str, None]:
+    """
+    Get the hash of a database, if the manifest in a directory matches it.
 
+    The manifest records the hash, size and mtime of the database that the
+    files of the directory were made from. The database is only hashed if
+    its mtime differs, as it does once copied, e.g. by a deploy.
 
-def _clean_year(year: Union[str, int]) -> str:
+    Args:
+    ----
+        path (Path): The path of the database file.
+        directory (Path): The directory with the manifest.json.
+
+    Returns:
+    -------
+        Optional[str]: The hash of the database, or None if the manifest is
+            missing or stale.
     """
-    Year strings are either "YYYY[ /-]YYYY" or "YYYY".
+    try:
+        manifest = json.loads((directory / "manifest.json").read_text())
+        stat = path.stat()
+        if stat.st_size != manifest["size"]:
+            return None
+        if (stat.st_mtime_ns == manifest["mtime_ns"]
+                or _hash_database(path) == manifest["database"]):
+            return str(manifest["database"])
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    return None
+
+
+@functools.cache
+def _get_snapshot_version(path: Path, snapshots_dir: Path) -> Union[str, None]:
+    """
+    Get the hash of a database, if a directory has snapshots made from it.
 
-    Clean the year string by standardising all input to YYYY, e.g. 2223.
+    This is checked by _get_manifest_version() once per process for each
+    database. Call _get_snapshot_version.cache_clear() after the database is
+    rebuilt.
 
     Args:
     ----
-        year (Union[str, int]): The year string or integer.
+        path (Path): The path of the database file.
+        snapshots_dir (Path): The directory of the snapshots.
 
     Returns:
     -------
-        str: The cleaned year string.
+        Optional[str]: The hash of the database, or None if the snapshots
+            are missing or stale.
     """
-    year = str(year).strip().replace("/", "").replace(" ", "").replace("-", "")
+    return _get_manifest_version(path, snapshots_dir)
 
-    # If the year string is YYYY[ /-]YYYY, standardise it.
-    if re.match(r"[0-9]{8}", year):
-        year = year[2:4] + year[6:]
 
-    return year
+def _load_snapshot(year: str,
+                   semester: str,
+                   ug_gd: str,
+                   fields: tuple[str, ...] = ROUND_FIELDS,
+                   path: Union[Path, None] = None,
+                   ) -> Union[list[CourseData], None]:
+    """
+    Load the snapshot of a term, as the output from get_all_data().
 
+    Args:
+    ----
+        year (str): The cleaned academic year.
+        semester (str): The cleaned semester.
+        ug_gd (str): The cleaned undergraduate/graduate indicator.
+        fields (tuple[str, ...]): The cleaned fields of each round to keep.
+        path (Optional[Path]): The path of the database the snapshot must
+            have been made from. Defaults to that of connection_pool.
 
-def _clean_semester(semester: Union[str, int]) -> str:
+    Returns:
+    -------
+        Optional[list[CourseData]]: The course data, or None if there is no
+            snapshot of the term made from the database.
     """
-    Clean the string to 1 or 2.
+    # The snapshots must have been made from the database which is read,
+    # which is not database.db once the pool is replaced, e.g. by a benchmark
+    if path is None:
+        path = connection_pool.path
+    version = _get_snapshot_version(path, SNAPSHOTS_DIR)
+    if version is None:
+        return None
+
+    try:
+        # The snapshots are only ever written by the build, like the database
+        snapshot_version, courses = marshal.loads(  # noqa: S302
+            _get_snapshot_path(year, semester, ug_gd, SNAPSHOTS_DIR).read_bytes())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+    if snapshot_version != version:
+        return None
+
+    return [_decode_course(code, faculty, department, title, classes, fields)
+            for code, faculty, department, title, classes in courses]
+
+
+def _load_term_data(year: str,
+                    semester: str,
+                    ug_gd: str,
+                    fields: tuple[str, ...] = ROUND_FIELDS,
+                    pool: Union[ConnectionPool, None] = None,
+                    ) -> list[CourseData]:
+    """
+    Get data for all courses of a term, from its snapshot if it is current.
 
-    Clean the semester string by removing leading/trailing spaces.
+    Otherwise, the data is assembled from the database by _load_all_data().
 
     Args:
     ----
-        semester (Union[str, int]): The semester string or integer.
+        year (str): The cleaned academic year.
+        semester (str): The cleaned semester.
+        ug_gd (str): The cleaned undergraduate/graduate indicator.
+        fields (tuple[str, ...]): The cleaned fields of each round to get.
+        pool (Optional[ConnectionPool]): The pool of connections to the
+            database. Defaults to connection_pool.
 
     Returns:
     -------
-        str: The cleaned semester string.
+        list[CourseData]: A list of course data.
     """
-    return str(semester).strip()
+    if pool is None:
+        pool = connection_pool
 
+    output = _load_snapshot(year, semester, ug_gd, fields, pool.path)
+    if output is not None:
+        return output
 
-def _clean_ug_gd(ug_gd: str) -> str:
+    with pool.connection() as conn:
+        return _load_all_data(year, semester, ug_gd, fields, conn)
+
+
+@_instrumented
+def get_all_data(year: Union[str, int],  # noqa: PLR0913
+                 semester: Union[str, int],
+                 ug_gd: str,
+                 fields: Union[Iterable[str], None] = None,
+                 pool: Union[ConnectionPool, None] = None,
+                 cache: Union[TermDataCache, None] = None,
+                 ) -> list[CourseData]:
     """
-    Clean the string to "UG" or "GD".
+    Get data for all courses satisfying the arguments.
 
-    Clean the undergraduate/graduate string by converting to lowercase and
-    removing leading/trailing spaces.
+    It will be in the form of a list of course data, sorted by course code.
+    Each element will be in the form of the output from get_data(), with
+    the same fields.
+
+    The term is loaded from its snapshot, if snapshots.py made one from the
+    current database. Otherwise, the whole term is read with a single query
+    and the course data is assembled in a single pass. The result is cached
+    in term_data_cache under the cleaned arguments, so "22/23", 2223 and
+    "2223" share an entry, and so do fields given in any order.
+
+    If a pool is given, the term is read from its database instead, and
+    cached in the given cache, which must only hold terms of that database.
+    Without a cache, nothing is cached.
 
     Args:
     ----
-        ug_gd (str): The undergraduate/graduate string.
+        year (Union[str, int]): The academic year.
+        semester (Union[str, int]): The semester.
+        ug_gd (str): The undergraduate/graduate indicator.
+        fields (Optional[Iterable[str]]): The fields of each round to get,
+            such as ("demand", "vacancy"). All of them if None.
+        pool (Optional[ConnectionPool]): The pool of connections to the
+            database to read, if it is not connection_pool.
+        cache (Optional[TermDataCache]): The cache of the terms of the
+            database of pool.
 
     Returns:
     -------
-        str: The cleaned undergraduate/graduate string.
+        list[CourseData]: A list of course data.
     """
-    return ug_gd.strip().lower()
+    # Clean arguments
+    key = (_clean_year(year), _clean_semester(semester), _clean_ug_gd(ug_gd),
+           _clean_fields(fields))
 
+    if pool is None:
+        return term_data_cache.get(key, _load_term_data)
 
-def _clean_code(code: str) -> str:
+    load = functools.partial(_load_term_data, pool=pool)
+    if cache is None:
+        return load(*key)
+    return cache.get(key, load)
+
+
+def iter_all_data(year: Union[str, int],
+                  semester: Union[str, int],
+                  ug_gd: str,
+                  conn: Union[sqlite3.Connection, None] = None,
+                  fields: Union[Iterable[str], None] = None,
+                  ) -> Generator[CourseData, None, None]:
     """
-    Clean the course code to XX1234X.
+    Stream data for all courses satisfying the arguments.
 
-    Clean the course code string by converting to uppercase and
-    removing leading/trailing spaces.
+    The courses are the same as the output of get_all_data(), but they are
+    yielded one at a time, sorted by course code, as soon as its payload, or
+    all of its rounds, have been read from the cursor. Only one course is
+    held in memory at a time, and nothing is cached.
+
+    A pooled connection is held until the generator is exhausted or closed.
+    Unlike get_all_data(), no error is raised if nothing is found.
 
     Args:
     ----
-        code (str): The course code string.
+        year (Union[str, int]): The academic year.
+        semester (Union[str, int]): The semester.
+        ug_gd (str): The undergraduate/graduate indicator.
+        conn (Optional[sqlite3.Connection]):
+            Optional database connection object.
+        fields (Optional[Iterable[str]]): The fields of each round to get.
+            All of them if None.
 
-    Returns:
-    -------
-        str: The cleaned course code string.
+    Yields:
+    ------
+        CourseData: The course data of each course.
     """
-    return code.strip().upper()
+    # Clean arguments
+    year = _clean_year(year)
+    semester = _clean_semester(semester)
+    ug_gd = _clean_ug_gd(ug_gd)
+    cleaned_fields = _clean_fields(fields)
 
+    # Borrow a connection from the pool if not provided
+    with _connect(conn) as conn:
+        yield from _query_stored_courses(conn, year, semester, ug_gd,
+                                         fields=cleaned_fields)
 
-ClassDict = dict[str, list[dict[str, int]]]
-CourseData = dict[str, Union[str, ClassDict]]
 
+class CourseHistoryEntry(NamedTuple):
+    """The data of a course in one term."""
+
+    year: str
+    semester: str
+    ug_gd: str
+    data: CourseData
 
-def get_round_numbers(year: Union[str, int]) -> tuple[int, ...]:
+
+# Every merged row of a course, in the order of the terms
+_COURSE_HISTORY_QUERY = f"""
+    {_SELECT_MERGED}
+    WHERE merged.Code = ?
+    ORDER BY merged.Code, merged.Year, merged.Semester, merged.Student_Type,
+      merged.Round, merged.Class
+"""
+
+
+def get_course_history(code: str,
+                       conn: Union[sqlite3.Connection, None] = None,
+                       ) -> list[CourseHistoryEntry]:
     """
-    Get a tuple of round numbers for a particular academic year.
+    Get the data of a course in every year, semester and student type.
+
+    All terms are read with a single query, served by the index of the
+    merged table on Code. The data of each term is the same as the output of
+    get_data() for that term, with the same round padding.
 
     Args:
     ----
-        year (Union[str, int]): The academic year.
+        code (str): The course code.
+        conn (Optional[sqlite3.Connection]):
+            Optional database connection object.
 
     Returns:
     -------
-        tuple[int]: A tuple of round numbers.
+        list[CourseHistoryEntry]: The data of the course in each term, sorted
+            by year, semester and student type.
     """
+    code = _clean_code(code)
 
-    year = _clean_year(year)
-    return PRE_2425_ROUNDS if year in PRE_2425_YEARS else POST_2425_ROUNDS
+    history: list[CourseHistoryEntry] = []
 
+    # Borrow a connection from the pool if not provided
+    with _connect(conn) as conn:
+        cursor = _execute(conn, _COURSE_HISTORY_QUERY, (code,))
 
-def get_data(year: Union[str, int],
-             semester: Union[str, int],
-             ug_gd: str,
-             code: str,
-             conn: Union[sqlite3.Connection, None] = None,
-             ) -> CourseData:
+        for (year, semester, ug_gd), rows in itertools.groupby(
+                cursor, key=lambda row: (row["Year"],
+                                         row["Semester"],
+                                         row["Student_Type"])):
+            history.extend(
+                CourseHistoryEntry(year, semester, ug_gd, data)
+                for data in _assemble_courses(
+                    rows,
+                    len(get_round_numbers(year, conn)),
+                    _get_round_indices(year, semester, ug_gd, conn)))
+
+    # If nothing was found, throw an error.
+    if not history:
+        error_msg = f"Course {code} not found."
+        raise ValueError(error_msg)
+
+    return history
+
+
+class RoundDelta(NamedTuple):
     """
-    Retrieve data for a specific course from the database.
+    How a class changed between consecutive rounds it was in.
 
-    The data is in the format of the following:
-        'faculty': str,
-        'department': str,
-        'code': str,
-        'title': str,
-        'classes': class_dict
+    Each change is None if either value is unknown (NA), or if exactly one of
+    them is unlimited (INF).
+    """
 
-    The class dict has keys of the class name, for example "SG01" (Sectional
-    teaching group 1). Its value is a list of length 4.
+    code: str
+    class_name: str
+    from_round: int
+    to_round: int
+    demand_from: int
+    demand_to: int
+    demand_change: Union[int, None]
+    vacancy_from: int
+    vacancy_to: int
+    vacancy_change: Union[int, None]
+    quota_exceeded_from: int
+    quota_exceeded_to: int
+    quota_exceeded_change: Union[int, None]
+
+
+def _get_deltas_query(year: str,  # noqa: PLR0913
+                      semester: str,
+                      ug_gd: str,
+                      round_numbers: tuple[int, ...],
+                      from_round: Union[int, None] = None,
+                      to_round: Union[int, None] = None,
+                      codes: Union[Sequence[str], None] = None,
+                      vacancy_to: Union[int, None] = None,
+                      *,
+                      vacancy_dropped: bool = False,
+                      ) -> tuple[str, list[Union[str, int]]]:
+    """
+    Get the SQL query, and its parameters, for the round deltas of a term.
 
-    Each element corresponds to the information in round 0, 1, 2 and 3.
-    They have the following format:
-        'demand': int,
-        'vacancy': int,
-        'successful_main': int,
-        'successful_reserve': int,
-        'quota_exceeded': int,
-        'timetable_clashes': int,
-        'workload_exceeded': int,
-        'others': int,
+    Args:
+    ----
+        year (str): The cleaned academic year.
+        semester (str): The cleaned semester.
+        ug_gd (str): The cleaned undergraduate/graduate indicator.
+        round_numbers (tuple[int, ...]): The rounds with a PDF. Deltas from
+            or to other rounds are left out.
+        from_round (Optional[int]): Only keep the deltas from this round,
+            which must have a PDF.
+        to_round (Optional[int]): Only keep the deltas to this round, which
+            must have a PDF.
+        codes (Optional[Sequence[str]]): The cleaned course codes, if only
+            some courses are to be queried.
+        vacancy_to (Optional[int]): Only keep the deltas to this vacancy.
+        vacancy_dropped (bool): Only keep the deltas where vacancy dropped.
+
+    Returns:
+    -------
+        tuple[str, list[Union[str, int]]]: The SQL query and its parameters.
+    """
+    conditions = ["Year = ?", "Semester = ?", "Student_Type = ?"]
+    params: list[Union[str, int]] = [year, semester, ug_gd]
+    for column, value in (("From_Round", from_round), ("To_Round", to_round),
+                          ("Vacancy_To", vacancy_to)):
+        if value is not None:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    for column, value in (("From_Round", from_round), ("To_Round", to_round)):
+        # A given round was checked against the rounds with a PDF already
+        if value is None:
+            conditions.append(
+                f"{column} IN ({', '.join('?' * len(round_numbers))})")
+            params.extend(round_numbers)
+    if codes is not None:
+        conditions.append(f"Code IN ({', '.join('?' * len(codes))})")
+        params.extend(codes)
+    if vacancy_dropped:
+        conditions.append("Vacancy_Change < 0")
+
+    # Only placeholders and a known condition are interpolated
+    query = f"""
+        SELECT Code, Class, From_Round, To_Round,
+          Demand_From, Demand_To, Demand_Change,
+          Vacancy_From, Vacancy_To, Vacancy_Change,
+          Quota_Exceeded_From, Quota_Exceeded_To, Quota_Exceeded_Change
+        FROM deltas
+        WHERE {" AND ".join(conditions)}
+        ORDER BY Code, Class, To_Round
+    """  # noqa: S608
+    return query, params
+
+
+def get_round_deltas(year: Union[str, int],  # noqa: PLR0913
+                     semester: Union[str, int],
+                     ug_gd: str,
+                     *,
+                     from_round: Union[int, None] = None,
+                     to_round: Union[int, None] = None,
+                     codes: Union[Iterable[str], None] = None,
+                     vacancy_to: Union[int, None] = None,
+                     vacancy_dropped: bool = False,
+                     conn: Union[sqlite3.Connection, None] = None,
+                     ) -> list[RoundDelta]:
+    """
+    Get how the classes of a term changed between consecutive rounds.
+
+    The deltas are read from the deltas table, precomputed by the merge
+    stage, for a whole term at once. For example, the classes whose vacancy
+    dropped to 0 between rounds 1 and 2 are given by
+    get_round_deltas(year, semester, ug_gd, from_round=1, to_round=2,
+    vacancy_to=0, vacancy_dropped=True).
+
+    A class missing from a round has a delta from the last round it was in.
+    Rounds without a PDF are not shown, as in get_data().
 
     Args:
     ----
         year (Union[str, int]): The academic year.
         semester (Union[str, int]): The semester.
         ug_gd (str): The undergraduate/graduate indicator.
-        code (str): The course code.
+        from_round (Optional[int]): Only get the deltas from this round.
+        to_round (Optional[int]): Only get the deltas to this round.
+        codes (Optional[Iterable[str]]): Only get the deltas of these
+            courses.
+        vacancy_to (Optional[int]): Only get the deltas to this vacancy.
+        vacancy_dropped (bool): Only get the deltas where vacancy dropped.
         conn (Optional[sqlite3.Connection]):
             Optional database connection object.
 
     Returns:
     -------
-        CourseData: The course data.
+        list[RoundDelta]: The deltas, sorted by course code, class and round.
     """
     # Clean arguments
     year = _clean_year(year)
     semester = _clean_semester(semester)
     ug_gd = _clean_ug_gd(ug_gd)
-    code = _clean_code(code)
+    cleaned_codes = (None if codes is None
+                     else [_clean_code(code) for code in codes])
 
-    # Establish the database connection if not provided
-    if conn is None:
-        conn = sqlite3.connect(Path(BASE_DIR) / "database.db")
-    conn.row_factory = sqlite3.Row
+    # Borrow a connection from the pool if not provided
+    with _connect(conn) as conn:
+        round_numbers = tuple(_get_round_indices(year, semester, ug_gd, conn))
+        if (not round_numbers or cleaned_codes == []
+                or from_round not in (None, *round_numbers)
+                or to_round not in (None, *round_numbers)):
+            return []
 
-    # Prepare the structure of returned value
-    class_dict: ClassDict = {}
-    output: dict[str, Union[str, ClassDict]] = {
-        "faculty": "",
-        "department": "",
-        "code": code,
-        "title": "",
-        "classes": class_dict}
-    BLANK = {"ug": -1,
-             "gd": -1,
-             "dk": -1,
-             "ng": -1,
-             "cpe": -1,
-             "demand": -1,
-             "vacancy": -1,
-             "successful_main": -1,
-             "successful_reserve": -1,
-             "quota_exceeded": -1,
-             "timetable_clashes": -1,
-             "workload_exceeded": -1,
-             "others": -1}
-
-    # for each round, execute the SQL query
-    round_numbers = get_round_numbers(year)
-    for index, round_number in enumerate(round_numbers):
-        TABLE_NAME = (
-            "src_history_merged_"
-            f"{year}_{semester}_{ug_gd}_round_{round_number}")
-
-        if not pdf_exists(year, semester, ug_gd, round_number):
-            continue
+        query, params = _get_deltas_query(
+            year, semester, ug_gd, round_numbers, from_round, to_round,
+            cleaned_codes, vacancy_to, vacancy_dropped=vacancy_dropped)
 
-        # Get every matching class of the course code
-        cursor = conn.execute(f"SELECT * FROM {TABLE_NAME} WHERE Code=?",
-                              (code,))
-
-        ROWS = cursor.fetchall()
-
-        for row in ROWS:
-            # Fill in the class dict
-            CLASSNAME = row["Class"]
-            output["faculty"] = row["Faculty"]
-            output["department"] = row["Department"]
-            output["code"] = row["Code"]
-            output["title"] = row["Title"]
-
-            result = {
-                "ug": row["UG"],
-                "gd": row["GD"],
-                "dk": row["DK"],
-                "ng": row["NG"],
-                "cpe": row["CPE"],
-                "demand": row["Demand"],
-                "vacancy": row["Vacancy"],
-                "successful_main": row["Successful_Main"],
-                "successful_reserve": row["Successful_Reserve"],
-                "quota_exceeded": row["Quota_Exceeded"],
-                "timetable_clashes": row["Timetable_Clashes"],
-                "workload_exceeded": row["Workload_Exceeded"],
-                "others": row["Others"],
-            }
-
-            # Logic to pad skipped rounds with blanks to ensure that
-            # the list stays at the correct length, corresponding to each round.
-            if CLASSNAME in class_dict:
-                class_dict[CLASSNAME].extend(
-                    [BLANK for _
-                     in range(index - len(class_dict[CLASSNAME]))])
-                class_dict[CLASSNAME].append(result)
-            else:
-                class_dict[CLASSNAME] = [BLANK] * index
-                class_dict[CLASSNAME].append(result)
+        return [RoundDelta(*row) for row in _execute(conn, query, params)]
 
-    # Final padding of classes that don't have all the round information
-    for key in class_dict:
-        class_dict[key] += [BLANK] * (len(round_numbers) - len(class_dict[key]))
 
-    # If nothing was found, throw an error.
-    if not class_dict:
-        error_msg = f"Course {code} not found."
-        raise ValueError(error_msg)
+# Metrics the classes of a round can be ranked by
+RANKING_METRICS = ("demand_ratio", "quota_exceeded")
 
-    # close the database connection if it was created here
-    if conn is not None and conn.close is None:
-        conn.close()
 
-    return output
+def _get_top_classes_query(year: str,  # noqa: PLR0913
+                           semester: str,
+                           ug_gd: str,
+                           round_num: int,
+                           metric: str,
+                           k: int,
+                           faculty: Union[str, None] = None,
+                           ) -> tuple[str, list[Union[str, int]]]:
+    """
+    Get the query for the top k classes of a round, and its parameters.
 
+    The query reads the rankings table in the order of one of its indexes,
+    so it stops after k rows.
 
-def _get_set_of_all_codes(year: Union[str, int],
-                          semester: Union[str, int],
-                          ug_gd: str,
-                          conn: Union[sqlite3.Connection, None] = None,
-                          ) -> set[str]:
+    Args:
+    ----
+        year (str): The cleaned academic year.
+        semester (str): The cleaned semester.
+        ug_gd (str): The cleaned undergraduate/graduate indicator.
+        round_num (int): The round number.
+        metric (str): The metric to rank by, one of RANKING_METRICS.
+        k (int): The maximum number of classes.
+        faculty (Optional[str]): Only rank the classes of this faculty.
+
+    Returns:
+    -------
+        tuple[str, list[Union[str, int]]]: The query and its parameters.
     """
-    Get the set of all known course codes satisfying the arguments.
+    query = """
+        SELECT Code, Class, Faculty, Value
+        FROM rankings
+        WHERE Year = ? AND Semester = ? AND Student_Type = ? AND Round = ?
+          AND Metric = ?
+    """
+    params: list[Union[str, int]] = [year, semester, ug_gd, round_num, metric]
+    if faculty is not None:
+        query += " AND Faculty = ?"
+        params.append(faculty.strip())
+    query += " ORDER BY Value DESC, Code, Class LIMIT ?"
+    params.append(k)
+
+    return query, params
+
+
+class RankedClass(NamedTuple):
+    """A class of a round, with its value of a ranking metric."""
+
+    code: str
+    class_name: str
+    faculty: str
+    value: float
+
+
+def get_top_classes(year: Union[str, int],  # noqa: PLR0913
+                    semester: Union[str, int],
+                    ug_gd: str,
+                    round_num: Union[str, int],
+                    metric: str = "demand_ratio",
+                    k: int = 10,
+                    faculty: Union[str, None] = None,
+                    conn: Union[sqlite3.Connection, None] = None,
+                    ) -> list[RankedClass]:
+    """
+    Get the k most contested classes of a round.
+
+    The classes are read in order from the rankings table, which is
+    precomputed by the merge stage, so only k rows are read.
+
+    The metrics are:
+    - "demand_ratio": Demand / Vacancy. It is 0 for unlimited vacancies and
+      infinite for demand without vacancies. Classes with unknown vacancies
+      are not ranked.
+    - "quota_exceeded": The number of unsuccessful allocations due to the
+      quota being exceeded.
+
+    Ties are broken by course code, then class.
 
     Args:
     ----
         year (Union[str, int]): The academic year.
         semester (Union[str, int]): The semester.
         ug_gd (str): The undergraduate/graduate indicator.
+        round_num (Union[str, int]): The round number.
+        metric (str): The metric to rank by, one of RANKING_METRICS.
+        k (int): The maximum number of classes.
+        faculty (Optional[str]): Only rank the classes of this faculty.
         conn (Optional[sqlite3.Connection]):
             Optional database connection object.
 
     Returns:
     -------
-        set[str]: A set of course codes.
+        list[RankedClass]: The classes, from the most contested.
     """
     # Clean arguments
     year = _clean_year(year)
     semester = _clean_semester(semester)
     ug_gd = _clean_ug_gd(ug_gd)
+    round_num = int(str(round_num).strip())
 
-    codes: set[str] = set()
+    if metric not in RANKING_METRICS:
+        error_msg = f"Unknown metric {metric!r}, expected one of {RANKING_METRICS}."
+        raise ValueError(error_msg)
 
-    # Establish the database connection if not provided
-    if conn is None:
-        conn = sqlite3.connect(Path(BASE_DIR) / "database.db")
-    conn.row_factory = sqlite3.Row
+    query, params = _get_top_classes_query(
+        year, semester, ug_gd, round_num, metric, k, faculty)
 
-    # for each round, execute the SQL query
-    round_numbers = get_round_numbers(year)
-    for round_number in round_numbers:
-        TABLE_NAME = (
-            "src_history_merged_"
-            f"{year}_{semester}_{ug_gd}_round_{round_number}")
-
-        # check if table exists first
-        cursor = conn.execute(
-            "SELECT name FROM sqlite_master WHERE type='table' AND name=?",
-            (TABLE_NAME,))
-        if cursor.fetchone() is None:
-            continue
+    # Borrow a connection from the pool if not provided
+    with _connect(conn) as conn:
+        # Rounds without a PDF are not shown, as in get_data()
+        if (k <= 0
+                or round_num not in _get_round_indices(year, semester, ug_gd,
+                                                       conn)):
+            return []
 
-        # get every code from the table, and add it to the set
-        cursor = conn.execute(f"SELECT Code FROM {TABLE_NAME}")
+        return [RankedClass(row["Code"], row["Class"], row["Faculty"],
+                            row["Value"])
+                for row in _execute(conn, query, params)]
 
-        ROWS = cursor.fetchall()
-        for row in ROWS:
-            codes.add(row["Code"])
 
-    # close the database connection if it was created here
-    if conn is not None and conn.close is None:
-        conn.close()
+class AnalyticsCell(NamedTuple):
+    """
+    Totals of the classes of a round, for a department, faculty or overall.
 
-    # If nothing was found, throw an error.
-    if not codes:
-        error_msg = "Data not found."
-        raise ValueError(error_msg)
+    Vacancy only sums the classes with a limited, known vacancy, whose
+    demand and successful allocations are also in limited_demand and
+    limited_successful. Unknown (NA) values count as 0.
+    """
 
-    return codes
+    # None for the totals of every faculty or department
+    faculty: Union[str, None]
+    department: Union[str, None]
+    classes: int
+    limited_classes: int
+    unlimited_classes: int
+    unknown_vacancy_classes: int
+    demand: int
+    vacancy: int
+    limited_demand: int
+    limited_successful: int
+    successful_main: int
+    successful_reserve: int
+    quota_exceeded: int
+    timetable_clashes: int
+    workload_exceeded: int
+    others: int
+
+    @property
+    def unsuccessful(self) -> int:
+        """Get the number of unsuccessful allocations, for any reason."""
+        return (self.quota_exceeded + self.timetable_clashes
+                + self.workload_exceeded + self.others)
+
+    @property
+    def demand_ratio(self) -> Union[float, None]:
+        """Get the demand per vacancy of the limited classes, if any."""
+        return self.limited_demand / self.vacancy if self.vacancy else None
+
+    @property
+    def fill_ratio(self) -> Union[float, None]:
+        """Get the successful allocations per vacancy of the limited classes."""
+        return self.limited_successful / self.vacancy if self.vacancy else None
+
+
+# Keyed by (year, semester, student type, round, faculty, department), all
+# cleaned, with None for totals
+AnalyticsKey = tuple[str, str, str, int, Union[str, None], Union[str, None]]
+
+
+class AnalyticsCube(NamedTuple):
+    """In-process copy of the analytics table."""
+
+    cells: dict[AnalyticsKey, AnalyticsCell]
+    # The cells one level below each cell, sorted by name
+    breakdowns: dict[AnalyticsKey, tuple[AnalyticsCell, ...]]
+
+
+@functools.cache
+def _get_analytics_cube() -> AnalyticsCube:
+    """
+    Get the analytics table written by analytics.py, indexed for lookups.
 
+    The table is read from the database once per process. Call
+    _get_analytics_cube.cache_clear() after the database is rebuilt.
 
-@functools.lru_cache
-def get_all_data(year: Union[str, int],
-                 semester: Union[str, int],
-                 ug_gd: str) -> list[CourseData]:
+    Returns
+    -------
+        AnalyticsCube: The cells and breakdowns of the analytics table.
+            They are empty if the database has no analytics table.
     """
-    Get data for all courses satisfying the arguments.
+    try:
+        with connection_pool.connection() as conn:
+            rows = conn.execute("""
+                SELECT *
+                FROM analytics
+                ORDER BY Year, Semester, Student_Type, Round, Level,
+                  Faculty, Department
+            """).fetchall()
+    except sqlite3.Error:
+        return AnalyticsCube(cells={}, breakdowns={})
+
+    cells: dict[AnalyticsKey, AnalyticsCell] = {}
+    breakdowns: dict[AnalyticsKey, list[AnalyticsCell]] = {}
+    for row in rows:
+        # The faculty and department are empty where they are not grouped by
+        level = row["Level"]
+        faculty = None if level == "Round" else row["Faculty"]
+        department = row["Department"] if level == "Department" else None
+        term = (row["Year"], row["Semester"], row["Student_Type"], row["Round"])
+        key: AnalyticsKey = (*term, faculty, department)
+        cells[key] = AnalyticsCell(faculty, department, *tuple(row)[7:])
+
+        # The parent of a department is its faculty, and of a faculty the
+        # whole round
+        if department is not None:
+            parent: AnalyticsKey = (*term, faculty, None)
+        elif faculty is not None:
+            parent = (*term, None, None)
+        else:
+            continue
+        breakdowns.setdefault(parent, []).append(cells[key])
+
+    return AnalyticsCube(cells=cells,
+                         breakdowns={key: tuple(children)
+                                     for key, children in breakdowns.items()})
+
+
+def get_analytics(year: Union[str, int],  # noqa: PLR0913
+                  semester: Union[str, int],
+                  ug_gd: str,
+                  round_num: Union[str, int],
+                  faculty: Union[str, None] = None,
+                  department: Union[str, None] = None,
+                  ) -> AnalyticsCell:
+    """
+    Get the totals of the classes of a round, overall or for a faculty.
 
-    It will be in the form of a list of course data.
-    Each element will be in the form of the output from get_data().
+    The totals are precomputed by analytics.py, and looked up in an
+    in-process copy of the table, so every call takes constant time.
 
     Args:
     ----
         year (Union[str, int]): The academic year.
         semester (Union[str, int]): The semester.
         ug_gd (str): The undergraduate/graduate indicator.
+        round_num (Union[str, int]): The round number.
+        faculty (Optional[str]): The faculty, such as "School of Computing".
+            The totals of every faculty if None.
+        department (Optional[str]): The department of the faculty. The
+            totals of every department of the faculty if None.
 
     Returns:
     -------
-        list[CourseData]: A list of course data.
+        AnalyticsCell: The totals.
     """
-    conn = sqlite3.connect(Path(BASE_DIR) / "database.db")
+    if department is not None and faculty is None:
+        error_msg = "A department must be given with its faculty."
+        raise ValueError(error_msg)
+
+    key = (_clean_year(year), _clean_semester(semester), _clean_ug_gd(ug_gd),
+           int(round_num), faculty, department)
+    cell = _get_analytics_cube().cells.get(key)
+
+    # If nothing was found, throw an error.
+    if cell is None:
+        error_msg = "Data not found."
+        raise ValueError(error_msg)
 
-    codes: set[str] = _get_set_of_all_codes(year, semester, ug_gd, conn)
-    sorted_codes: list[str] = sorted(codes)
+    return cell
 
-    output = [get_data(year, semester, ug_gd, code, conn)
-              for code in sorted_codes]
 
-    conn.close()
+def get_analytics_breakdown(year: Union[str, int],
+                            semester: Union[str, int],
+                            ug_gd: str,
+                            round_num: Union[str, int],
+                            faculty: Union[str, None] = None,
+                            ) -> tuple[AnalyticsCell, ...]:
+    """
+    Get the totals of each faculty of a round, or each department of a faculty.
 
-    return output
+    Like get_analytics(), the breakdown is precomputed, so every call takes
+    constant time.
+
+    Args:
+    ----
+        year (Union[str, int]): The academic year.
+        semester (Union[str, int]): The semester.
+        ug_gd (str): The undergraduate/graduate indicator.
+        round_num (Union[str, int]): The round number.
+        faculty (Optional[str]): The faculty to break down into departments.
+            The round is broken down into faculties if None.
+
+    Returns:
+    -------
+        tuple[AnalyticsCell, ...]: The totals of each faculty or department,
+            sorted by name. Empty if there is no data.
+    """
+    key = (_clean_year(year), _clean_semester(semester), _clean_ug_gd(ug_gd),
+           int(round_num), faculty, None)
+    return _get_analytics_cube().breakdowns.get(key, ())
 
 
 def _get_filepath(year: Union[str, int],
@@ -410,27 +2965,52 @@ def get_pdf_filepath(year: Union[str, int],
 def pdf_exists(year: Union[str, int],
                semester: Union[str, int],
                student_type: str,
-               round_num: Union[str, int]) -> bool:
+               round_num: Union[str, int],
+               conn: Union[sqlite3.Connection, None] = None) -> bool:
     """
     Check if a specific PDF file exists.
 
+    This is answered from the catalog if the database has one, and by
+    checking the filesystem otherwise.
+
     Args:
     ----
         year (Union[str, int]): The year of the PDF file.
         semester (Union[str, int]): The semester of the PDF file.
         student_type (str): The student type of the PDF file.
         round_num (Union[str, int]): The round number of the PDF file.
+        conn (Optional[sqlite3.Connection]): Optional connection to the
+            database whose catalog is checked.
 
     Returns:
     -------
         bool: True if and only if the PDF file exists.
     """
-    return Path.is_file(get_pdf_filepath(year, semester, student_type, round_num))
-
-
-def get_latest_year_and_sem_with_data() -> tuple[str, str]:
+    catalog = get_catalog(conn)
+    if not catalog.is_loaded:
+        metrics = _current_metrics.get()
+        start = time.perf_counter() if metrics is not None else 0.0
+        exists = Path.is_file(
+            get_pdf_filepath(year, semester, student_type, round_num))
+        if metrics is not None:
+            metrics.stat_calls += 1
+            metrics.stat_time += time.perf_counter() - start
+        return exists
+
+    key = (_clean_year(year),
+           _clean_semester(semester),
+           _clean_ug_gd(student_type),
+           str(round_num).strip())
+    entry = catalog.entries.get(key)
+    return entry is not None and entry.has_pdf
+
+
+def _find_latest_year_and_sem() -> tuple[str, str]:
     """
-    Returns the latest year/sem that has coursereg PDF data.
+    Find the latest year/sem that has coursereg PDF data.
+
+    The terms are searched back to EARLIEST_CALENDAR_YEAR. If none of them
+    has UG round 1 data, a ValueError is raised.
 
     Returns
     -------
@@ -466,6 +3046,157 @@ def get_latest_year_and_sem_with_data() -> tuple[str, str]:
             cur_year -= 1
             cur_sem = 2
 
+        if cur_year < EARLIEST_CALENDAR_YEAR:
+            error_msg = "No term has UG round 1 data."
+            raise ValueError(error_msg)
+
     latest_year = get_acad_year_starting_this_calendar_year(cur_year)
     latest_sem = str(cur_sem)
     return (latest_year, latest_sem)
+
+
+def _get_data_signature() -> tuple[object, ...]:
+    """
+    Get a signature of the data, which changes whenever the data does.
+
+    It covers the database file, the PDF directories down to the student
+    type, and the current calendar year.
+
+    Returns
+    -------
+        tuple[object, ...]: The signature of the data.
+    """
+    paths = [DATABASE_PATH, PDFS_DIR, *sorted(PDFS_DIR.glob("*")),
+             *sorted(PDFS_DIR.glob("*/*")), *sorted(PDFS_DIR.glob("*/*/*"))]
+
+    # The latest term depends on the calendar year in local time
+    signature: list[object] = [datetime.now().year]  # noqa: DTZ005
+    for path in paths:
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            signature.append((str(path), None))
+            continue
+        signature.append((str(path), stat.st_ino, stat.st_mtime_ns))
+
+    return tuple(signature)
+
+
+def clear_caches() -> None:
+    """
+    Clear every in-process copy of the data.
+
+    This is called when the database or the PDFs are found to have changed.
+    """
+    get_catalog.cache_clear()
+    _has_payloads.cache_clear()
+    _get_code_index.cache_clear()
+    _get_analytics_cube.cache_clear()
+    _get_snapshot_version.cache_clear()
+    term_data_cache.clear()
+    connection_pool.close()
+
+
+class LatestTermCache:
+    """
+    Cache of the latest year/sem with data.
+
+    The cached value is recomputed only when the signature of the data
+    changes. The signature is checked at most once every check_interval
+    seconds, so calls in between do no filesystem probing at all.
+    """
+
+    def __init__(self, check_interval: float = DATA_CHECK_INTERVAL) -> None:
+        """
+        Create an empty cache.
+
+        Args:
+        ----
+            check_interval (float): The minimum number of seconds between
+                checks of the signature of the data.
+        """
+        self.check_interval = check_interval
+        self.value: Union[tuple[str, str], None] = None
+        self.hits = 0
+        self.computations = 0
+        self.signature_checks = 0
+        self._signature: Union[tuple[object, ...], None] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, compute: Callable[[], tuple[str, str]]) -> tuple[str, str]:
+        """
+        Get the cached value, computing it if it is missing or stale.
+
+        Args:
+        ----
+            compute (Callable[[], tuple[str, str]]): Computes the value.
+
+        Returns:
+        -------
+            tuple[str, str]: Tuple containing (acad year, sem).
+        """
+        with self._lock:
+            now = time.monotonic()
+            if (self.value is not None
+                    and now - self._checked_at < self.check_interval):
+                self.hits += 1
+                return self.value
+            # Other threads keep getting the old value while this one checks
+            self._checked_at = now
+
+        # The lock is not held while probing the filesystem or computing, so
+        # no call waits for them
+        signature = _get_data_signature()
+        with self._lock:
+            self.signature_checks += 1
+            if self.value is not None and signature == self._signature:
+                self.hits += 1
+                return self.value
+            changed = self.value is not None
+
+        # The data changed since the value was computed
+        if changed:
+            clear_caches()
+
+        value = compute()
+        with self._lock:
+            self.value = value
+            self._signature = signature
+            self.computations += 1
+        return value
+
+    def clear(self) -> None:
+        """Discard the cached value, so that the next call recomputes it."""
+        with self._lock:
+            self.value = None
+            self._signature = None
+
+    def stats(self) -> dict[str, int]:
+        """
+        Get the number of hits, computations and signature checks.
+
+        Returns
+        -------
+            dict[str, int]: The counts of the cache.
+        """
+        with self._lock:
+            return {"hits": self.hits,
+                    "computations": self.computations,
+                    "signature_checks": self.signature_checks}
+
+
+latest_term_cache = LatestTermCache()
+
+
+def get_latest_year_and_sem_with_data() -> tuple[str, str]:
+    """
+    Returns the latest year/sem that has coursereg PDF data.
+
+    The result is cached in latest_term_cache until the data changes.
+
+    Returns
+    -------
+        tuple[str, str]: Tuple containing (acad year, sem).
+    """
+    return latest_term_cache.get(_find_latest_year_and_sem)
@@ -0,0 +1,218 @@
+"""An asyncio interface to the history API, run on a pool of threads."""
+import asyncio
+import functools
+import sqlite3
+import threading
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import TracebackType
+from typing import Callable, TypeVar, Union
+
+from src.history import api
+from src.history.api import (
+    ConnectionPool,
+    CourseData,
+    CourseDataBatch,
+    CourseHistoryEntry,
+    CourseMatch,
+    TermDataCache,
+)
+
+# Maximum number of threads running queries
+MAX_WORKERS = 4
+# Maximum number of calls submitted to the threads at once
+MAX_PENDING = 64
+
+T = TypeVar("T")
+
+
+class AsyncHistoryAPI:
+    """
+    Awaitable equivalents of the functions of api.py.
+
+    Each call runs the synchronous function on a dedicated pool of at most
+    max_workers threads, so the event loop is never blocked by SQLite or by
+    filesystem checks. The results are those of the synchronous functions.
+
+    The connections are borrowed from api.connection_pool, whichever pool
+    it is at the time of the call, e.g. after use_in_memory_database().
+    If a path is given, a pool of read-only connections to that database is
+    made for this API instead, with its own cache of terms, so nothing read
+    from it is mixed with the data of api.py.
+
+    At most max_pending calls are submitted to the threads at once. Further
+    calls wait for a slot before being submitted, so fanning out with
+    asyncio.gather() over many codes or terms queues the calls in the event
+    loop instead of in the executor.
+
+    Use it as an async context manager, or call close() when done.
+    """
+
+    def __init__(self,
+                 max_workers: int = MAX_WORKERS,
+                 max_pending: int = MAX_PENDING,
+                 path: Union[Path, None] = None) -> None:
+        """
+        Start the threads of the API.
+
+        Args:
+        ----
+            max_workers (int): The number of threads running the calls.
+            max_pending (int): The maximum number of calls submitted at once.
+            path (Union[Path, None]): The database to use instead of the
+                active connection pool, if any.
+        """
+        self.max_pending = max_pending
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.waited = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix="history")
+        self._own_pool = (None if path is None
+                          else ConnectionPool(path, max_idle=max_workers))
+        self._own_cache = None if path is None else TermDataCache(path)
+        # Created in the running event loop on first use
+        self._semaphore: Union[asyncio.Semaphore, None] = None
+        self._lock = threading.Lock()
+
+    @property
+    def pool(self) -> ConnectionPool:
+        """The connection pool of the calls."""
+        return api.connection_pool if self._own_pool is None else self._own_pool
+
+    async def _run(self, fn: Callable[[], T]) -> T:
+        """
+        Run a function on the threads, once a slot is free.
+
+        Args:
+        ----
+            fn (Callable[[], T]): The function to run.
+
+        Returns:
+        -------
+            T: The return value of the function.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_pending)
+
+        if self._semaphore.locked():
+            self.waited += 1
+
+        async with self._semaphore:
+            with self._lock:
+                self.in_flight += 1
+                self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            try:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self._executor, fn)
+            finally:
+                with self._lock:
+                    self.in_flight -= 1
+
+    def _with_connection(self,
+                         fn: Callable[[sqlite3.Connection], T]) -> Callable[[], T]:
+        """Wrap a function to be called with a connection of the pool."""
+        def call() -> T:
+            with self.pool.connection() as conn:
+                return fn(conn)
+
+        return call
+
+    async def get_data(self,  # noqa: PLR0913
+                       year: Union[str, int],
+                       semester: Union[str, int],
+                       ug_gd: str,
+                       code: str,
+                       fields: Union[Iterable[str], None] = None) -> CourseData:
+        """Retrieve data for a specific course, as the synchronous API does."""
+        return await self._run(self._with_connection(functools.partial(
+            api.get_data, year, semester, ug_gd, code,
+            fields=None if fields is None else list(fields))))
+
+    async def get_data_many(self,
+                            year: Union[str, int],
+                            semester: Union[str, int],
+                            ug_gd: str,
+                            codes: Iterable[str]) -> CourseDataBatch:
+        """Retrieve data for several courses of a term, as the synchronous API does."""
+        return await self._run(self._with_connection(functools.partial(
+            api.get_data_many, year, semester, ug_gd, list(codes))))
+
+    async def get_all_data(self,
+                           year: Union[str, int],
+                           semester: Union[str, int],
+                           ug_gd: str,
+                           fields: Union[Iterable[str], None] = None,
+                           ) -> list[CourseData]:
+        """
+        Get data for all courses of a term, as the synchronous API does.
+
+        The result is shared with the synchronous API through
+        api.term_data_cache, unless this API has a database of its own.
+        """
+        return await self._run(functools.partial(
+            api.get_all_data, year, semester, ug_gd,
+            fields=None if fields is None else list(fields),
+            pool=self._own_pool, cache=self._own_cache))
+
+    async def get_course_history(self, code: str) -> list[CourseHistoryEntry]:
+        """Get the data of a course in every term, as the synchronous API does."""
+        return await self._run(self._with_connection(
+            functools.partial(api.get_course_history, code)))
+
+    async def search_courses(self,  # noqa: PLR0913
+                             query: str,
+                             year: Union[str, int, None] = None,
+                             semester: Union[str, int, None] = None,
+                             ug_gd: Union[str, None] = None,
+                             limit: int = 20) -> list[CourseMatch]:
+        """Search courses by words, as the synchronous API does."""
+        return await self._run(self._with_connection(functools.partial(
+            api.search_courses, query, year, semester, ug_gd, limit)))
+
+    async def pdf_exists(self,
+                         year: Union[str, int],
+                         semester: Union[str, int],
+                         student_type: str,
+                         round_num: Union[str, int]) -> bool:
+        """Check if a specific PDF file exists, as the synchronous API does."""
+        return await self._run(self._with_connection(functools.partial(
+            api.pdf_exists, year, semester, student_type, round_num)))
+
+    async def get_latest_year_and_sem_with_data(self) -> tuple[str, str]:
+        """Get the latest year/sem with data, as the synchronous API does."""
+        return await self._run(api.get_latest_year_and_sem_with_data)
+
+    def stats(self) -> dict[str, int]:
+        """
+        Get the number of calls running, the peak, and the calls that waited.
+
+        Returns
+        -------
+            dict[str, int]: The counts of the calls, and of the connections
+                of the pool.
+        """
+        with self._lock:
+            return {"in_flight": self.in_flight,
+                    "peak_in_flight": self.peak_in_flight,
+                    "waited": self.waited,
+                    **self.pool.stats()}
+
+    def close(self) -> None:
+        """Wait for the running calls, then stop the threads and connections."""
+        self._executor.shutdown(wait=True)
+        # api.connection_pool is shared, so only a pool of its own is closed
+        if self._own_pool is not None:
+            self._own_pool.close()
+
+    async def __aenter__(self) -> "AsyncHistoryAPI":
+        """Use the API until the end of the block."""
+        return self
+
+    async def __aexit__(self,
+                        exc_type: Union[type[BaseException], None],
+                        exc: Union[BaseException, None],
+                        traceback: Union[TracebackType, None]) -> None:
+        """Close the API without blocking the event loop."""
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
@@ -1,13 +1,19 @@
 import argparse
+import functools
 import logging
 import sys
 from glob import glob
 from time import perf_counter
+from typing import Callable
 
+from src.history.analytics import create_analytics as create_analytics_fn
+from src.history.catalog import create_catalog as create_catalog_fn
 from src.history.convert_pdfs import convert as convert_pdfs_fn
 from src.history.coursereg_history.clean_csvs import clean_csvs as clean_crh_csvs_fn
 from src.history.import_csv_to_db import process_csv_files as import_csv_to_db_fn
 from src.history.merge_db import merge_csv_files as merge_db_fn
+from src.history.payloads import create_payloads as create_payloads_fn
+from src.history.snapshots import create_snapshots as create_snapshots_fn
 from src.history.vacancy_history.clean_csvs import clean_csvs as clean_vh_csvs_fn
 
 from . import logger
@@ -18,6 +24,7 @@ def build(
     semester: str = "*",
     student_type: str = "*",
     round_no: str = "*",
+    columnar: bool = False,  # noqa: FBT001, FBT002
 ) -> None:
     round_no = f"round_{round_no}" if round_no == "*" else round_no
 
@@ -79,18 +86,64 @@ def build(
         logger.critical("exc = %s", exc, exc_info=True)
         sys.exit(-1)
 
-    logger.info("Merging Vacancy and CourseReg data...")
+    # Every stage from merging onwards is stopped by the first that fails
     run_args = glob(crh_cleaned_csvs_glob)
+    stages: tuple[tuple[str, Callable[[], None]], ...] = (
+        ("Merging Vacancy and CourseReg data...",
+         functools.partial(merge_db_fn, run_args)),
+        *DATABASE_STAGES,
+    )
+    if not all(_run_stage(message, stage) for message, stage in stages):
+        return
+
+    logger.info("Database created!")
+
+    if columnar and _run_stage("Exporting columns...", _export_columns):
+        logger.info("Columns exported!")
+
+
+def _run_stage(message: str, stage: Callable[[], None]) -> bool:
+    """
+    Run a stage of the build which does not exit on failure.
+
+    Args:
+    ----
+        message (str): The message logged before the stage.
+        stage (Callable[[], None]): The stage.
+
+    Returns:
+    -------
+        bool: True if and only if the stage completed. Otherwise, the
+            interrupt or exception is logged.
+    """
+    logger.info(message)
     try:
-        merge_db_fn(run_args)
+        stage()
     except KeyboardInterrupt:
         logger.info("KeyboardInterrupt obtained. Exiting...")
-        return
+        return False
     except Exception as exc:  # noqa: BLE001
         logger.critical("exc = %s", exc, exc_info=True)
-        return
+        return False
+    return True
+
+
+def _export_columns() -> None:
+    """Export the merged data into NumPy columns."""
+    # NumPy is only needed, and so only imported, for the columnar export
+    from src.history.columnar import export_columns
+
+    export_columns()
 
-    logger.info("Database created!")
+
+# The stages after merging, in order. The snapshots are versioned by the
+# database, so they are made last.
+DATABASE_STAGES: tuple[tuple[str, Callable[[], None]], ...] = (
+    ("Cataloguing available data...", create_catalog_fn),
+    ("Materializing course payloads...", create_payloads_fn),
+    ("Aggregating faculty and department analytics...", create_analytics_fn),
+    ("Writing snapshots of every term...", create_snapshots_fn),
+)
 
 
 # Define accepted values for year and semester
@@ -147,6 +200,13 @@ def main() -> None:
         default="*",
     )
 
+    # Add optional columnar flag
+    parser.add_argument(
+        "--columnar", "-c",
+        action="store_true",
+        help="Also export the merged data into NumPy columns",
+    )
+
     args = parser.parse_args()
 
     logger.debug("parser completed, args = %s", args)
@@ -157,6 +217,7 @@ def main() -> None:
         semester=args.semester,
         student_type=args.student_type,
         round_no=args.round,
+        columnar=args.columnar,
     )
 
     logger.debug("exit")
@@ -0,0 +1,82 @@
+"""Record which rounds of every term have data."""
+import argparse
+import sqlite3
+
+from src.history.api import DATABASE_PATH, PDFS_DIR, get_default_round_numbers
+
+
+def write_catalog(conn: sqlite3.Connection,
+                  pdfs: set[tuple[str, str, str, int]]) -> None:
+    """
+    Rebuild the catalog table, given the rounds which have a PDF.
+
+    Args:
+    ----
+        conn (sqlite3.Connection): The connection to the database.
+        pdfs (set[tuple[str, str, str, int]]): The (year, semester, student
+            type, round) of every CourseReg PDF.
+    """
+    row_counts: dict[tuple[str, str, str, int], int] = {
+        (year, semester, student_type, round_number): row_count
+        for year, semester, student_type, round_number, row_count
+        in conn.execute("""
+            SELECT Year, Semester, Student_Type, Round, COUNT(*)
+            FROM merged
+            GROUP BY Year, Semester, Student_Type, Round
+        """)}
+
+    keys = pdfs | set(row_counts)
+    for year, semester, student_type, _ in list(keys):
+        keys.update((year, semester, student_type, round_number)
+                    for round_number in get_default_round_numbers(year))
+
+    conn.execute("DROP TABLE IF EXISTS catalog")
+    conn.execute("""
+        CREATE TABLE catalog (
+          Year TEXT NOT NULL,
+          Semester TEXT NOT NULL,
+          Student_Type TEXT NOT NULL,
+          Round INTEGER NOT NULL,
+          Has_Pdf INTEGER NOT NULL,
+          Row_Count INTEGER NOT NULL,
+          PRIMARY KEY (Year, Semester, Student_Type, Round)
+        ) WITHOUT ROWID;
+    """)
+    conn.executemany(
+        "INSERT INTO catalog VALUES (?, ?, ?, ?, ?, ?)",
+        [(*key, key in pdfs, row_counts.get(key, 0)) for key in sorted(keys)])
+    conn.commit()
+
+
+def create_catalog() -> None:
+    """
+    Record the availability of the data of every round in the catalog table.
+
+    A row is written for every (year, semester, student type, round) that has
+    a CourseReg PDF or merged rows, as well as for every round held in such a
+    year. Each row records whether the PDF exists and how many merged rows
+    the round has.
+
+    The catalog is rebuilt from scratch, after merging.
+    """
+    conn = sqlite3.connect(DATABASE_PATH)
+
+    # PDFs are stored in .../pdfs/{YEAR}/{SEMESTER}/{UG or GD}/round_{N}.pdf
+    pdfs: set[tuple[str, str, str, int]] = set()
+    for pdf in PDFS_DIR.glob("*/*/*/round_*.pdf"):
+        year, semester, student_type = pdf.parts[-4:-1]
+        pdfs.add((year, semester, student_type,
+                  int(pdf.stem.replace("round_", ""))))
+
+    write_catalog(conn, pdfs)
+
+    conn.close()
+
+
+def main() -> None:
+    """Rebuild the catalog table of the database."""
+    parser = argparse.ArgumentParser(
+        description="Record the availability of the data of every round.")
+    parser.parse_args()
+
+    create_catalog()
@@ -0,0 +1,410 @@
+"""Export the merged data into columns, and query them with numpy."""
+import argparse
+import bisect
+import json
+import sqlite3
+from pathlib import Path
+from typing import Any, Union
+
+import numpy as np
+import numpy.typing as npt
+
+from src.history.api import (
+    BASE_DIR,
+    DATABASE_PATH,
+    ROUND_COLUMNS,
+    ROUND_FIELDS,
+    ClassDict,
+    CourseData,
+    RoundData,
+    _add_round,
+    _clean_code,
+    _clean_semester,
+    _clean_ug_gd,
+    _clean_year,
+    _get_manifest_version,
+    _get_round_indices,
+    _hash_database,
+    _pad_rounds,
+    clear_caches,
+    get_round_numbers,
+)
+
+COLUMNS_DIR = BASE_DIR / "columns"
+
+# Columns of strings, stored as indices into their sorted distinct values
+ENCODED_COLUMNS = ("term", "code", "class")
+# Strings of the courses dimension, indexed by the course column
+COURSE_COLUMNS = ("faculty", "department", "title")
+
+
+def _get_term(year: str, semester: str, ug_gd: str) -> str:
+    """
+    Get the value of the term column, such as "2324_1_ug".
+
+    Sorting terms by this value sorts them by year, semester and student
+    type, the order of the rows.
+    """
+    return f"{year}_{semester}_{ug_gd}"
+
+
+def _save_encoded(path: Path, name: str, values: list[str]) -> None:
+    """
+    Save a column of strings as indices into its sorted distinct values.
+
+    Args:
+    ----
+        path (Path): The directory to save the column in.
+        name (str): The name of the column.
+        values (list[str]): The value of the column in every row.
+    """
+    distinct, indices = np.unique(np.array(values, dtype=str),
+                                  return_inverse=True)
+    np.save(path / f"{name}_values.npy", distinct)
+    np.save(path / f"{name}.npy", indices.astype(np.int32))
+
+
+def export_columns(path: Path = COLUMNS_DIR,
+                   database_path: Path = DATABASE_PATH) -> None:
+    """
+    Export the merged data into column-oriented .npy files.
+
+    The rows are in the order of the primary key of the merged table, so the
+    term column is sorted, and so is the code column within each term.
+    Every field of ROUND_FIELDS is saved as an int32 column of its own.
+
+    The number of rounds of every term, and which of them have a PDF, are
+    saved in manifest.json, so the store needs no catalog. It also records
+    the hash, size and mtime of the database, as in the manifest of the
+    snapshots. It is removed first and written last, so the columns are
+    refused until they are all written.
+
+    Args:
+    ----
+        path (Path): The directory to save the columns in.
+        database_path (Path): The database to export.
+    """
+    # The catalog may have been read before it was rebuilt
+    clear_caches()
+
+    path.mkdir(parents=True, exist_ok=True)
+    manifest_path = path / "manifest.json"
+    manifest_path.unlink(missing_ok=True)
+
+    version = _hash_database(database_path)
+    stat = database_path.stat()
+
+    conn = sqlite3.connect(f"{database_path.as_uri()}?mode=ro", uri=True)
+
+    # Only the known round columns are interpolated
+    rows = conn.execute(f"""
+        SELECT Year, Semester, Student_Type, Code, Round, Class, Course_Id,
+          {", ".join(ROUND_COLUMNS)}
+        FROM merged
+        ORDER BY Year, Semester, Student_Type, Code, Round, Class
+    """).fetchall()  # noqa: S608
+    courses = conn.execute("""
+        SELECT Course_Id, Faculty, Department, Title
+        FROM courses
+        ORDER BY Course_Id
+    """).fetchall()
+
+    # The rounds of each term, from the catalog of the same database
+    terms = {}
+    for year, semester, ug_gd in sorted({row[:3] for row in rows}):
+        round_indices = _get_round_indices(year, semester, ug_gd, conn)
+        terms[_get_term(year, semester, ug_gd)] = {
+            "num_rounds": len(get_round_numbers(year, conn)),
+            "round_indices": sorted(round_indices.items()),
+        }
+
+    conn.close()
+
+    _save_encoded(path, "term", [_get_term(*row[:3]) for row in rows])
+    _save_encoded(path, "code", [row[3] for row in rows])
+    np.save(path / "round.npy", np.array([row[4] for row in rows], dtype=np.int8))
+    _save_encoded(path, "class", [row[5] for row in rows])
+
+    course_indices = {course[0]: index for index, course in enumerate(courses)}
+    np.save(path / "course.npy",
+            np.array([course_indices[row[6]] for row in rows], dtype=np.int32))
+    for index, name in enumerate(COURSE_COLUMNS, start=1):
+        np.save(path / f"{name}_values.npy",
+                np.array([course[index] for course in courses], dtype=str))
+
+    metrics = np.array([row[7:] for row in rows], dtype=np.int32)
+    metrics = metrics.reshape(len(rows), len(ROUND_FIELDS))
+    for index, field in enumerate(ROUND_FIELDS):
+        np.save(path / f"{field}.npy", np.ascontiguousarray(metrics[:, index]))
+
+    manifest_path.write_text(json.dumps({
+        "database": version,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "terms": terms,
+    }))
+
+
+class ColumnarStore:
+    """
+    Memory-mapped columns of the merged data, exported by export_columns().
+
+    Queries select rows with vectorized searches and masks, and give the
+    same output as get_data() and get_all_data() of the API, without reading
+    the database.
+
+    The columns must have been exported from the database as it is. Opening
+    stale columns, or querying them once the database changed, raises a
+    RuntimeError.
+    """
+
+    def __init__(self,
+                 path: Path = COLUMNS_DIR,
+                 database_path: Path = DATABASE_PATH) -> None:
+        """
+        Open the columns in a directory, memory-mapping the large ones.
+
+        Args:
+        ----
+            path (Path): The directory the columns were saved in.
+            database_path (Path): The database they must have been exported
+                from.
+        """
+        self.database_path = database_path
+        self._identity = self._get_identity()
+        if _get_manifest_version(database_path, path) is None:
+            error_msg = (f"The columns in {path} were not exported from the "
+                         f"current {database_path}. Run columnar.py again.")
+            raise RuntimeError(error_msg)
+
+        # The rounds of each term, as (number of rounds, index of each round
+        # with a PDF)
+        manifest = json.loads((path / "manifest.json").read_text())
+        self.terms: dict[str, tuple[int, dict[int, int]]] = {
+            term: (rounds["num_rounds"], dict(rounds["round_indices"]))
+            for term, rounds in manifest["terms"].items()}
+
+        def load(name: str) -> npt.NDArray[Any]:
+            array: npt.NDArray[Any] = np.load(path / f"{name}.npy", mmap_mode="r")
+            return array
+
+        # The distinct values are small, so they are read into lists
+        self.values: dict[str, list[str]] = {
+            name: np.load(path / f"{name}_values.npy").tolist()
+            for name in (*ENCODED_COLUMNS, *COURSE_COLUMNS)}
+        self.term_indices = {term: index
+                             for index, term in enumerate(self.values["term"])}
+
+        self.columns: dict[str, npt.NDArray[Any]] = {
+            name: load(name)
+            for name in (*ENCODED_COLUMNS, "round", "course", *ROUND_FIELDS)}
+
+    def _get_identity(self) -> tuple[int, ...]:
+        """Get the inode, mtime and size of the database file."""
+        stat = self.database_path.stat()
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def is_current(self) -> bool:
+        """
+        Check if the database is unchanged since the store was opened.
+
+        Returns
+        -------
+            bool: True if and only if the database file is unchanged.
+        """
+        try:
+            return self._get_identity() == self._identity
+        except OSError:
+            return False
+
+    def _check_current(self) -> None:
+        """Raise a RuntimeError if the database changed since it was opened."""
+        if not self.is_current():
+            error_msg = (f"{self.database_path} changed since the columns were "
+                         "opened. Export and open them again.")
+            raise RuntimeError(error_msg)
+
+    def _get_term_rows(self, year: str, semester: str, ug_gd: str) -> slice:
+        """Get the rows of a term, which are adjacent as terms are sorted."""
+        index = self.term_indices.get(_get_term(year, semester, ug_gd))
+        if index is None:
+            return slice(0, 0)
+
+        start, stop = np.searchsorted(self.columns["term"], [index, index + 1])
+        return slice(int(start), int(stop))
+
+    def _get_code_rows(self, rows: slice, code: str) -> slice:
+        """Get the rows of a course code within the rows of a term."""
+        codes = self.values["code"]
+        index = bisect.bisect_left(codes, code)
+        if index == len(codes) or codes[index] != code:
+            return slice(0, 0)
+
+        start, stop = np.searchsorted(self.columns["code"][rows],
+                                      [index, index + 1])
+        return slice(rows.start + int(start), rows.start + int(stop))
+
+    def _assemble(self,
+                  rows: slice,
+                  year: str,
+                  semester: str,
+                  ug_gd: str) -> list[CourseData]:
+        """
+        Assemble the course data of some adjacent rows of a term.
+
+        Args:
+        ----
+            rows (slice): The rows, in the order of the primary key.
+            year (str): The cleaned academic year.
+            semester (str): The cleaned semester.
+            ug_gd (str): The cleaned undergraduate/graduate indicator.
+
+        Returns:
+        -------
+            list[CourseData]: The course data, sorted by course code.
+        """
+        term = self.terms.get(_get_term(year, semester, ug_gd))
+        if term is None:
+            return []
+        num_rounds, round_indices = term
+
+        # Only include the rounds with a PDF
+        rounds = self.columns["round"][rows]
+        selected = np.arange(rows.start, rows.stop)[
+            np.isin(rounds, list(round_indices))]
+
+        codes: list[int] = self.columns["code"][selected].tolist()
+        round_numbers: list[int] = self.columns["round"][selected].tolist()
+        classes: list[int] = self.columns["class"][selected].tolist()
+        course_ids: list[int] = self.columns["course"][selected].tolist()
+        metrics: list[list[int]] = np.stack(
+            [self.columns[field][selected] for field in ROUND_FIELDS],
+            axis=1).tolist()
+
+        output: list[CourseData] = []
+        class_dicts: list[ClassDict] = []
+        for row, code in enumerate(codes):
+            if row == 0 or code != codes[row - 1]:
+                class_dict: ClassDict = {}
+                class_dicts.append(class_dict)
+                output.append({"faculty": "",
+                               "department": "",
+                               "code": self.values["code"][code],
+                               "title": "",
+                               "classes": class_dict})
+
+            # Later rows take precedence
+            for name in COURSE_COLUMNS:
+                output[-1][name] = self.values[name][course_ids[row]]
+
+            _add_round(class_dict,
+                       self.values["class"][classes[row]],
+                       round_indices[round_numbers[row]],
+                       RoundData(tuple(metrics[row])))
+
+        for class_dict in class_dicts:
+            _pad_rounds(class_dict, num_rounds)
+
+        return output
+
+    def get_data(self,
+                 year: Union[str, int],
+                 semester: Union[str, int],
+                 ug_gd: str,
+                 code: str) -> CourseData:
+        """
+        Retrieve data for a specific course, as the API does.
+
+        Args:
+        ----
+            year (Union[str, int]): The academic year.
+            semester (Union[str, int]): The semester.
+            ug_gd (str): The undergraduate/graduate indicator.
+            code (str): The course code.
+
+        Returns:
+        -------
+            CourseData: The course data.
+        """
+        self._check_current()
+
+        year = _clean_year(year)
+        semester = _clean_semester(semester)
+        ug_gd = _clean_ug_gd(ug_gd)
+        code = _clean_code(code)
+
+        rows = self._get_code_rows(
+            self._get_term_rows(year, semester, ug_gd), code)
+        output = self._assemble(rows, year, semester, ug_gd)
+
+        # If nothing was found, throw an error.
+        if not output:
+            error_msg = f"Course {code} not found."
+            raise ValueError(error_msg)
+
+        return output[0]
+
+    def get_all_data(self,
+                     year: Union[str, int],
+                     semester: Union[str, int],
+                     ug_gd: str) -> list[CourseData]:
+        """
+        Get data for all courses of a term, as the API does.
+
+        Args:
+        ----
+            year (Union[str, int]): The academic year.
+            semester (Union[str, int]): The semester.
+            ug_gd (str): The undergraduate/graduate indicator.
+
+        Returns:
+        -------
+            list[CourseData]: A list of course data.
+        """
+        self._check_current()
+
+        year = _clean_year(year)
+        semester = _clean_semester(semester)
+        ug_gd = _clean_ug_gd(ug_gd)
+
+        rows = self._get_term_rows(year, semester, ug_gd)
+        output = self._assemble(rows, year, semester, ug_gd)
+
+        # If nothing was found, throw an error.
+        if not output:
+            error_msg = "Data not found."
+            raise ValueError(error_msg)
+
+        return output
+
+
+_columnar_store: Union[ColumnarStore, None] = None
+
+
+def get_columnar_store() -> ColumnarStore:
+    """
+    Get the store of the columns in COLUMNS_DIR.
+
+    It is opened once, and again whenever the database changed since, which
+    raises a RuntimeError if the columns were not exported again.
+
+    Returns
+    -------
+        ColumnarStore: The store.
+    """
+    global _columnar_store  # noqa: PLW0603
+
+    if _columnar_store is None or not _columnar_store.is_current():
+        _columnar_store = ColumnarStore(COLUMNS_DIR)
+    return _columnar_store
+
+
+def main() -> None:
+    """Export the merged data into columns."""
+    parser = argparse.ArgumentParser(
+        description="Export the merged data into column-oriented .npy files.")
+    parser.add_argument("--output", "-o", type=Path, default=COLUMNS_DIR,
+                        help="Directory to save the columns in.")
+    args = parser.parse_args()
+
+    export_columns(args.output)
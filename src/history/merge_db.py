@@ -3,19 +3,269 @@ import os
 import sqlite3
 from pathlib import Path
 
-from src.history.api import NA
+from src.history.api import INF, NA
 
 BASE_DIR = Path(__file__).resolve().parent
 
+# BM25 weights of the Code, Title, Faculty and Department columns of the
+# full-text search index
+SEARCH_WEIGHTS = (10.0, 5.0, 1.0, 1.0)
+
+
+def create_tables(conn: sqlite3.Connection) -> None:
+    """
+    Create the tables holding the merged data, if they do not exist yet.
+
+    `courses` is a dimension table holding the strings describing a course.
+    `merged` is a fact table with one row per (year, semester, student type,
+    code, round, class), referring to its course through Course_Id.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS courses (
+          Course_Id INTEGER PRIMARY KEY,
+          Code TEXT NOT NULL,
+          Faculty TEXT NOT NULL,
+          Department TEXT NOT NULL,
+          Title TEXT NOT NULL,
+          UNIQUE (Code, Faculty, Department, Title)
+        );
+    """)
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS merged (
+          Year TEXT NOT NULL,
+          Semester TEXT NOT NULL,
+          Student_Type TEXT NOT NULL,
+          Code TEXT NOT NULL,
+          Round INTEGER NOT NULL,
+          Class TEXT NOT NULL,
+          Course_Id INTEGER NOT NULL REFERENCES courses (Course_Id),
+          UG INTEGER NOT NULL,
+          GD INTEGER NOT NULL,
+          DK INTEGER NOT NULL,
+          NG INTEGER NOT NULL,
+          CPE INTEGER NOT NULL,
+          Vacancy INTEGER NOT NULL,
+          Demand INTEGER NOT NULL,
+          Successful_Main INTEGER NOT NULL,
+          Successful_Reserve INTEGER NOT NULL,
+          Quota_Exceeded INTEGER NOT NULL,
+          Timetable_Clashes INTEGER NOT NULL,
+          Workload_Exceeded INTEGER NOT NULL,
+          Others INTEGER NOT NULL,
+          PRIMARY KEY (Year, Semester, Student_Type, Code, Round, Class)
+        ) WITHOUT ROWID;
+    """)
+
+    # Rows of a course across every term, in the order of the terms. As
+    # merged has no rowid, the index holds the whole primary key.
+    conn.execute("DROP INDEX IF EXISTS merged_code_class")
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS merged_code
+        ON merged (Code, Year, Semester, Student_Type, Round, Class);
+    """)
+
+
+def create_join_indexes(conn: sqlite3.Connection, table_names: list[str]) -> None:
+    """Index the source tables on (Code, Class), the keys of the FULL JOIN."""
+    for table_name in table_names:
+        conn.execute(f"""
+            CREATE INDEX IF NOT EXISTS "{table_name}_code_class"
+            ON "{table_name}" (Code, Class);
+        """)
+
+
+def create_rankings(conn: sqlite3.Connection) -> None:
+    """
+    Rank the classes of every round by how contested they are.
+
+    The rankings table has one row per class, round and metric:
+    - demand_ratio is Demand / Vacancy. It is 0 for unlimited (INF)
+      vacancies, infinite for demand without vacancies, and the class is
+      left out if its vacancy is unknown (NA).
+    - quota_exceeded is the number of unsuccessful allocations due to the
+      quota being exceeded.
+
+    The table is rebuilt from the merged table, and indexed so that the top
+    classes of a round, optionally of a faculty, are read in order.
+    """
+    conn.execute("DROP TABLE IF EXISTS rankings")
+    conn.execute("""
+        CREATE TABLE rankings (
+          Year TEXT NOT NULL,
+          Semester TEXT NOT NULL,
+          Student_Type TEXT NOT NULL,
+          Round INTEGER NOT NULL,
+          Metric TEXT NOT NULL,
+          Faculty TEXT NOT NULL,
+          Code TEXT NOT NULL,
+          Class TEXT NOT NULL,
+          Value REAL NOT NULL
+        );
+    """)
+
+    conn.execute(f"""
+        INSERT INTO rankings
+        SELECT
+          merged.Year, merged.Semester, merged.Student_Type, merged.Round,
+          'demand_ratio', courses.Faculty, merged.Code, merged.Class,
+          CASE
+            WHEN merged.Vacancy = {INF} THEN 0.0
+            WHEN merged.Vacancy = 0 AND merged.Demand > 0 THEN 9e999
+            WHEN merged.Vacancy = 0 THEN 0.0
+            ELSE CAST(merged.Demand AS REAL) / merged.Vacancy
+          END
+        FROM merged
+        JOIN courses ON courses.Course_Id = merged.Course_Id
+        WHERE merged.Vacancy != {NA};
+    """)
+
+    conn.execute(f"""
+        INSERT INTO rankings
+        SELECT
+          merged.Year, merged.Semester, merged.Student_Type, merged.Round,
+          'quota_exceeded', courses.Faculty, merged.Code, merged.Class,
+          merged.Quota_Exceeded
+        FROM merged
+        JOIN courses ON courses.Course_Id = merged.Course_Id
+        WHERE merged.Quota_Exceeded != {NA};
+    """)
+
+    conn.execute("""
+        CREATE INDEX rankings_value
+        ON rankings (Year, Semester, Student_Type, Round, Metric,
+                     Value DESC, Code, Class);
+    """)
+    conn.execute("""
+        CREATE INDEX rankings_faculty_value
+        ON rankings (Year, Semester, Student_Type, Round, Metric, Faculty,
+                     Value DESC, Code, Class);
+    """)
+    conn.commit()
+
+
+# Columns of the merged table whose changes between rounds are stored
+DELTA_COLUMNS = ("Demand", "Vacancy", "Quota_Exceeded")
+
+
+def _get_change(column: str) -> str:
+    """
+    Get the SQL expression of the change of a column since the last round.
+
+    The change is NULL if either value is unknown (NA), or if exactly one of
+    them is unlimited (INF).
+    """
+    return f"""
+        CASE
+          WHEN Last_{column} = {NA} OR {column} = {NA} THEN NULL
+          WHEN Last_{column} = {INF} OR {column} = {INF} THEN
+            CASE WHEN Last_{column} = {column} THEN 0 END
+          ELSE {column} - Last_{column}
+        END"""
+
+
+def create_deltas(conn: sqlite3.Connection) -> None:
+    """
+    Record how the classes changed between consecutive rounds.
+
+    The deltas table has one row per class and round after its first, with
+    the values of DELTA_COLUMNS in the previous round the class was in
+    (From_Round) and in the round (To_Round), and their change. It is
+    computed with window functions over the merged table, and rebuilt from
+    scratch.
+    """
+    conn.execute("DROP TABLE IF EXISTS deltas")
+
+    columns = ",\n".join(f"""
+          {column}_From INTEGER NOT NULL,
+          {column}_To INTEGER NOT NULL,
+          {column}_Change INTEGER""" for column in DELTA_COLUMNS)
+    conn.execute(f"""
+        CREATE TABLE deltas (
+          Year TEXT NOT NULL,
+          Semester TEXT NOT NULL,
+          Student_Type TEXT NOT NULL,
+          Code TEXT NOT NULL,
+          Class TEXT NOT NULL,
+          From_Round INTEGER NOT NULL,
+          To_Round INTEGER NOT NULL,
+          {columns},
+          PRIMARY KEY (Year, Semester, Student_Type, To_Round, Code, Class)
+        ) WITHOUT ROWID;
+    """)
+
+    last_values = ",\n".join(
+        f"LAG({column}) OVER rounds AS Last_{column}" for column in DELTA_COLUMNS)
+    values = ",\n".join(
+        f"Last_{column}, {column}, {_get_change(column)}"
+        for column in DELTA_COLUMNS)
+    # Only the known delta columns are interpolated
+    conn.execute(f"""
+        INSERT INTO deltas
+        SELECT Year, Semester, Student_Type, Code, Class, Last_Round, Round,
+          {values}
+        FROM (
+          SELECT Year, Semester, Student_Type, Code, Class, Round,
+            {", ".join(DELTA_COLUMNS)},
+            LAG(Round) OVER rounds AS Last_Round,
+            {last_values}
+          FROM merged
+          WINDOW rounds AS (
+            PARTITION BY Year, Semester, Student_Type, Code, Class
+            ORDER BY Round
+          )
+        )
+        WHERE Last_Round IS NOT NULL;
+    """)  # noqa: S608
+
+    conn.execute("""
+        CREATE INDEX deltas_code
+        ON deltas (Year, Semester, Student_Type, Code, Class, To_Round);
+    """)
+    conn.commit()
+
+
+def create_search_index(conn: sqlite3.Connection) -> None:
+    """
+    Index the courses for full-text search.
+
+    The course_search table is an FTS5 index over the code, title, faculty
+    and department of every row of the courses table, across all terms.
+    Prefixes of 2 and 3 characters are indexed too, to speed up searching
+    as the user types. Matches are ranked by BM25 with SEARCH_WEIGHTS.
+    """
+    conn.execute("DROP TABLE IF EXISTS course_search")
+    conn.execute("""
+        CREATE VIRTUAL TABLE course_search USING fts5(
+          Code, Title, Faculty, Department,
+          prefix = '2 3'
+        );
+    """)
+    conn.execute("""
+        INSERT INTO course_search (Code, Title, Faculty, Department)
+        SELECT Code, Title, Faculty, Department
+        FROM courses;
+    """)
+    conn.execute(
+        "INSERT INTO course_search (course_search, rank) VALUES ('rank', ?)",
+        (f"bm25({', '.join(map(str, SEARCH_WEIGHTS))})",))
+    conn.execute("INSERT INTO course_search (course_search) VALUES ('optimize')")
+    conn.commit()
+
 
 def merge_csv_files(csv_files: list[str]) -> None:
     """
     Given a list of CourseReg History cleaned files,
     after having imported all relevant CSVs,
     attempt to merge them with useful Vacancy Histories.
+
+    The merged rows replace any rows of the same year, semester, student type
+    and round in the `merged` table.
     """
     conn = sqlite3.connect(os.path.join(BASE_DIR, "database.db"))
 
+    create_tables(conn)
+
     for csv_file in csv_files:
         # Given name of CourseReg:
         # coursereg_history_data_cleaned_2324_1_ug_round_0
@@ -30,14 +280,22 @@ def merge_csv_files(csv_files: list[str]) -> None:
                         .replace("_ug_", "_")
                         .replace("_gd_", "_"))
 
-        # Corresponding name of Merged: merged_2324_1_ug_round_0
-        name = coursereg_name.replace("coursereg_history_data_cleaned_",
-                                      "merged_")
+        # Name of the per-round table created by older builds:
+        # merged_2324_1_ug_round_0
+        legacy_name = coursereg_name.replace("coursereg_history_data_cleaned_",
+                                             "merged_")
+
+        # Key of the rows, from the path: .../2324/1/ug/round_0.csv
+        year, semester, student_type, round_name = (
+            Path(csv_file).with_suffix("").parts[-4:])
+        round_number = int(round_name.replace("round_", ""))
 
-        conn.execute(f'DROP TABLE IF EXISTS "{name}"')
+        conn.execute(f'DROP TABLE IF EXISTS "{legacy_name}"')
+        create_join_indexes(conn, [vacancy_name, coursereg_name])
+        conn.execute("DROP TABLE IF EXISTS temp.merging")
 
         conn.execute(f"""
-            CREATE TABLE {name} AS
+            CREATE TEMP TABLE merging AS
             SELECT
               COALESCE(vacancy.Faculty, coursereg.Faculty) AS Faculty,
               COALESCE(vacancy.Department, coursereg.Department) AS Department,
@@ -71,6 +329,71 @@ def merge_csv_files(csv_files: list[str]) -> None:
               vacancy.Class = coursereg.Class;
         """)
 
+        conn.execute("""
+            INSERT OR IGNORE INTO courses (Code, Faculty, Department, Title)
+            SELECT DISTINCT Code, Faculty, Department, Title
+            FROM temp.merging;
+        """)
+
+        conn.execute("""
+            DELETE FROM merged
+            WHERE Year = ? AND Semester = ? AND Student_Type = ? AND Round = ?;
+        """, (year, semester, student_type, round_number))
+
+        conn.execute("""
+            INSERT INTO merged
+            SELECT
+              ? AS Year,
+              ? AS Semester,
+              ? AS Student_Type,
+              merging.Code,
+              ? AS Round,
+              merging.Class,
+              courses.Course_Id,
+              merging.UG,
+              merging.GD,
+              merging.DK,
+              merging.NG,
+              merging.CPE,
+              merging.Vacancy,
+              merging.Demand,
+              merging.Successful_Main,
+              merging.Successful_Reserve,
+              merging.Quota_Exceeded,
+              merging.Timetable_Clashes,
+              merging.Workload_Exceeded,
+              merging.Others
+            FROM
+              temp.merging AS merging
+            JOIN
+              courses
+            ON
+              courses.Code = merging.Code
+            AND
+              courses.Faculty = merging.Faculty
+            AND
+              courses.Department = merging.Department
+            AND
+              courses.Title = merging.Title;
+        """, (year, semester, student_type, round_number))
+
+        conn.execute("DROP TABLE temp.merging")
+        conn.commit()
+
+    # Remove courses which are no longer referred to by any merged row
+    conn.execute("""
+        DELETE FROM courses
+        WHERE Course_Id NOT IN (SELECT Course_Id FROM merged);
+    """)
+    conn.commit()
+
+    create_rankings(conn)
+    create_deltas(conn)
+    create_search_index(conn)
+
+    # Reclaim the space of dropped tables and deleted rows
+    conn.execute("VACUUM")
+
     conn.close()
 
 
@@ -0,0 +1,107 @@
+"""Materialize the data of every course into the payloads table."""
+import argparse
+import json
+import sqlite3
+from typing import cast
+
+from src.history.api import (
+    BLANK_ROUND,
+    DATABASE_PATH,
+    ClassDict,
+    CourseData,
+    _query_courses,
+    clear_caches,
+)
+
+
+def _encode_payload(course: CourseData) -> str:
+    """
+    Encode the data of a course, to be decoded by _decode_payload() of the API.
+
+    Args:
+    ----
+        course (CourseData): The course data, as assembled by the API.
+
+    Returns:
+    -------
+        str: The payload, a compact JSON array.
+    """
+    classes = cast(ClassDict, course["classes"])
+    return json.dumps(
+        [course["faculty"], course["department"], course["title"],
+         {class_name: [None if round_data is BLANK_ROUND
+                       else list(round_data.values())
+                       for round_data in rounds]
+          for class_name, rounds in classes.items()}],
+        separators=(",", ":"))
+
+
+def write_payloads(conn: sqlite3.Connection) -> None:
+    """
+    Rebuild the payloads table, from the merged data of the database.
+
+    The rounds included are those with a PDF in the catalog of the API, so
+    connection_pool must read the same database.
+
+    Args:
+    ----
+        conn (sqlite3.Connection): The connection to the database, with
+            sqlite3.Row as its row factory.
+    """
+    conn.execute("DROP TABLE IF EXISTS payloads")
+    conn.execute("""
+        CREATE TABLE payloads (
+          Year TEXT NOT NULL,
+          Semester TEXT NOT NULL,
+          Student_Type TEXT NOT NULL,
+          Code TEXT NOT NULL,
+          Payload TEXT NOT NULL,
+          PRIMARY KEY (Year, Semester, Student_Type, Code)
+        ) WITHOUT ROWID;
+    """)
+
+    terms = conn.execute("""
+        SELECT DISTINCT Year, Semester, Student_Type
+        FROM merged
+        ORDER BY Year, Semester, Student_Type
+    """).fetchall()
+    for year, semester, student_type in terms:
+        conn.executemany(
+            "INSERT INTO payloads VALUES (?, ?, ?, ?, ?)",
+            [(year, semester, student_type, course["code"],
+              _encode_payload(course))
+             for course in _query_courses(conn, year, semester, student_type)])
+    conn.commit()
+
+
+def create_payloads() -> None:
+    """
+    Materialize the data of every course of every term in the payloads table.
+
+    Each course is assembled by the API, with its padding and blank rounds,
+    and stored as a payload keyed by (year, semester, student type, code),
+    so that get_data() is a single indexed lookup.
+
+    The payloads are rebuilt from scratch, after the catalog, as the rounds
+    included depend on which PDFs exist.
+    """
+    # The catalog may have been read before it was rebuilt
+    clear_caches()
+
+    conn = sqlite3.connect(DATABASE_PATH)
+    conn.row_factory = sqlite3.Row
+
+    write_payloads(conn)
+
+    conn.close()
+
+    clear_caches()
+
+
+def main() -> None:
+    """Rebuild the payloads table of the database."""
+    parser = argparse.ArgumentParser(
+        description="Materialize the data of every course of every term.")
+    parser.parse_args()
+
+    create_payloads()
@@ -0,0 +1,126 @@
+"""Save the data of every term as marshal snapshots."""
+import argparse
+import json
+import marshal
+import sqlite3
+from pathlib import Path
+from typing import Union, cast
+
+from src.history.api import (
+    BLANK_ROUND,
+    DATABASE_PATH,
+    SNAPSHOTS_DIR,
+    ClassDict,
+    CourseData,
+    _get_snapshot_path,
+    _hash_database,
+    _query_stored_courses,
+    clear_caches,
+)
+
+# A course, as stored in a snapshot
+SnapshotCourse = tuple[str, str, str, str,
+                       dict[str, list[Union[tuple[int, ...], None]]]]
+
+
+def _encode_course(course: CourseData) -> SnapshotCourse:
+    """
+    Encode the data of a course, to be decoded by _decode_course() of the API.
+
+    Args:
+    ----
+        course (CourseData): The course data, as assembled by the API.
+
+    Returns:
+    -------
+        SnapshotCourse: The code, faculty, department, title, and the rounds
+            of each class, as tuples of values or None for a padded round.
+    """
+    classes = cast(ClassDict, course["classes"])
+    return (str(course["code"]), str(course["faculty"]),
+            str(course["department"]), str(course["title"]),
+            {class_name: [None if round_data is BLANK_ROUND
+                          else tuple(round_data.values())
+                          for round_data in rounds]
+             for class_name, rounds in classes.items()})
+
+
+def _write_atomically(path: Path, data: bytes) -> None:
+    """Write a file, so that it is never seen half-written."""
+    temp_path = path.with_name(f"{path.name}.tmp")
+    temp_path.write_bytes(data)
+    temp_path.replace(path)
+
+
+def create_snapshots(path: Path = SNAPSHOTS_DIR,
+                     database_path: Path = DATABASE_PATH) -> None:
+    """
+    Snapshot the output of get_all_data() for every term, for cold starts.
+
+    Each term is assembled by the API and marshalled into a file of its own,
+    tagged with the hash of the database. The manifest, which records the
+    hash, size and mtime of the database, is removed first and written
+    last, so the API falls back to the database until every snapshot is
+    written.
+
+    This must be the last stage of the build, as the snapshots are only used
+    while the database is unchanged.
+
+    Args:
+    ----
+        path (Path): The directory to write the snapshots to.
+        database_path (Path): The database to snapshot. The catalog of the
+            API must be read from the same database.
+    """
+    # The catalog may have been read before it was rebuilt
+    clear_caches()
+
+    path.mkdir(parents=True, exist_ok=True)
+    manifest_path = path / "manifest.json"
+    manifest_path.unlink(missing_ok=True)
+
+    version = _hash_database(database_path)
+    stat = database_path.stat()
+
+    conn = sqlite3.connect(f"{database_path.as_uri()}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+
+    terms = conn.execute("""
+        SELECT DISTINCT Year, Semester, Student_Type
+        FROM merged
+        ORDER BY Year, Semester, Student_Type
+    """).fetchall()
+
+    written = set()
+    for year, semester, student_type in terms:
+        courses = [_encode_course(course) for course
+                   in _query_stored_courses(conn, year, semester, student_type)]
+        if not courses:
+            continue
+        snapshot_path = _get_snapshot_path(year, semester, student_type, path)
+        _write_atomically(snapshot_path, marshal.dumps((version, courses)))
+        written.add(snapshot_path)
+
+    conn.close()
+
+    # Remove the snapshots of terms which are no longer in the database
+    for snapshot_path in path.glob("*.marshal"):
+        if snapshot_path not in written:
+            snapshot_path.unlink()
+
+    _write_atomically(manifest_path, json.dumps({
+        "database": version,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+    }).encode())
+
+    clear_caches()
+
+
+def main() -> None:
+    """Save the snapshots of the database."""
+    parser = argparse.ArgumentParser(
+        description="Snapshot the data of every term for fast cold starts.")
+    parser.parse_args()
+
+    create_snapshots()
@@ -1,23 +1,46 @@
+import functools
+import itertools
+import logging
 import os
 from argparse import ArgumentParser
+from collections.abc import Iterator
 from pathlib import Path
-from typing import Any, Union
+from typing import Any, Union, cast
 
-from flask import Flask, Response, render_template, request, send_from_directory
+from flask import (
+    Flask,
+    Response,
+    jsonify,
+    render_template,
+    request,
+    send_from_directory,
+    stream_template,
+)
 
 from lib.nusmods import nusmods_link_of_code
+from src.history import api
 from src.history.api import (
     INF,
-    get_round_numbers,
+    ClassDict,
+    CourseData,
+    SingleFlight,
     get_all_data,
+    get_data_many,
     get_latest_year_and_sem_with_data,
     get_pdf_filepath,
+    get_round_numbers,
+    iter_all_data,
     pdf_exists,
+    search_codes,
 )
 
 app = Flask(__name__)
 BASE_DIR = Path(__file__).resolve().parent
 
+# Concurrent renders of the same page, when it is not precomputed, are done
+# once. render_flight.stats() shows how many requests were coalesced.
+render_flight: SingleFlight[str] = SingleFlight()
+
 
 @app.context_processor
 def context_processor() -> dict[Any, Any]:
@@ -57,7 +80,31 @@ def history() -> str:
         with open(filepath, "r") as f:
             return f.read()
 
-    # Fallback to dynamic rendering if the file doesn't exist
+    # Fallback to dynamic rendering if the file doesn't exist.
+    # The page also depends on the submitted form, which is in the key.
+    key = (year, semester, student_type,
+           *(request.form.get(name) for name in ("year", "semester", "type")))
+    return render_flight.do(key, functools.partial(
+        _render_history, year, semester, student_type))
+
+
+def _render_history(year: str, semester: str, student_type: str) -> str:
+    """
+    Render the course history of a term from the database.
+
+    The courses come from get_all_data(), so repeated renders of a term hit
+    its cache, or its snapshot, instead of reading the whole term again.
+
+    Args:
+    ----
+        year (str): The academic year.
+        semester (str): The semester.
+        student_type (str): The student type.
+
+    Returns:
+    -------
+        str: The rendered HTML content to display the course history.
+    """
     output, error = [], None
     try:
         output = get_all_data(year, semester, student_type)
@@ -67,6 +114,82 @@ def history() -> str:
     return render_template("history.html", output=output, error=error)
 
 
+def stream_history(year: str, semester: str, student_type: str,
+                   ) -> Iterator[str]:
+    """
+    Stream the course history of a term, as rendered by _render_history().
+
+    The courses come from iter_all_data(), so each one is rendered as soon as
+    it is read, instead of the whole term being held in memory and cached.
+    It must be called, and iterated, in the request context of the form.
+
+    Args:
+    ----
+        year (str): The academic year.
+        semester (str): The semester.
+        student_type (str): The student type.
+
+    Returns:
+    -------
+        Iterator[str]: The chunks of the rendered HTML content.
+    """
+    courses = iter_all_data(year, semester, student_type)
+    first = next(courses, None)
+    if first is None:
+        # Render the error of a term without data as get_all_data() raises it
+        return iter([_render_history(year, semester, student_type)])
+
+    return stream_template("history.html",
+                           output=itertools.chain([first], courses),
+                           error=None)
+
+
+def _course_to_json(course: CourseData) -> dict[str, Any]:
+    """
+    Convert the data of a course into plain dicts and lists for JSON.
+
+    Args:
+    ----
+        course (CourseData): The course data from the API.
+
+    Returns:
+    -------
+        dict[str, Any]: The course data, with each round as a dict.
+    """
+    classes = cast(ClassDict, course["classes"])
+    return {**course,
+            "classes": {class_name: [dict(round_data) for round_data in rounds]
+                        for class_name, rounds in classes.items()}}
+
+
+@app.route("/search", methods=["GET"])
+def search() -> tuple[Response, int]:
+    """
+    Search the courses of a term by course code prefix.
+
+    The query string holds the year, semester and type, and `q`, the
+    space-separated prefixes matched as by the search bar. Only the matching
+    courses are fetched from the database.
+
+    Returns
+    -------
+        tuple[Response, int]: The matching courses as JSON, and the status.
+    """
+    (latestYear, latestSem) = get_latest_year_and_sem_with_data()
+    year = request.args.get("year", latestYear)
+    semester = request.args.get("semester", latestSem)
+    student_type = request.args.get("type", "ug")
+
+    try:
+        codes = search_codes(year, semester, student_type,
+                             request.args.get("q", ""))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 404
+
+    courses = get_data_many(year, semester, student_type, codes).found
+    return jsonify([_course_to_json(course) for course in courses.values()]), 200
+
+
 def _serve_file(filepath: str) -> Response:
     """
     Helper function which serves the file based on the filepath.
@@ -111,10 +234,29 @@ def serve_pdf(
     return _serve_file(str(get_pdf_filepath(year, semester, student_type, round_num)))
 
 
+def load_database_into_memory() -> None:
+    """
+    Serve the data from an in-memory copy of the database, loaded now.
+
+    The copy is reloaded when the database file changes. Each load is
+    logged, with its time and size, by the logger of src.history.
+    """
+    api.use_in_memory_database()
+
+
 def main() -> None:
     parser = ArgumentParser(description="Web app for CourseRekt")
     parser.add_argument("--port", type=int, nargs=1, default=5000,
                         help="Port where the app is run.")
+    parser.add_argument("--in-memory", action="store_true",
+                        help="Load the database into memory at startup.")
     args = parser.parse_args()
 
+    logging.basicConfig(level=logging.INFO)
+    if args.in_memory:
+        load_database_into_memory()
+
+    # Compute the default year/sem before serving, so requests hit the cache
+    get_latest_year_and_sem_with_data()
+
     app.run(host="0.0.0.0", port=args.port, debug=True)
@@ -1,6 +1,8 @@
+import logging
 from argparse import ArgumentParser
 
-from src.web.app import app
+from src.history.api import get_latest_year_and_sem_with_data
+from src.web.app import app, load_database_into_memory
 from src.web.precomp import generate_pages
 
 
@@ -10,8 +12,17 @@ def main() -> None:
                         help="Port where the app is run.")
     parser.add_argument("-s", "--skip-precompute", action="store_true",
                         help="Use existing static pages instead of re-computing them.")
+    parser.add_argument("-m", "--in-memory", action="store_true",
+                        help="Load the database into memory at startup.")
     args = parser.parse_args()
 
+    logging.basicConfig(level=logging.INFO)
+    if args.in_memory:
+        load_database_into_memory()
+
+    # Compute the default year/sem before serving, so requests hit the cache
+    get_latest_year_and_sem_with_data()
+
     if not args.skip_precompute:
         generate_pages()
 
@@ -2,7 +2,7 @@ import itertools
 import os
 import shutil
 
-from src.web.app import app
+from src.web.app import app, stream_history
 
 
 def generate_pages() -> None:
@@ -32,14 +32,11 @@ def generate_html(year: str, semester: str, student_type: str) -> None:
         semester: The semester (e.g., 1 or 2).
         student_type: The student type (e.g., "ug" or "gd").
     """
-    client = app.test_client()
-
     data = {
         "year": year,
         "semester": semester,
         "type": student_type,
     }
-    response = client.post("/", data=data, follow_redirects=True)
 
     # Construct the file path
     file_path = f"src/web/static/pages/{year}/{semester}/{student_type}/index.html"
@@ -47,6 +44,8 @@ def generate_html(year: str, semester: str, student_type: str) -> None:
     # Create the necessary directories if they don't exist
     os.makedirs(os.path.dirname(file_path), exist_ok=True)
 
-    # Save the response text as an HTML file
-    with open(file_path, "w") as f:
-        f.write(response.text)
+    # Save the page as it is rendered, one course at a time, as the form
+    # submission would render it
+    with app.test_request_context("/", method="POST", data=data), \
+            open(file_path, "w") as f:
+        f.writelines(stream_history(year, semester, student_type))
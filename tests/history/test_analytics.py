@@ -0,0 +1,111 @@
+import sqlite3
+import unittest
+from typing import Union
+
+from src.history.analytics import write_analytics
+from src.history.api import (
+    DATABASE_PATH,
+    INF,
+    NA,
+    AnalyticsCell,
+    get_all_data,
+    get_analytics,
+    get_analytics_breakdown,
+    get_round_numbers,
+)
+
+
+class AnalyticsTestCase(unittest.TestCase):
+    def get_expected(self,
+                     round_num: int,
+                     faculty: Union[str, None] = None,
+                     department: Union[str, None] = None) -> dict[str, int]:
+        index = get_round_numbers("2223").index(round_num)
+        totals = dict.fromkeys(("classes", "limited_classes",
+                                "unlimited_classes", "demand", "vacancy",
+                                "limited_demand", "quota_exceeded"), 0)
+        for course in get_all_data("2223", "2", "ug"):
+            if faculty is not None and course["faculty"] != faculty:
+                continue
+            if department is not None and course["department"] != department:
+                continue
+            for rounds in course["classes"].values():  # type: ignore[union-attr]
+                round_data = rounds[index]
+                if all(value == NA for value in round_data.values()):
+                    continue
+                totals["classes"] += 1
+                totals["demand"] += max(round_data["demand"], 0)
+                totals["quota_exceeded"] += max(round_data["quota_exceeded"], 0)
+                if round_data["vacancy"] == INF:
+                    totals["unlimited_classes"] += 1
+                elif round_data["vacancy"] != NA:
+                    totals["limited_classes"] += 1
+                    totals["vacancy"] += round_data["vacancy"]
+                    totals["limited_demand"] += max(round_data["demand"], 0)
+        return totals
+
+    def assert_totals(self, cell: AnalyticsCell, expected: dict[str, int]) -> None:
+        self.assertEqual({key: getattr(cell, key) for key in expected}, expected)
+
+    def test_round_totals(self) -> None:
+        cell = get_analytics("2223", "2", "ug", 1)
+        self.assertIsNone(cell.faculty)
+        self.assert_totals(cell, self.get_expected(1))
+        self.assertEqual(cell.demand_ratio, cell.limited_demand / cell.vacancy)
+
+    def test_department_totals(self) -> None:
+        cell = get_analytics("22/23", 2, "UG", "2", "School of Computing",
+                             "Computer Science")
+        self.assertEqual(cell.department, "Computer Science")
+        self.assert_totals(cell, self.get_expected(2, "School of Computing",
+                                                   "Computer Science"))
+        self.assertEqual(cell.unsuccessful,
+                         cell.quota_exceeded + cell.timetable_clashes
+                         + cell.workload_exceeded + cell.others)
+
+    def test_breakdowns_add_up(self) -> None:
+        total = get_analytics("2223", "2", "ug", 1)
+        faculties = get_analytics_breakdown("2223", "2", "ug", 1)
+        self.assertEqual([cell.faculty for cell in faculties],
+                         sorted(cell.faculty for cell in faculties))
+        for index, field in enumerate(total._fields[2:], start=2):
+            self.assertEqual(sum(cell[index] for cell in faculties),
+                             total[index], field)
+        for faculty in faculties:
+            departments = get_analytics_breakdown("2223", "2", "ug", 1,
+                                                  faculty.faculty)
+            self.assertTrue(departments)
+            self.assertEqual(sum(cell.classes for cell in departments),
+                             faculty.classes)
+
+    def test_empty_names_are_not_totals(self) -> None:
+        conn = sqlite3.connect(":memory:")
+        with sqlite3.connect(DATABASE_PATH) as source:
+            source.backup(conn)
+        source.close()
+        conn.execute("UPDATE courses SET Faculty = '', Department = ''"
+                     " WHERE Code LIKE 'CS%'")
+        write_analytics(conn)
+
+        rows = conn.execute("""
+            SELECT Level, Classes FROM analytics
+            WHERE Year = '2223' AND Semester = '2' AND Student_Type = 'ug'
+              AND Round = 1 AND Faculty = ''
+        """).fetchall()
+        conn.close()
+        self.assertEqual(sorted(level for level, _ in rows),
+                         ["Department", "Faculty", "Round"])
+        classes = dict(rows)
+        self.assertLess(classes["Department"], classes["Round"])
+        self.assertEqual(classes["Department"], classes["Faculty"])
+
+    def test_no_data(self) -> None:
+        with self.assertRaises(ValueError):
+            get_analytics("1819", "2", "ug", 1)
+        with self.assertRaises(ValueError):
+            get_analytics("2223", "2", "ug", 1, department="Computer Science")
+        self.assertEqual(get_analytics_breakdown("1819", "2", "ug", 1), ())
+
+
+if __name__ == "__main__":
+    unittest.main()
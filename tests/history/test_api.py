@@ -1,6 +1,51 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
 import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Union, cast
+from unittest import mock
 
-from src.history.api import CourseData, get_data
+from src.history.api import (
+    BLANK_ROUND,
+    DATABASE_PATH,
+    INF,
+    NA,
+    ROUND_FIELDS,
+    ClassDict,
+    ConnectionPool,
+    CourseData,
+    InMemoryConnectionPool,
+    LatestTermCache,
+    SingleFlight,
+    TermDataCache,
+    _estimate_size,
+    _find_latest_year_and_sem,
+    _get_courses_query,
+    _get_set_of_all_codes,
+    _load_all_data,
+    clear_caches,
+    get_all_data,
+    get_catalog,
+    get_course_history,
+    get_data,
+    get_data_many,
+    get_pdf_filepath,
+    get_round_deltas,
+    get_round_numbers,
+    get_top_classes,
+    instrument,
+    iter_all_data,
+    pdf_exists,
+    search_codes,
+    search_courses,
+    term_data_cache,
+    use_in_memory_database,
+)
 
 
 class MainTestCase(unittest.TestCase):
@@ -704,6 +749,655 @@ class MainTestCase(unittest.TestCase):
         with self.assertRaises(ValueError):
             get_data("2223", "2", "ug", "")
 
+    def test_all_data_matches_get_data(self) -> None:
+        result = get_all_data("2223", "2", "ug")
+        expected_data = [get_data("2223", "2", "ug", code)
+                         for code in sorted(_get_set_of_all_codes("2223", "2", "ug"))]
+        self.assertEqual(result, expected_data)
+
+    def test_all_data_bad_year(self) -> None:
+        with self.assertRaises(ValueError):
+            get_all_data("1819", "2", "ug")
+
+    def test_iter_all_data_matches_all_data(self) -> None:
+        self.assertEqual(list(iter_all_data(2223, " 2", "UG")),
+                         get_all_data("2223", "2", "ug"))
+
+    def test_iter_all_data_bad_year(self) -> None:
+        self.assertEqual(list(iter_all_data("1819", "2", "ug")), [])
+
+    def test_iter_all_data_releases_connection_when_closed(self) -> None:
+        pool = ConnectionPool(DATABASE_PATH)
+        with mock.patch("src.history.api.connection_pool", pool):
+            courses = iter_all_data("2223", "2", "ug")
+            next(courses)
+            self.assertEqual(pool.stats()["idle"], 0)
+            courses.close()
+            self.assertEqual(pool.stats()["idle"], 1)
+        pool.close()
+
+    def test_search_codes(self) -> None:
+        codes = sorted(_get_set_of_all_codes("2223", "2", "ug"))
+        self.assertEqual(search_codes("2223", "2", "ug", " cs2  CS pf1 ZZ"),
+                         [code for code in codes
+                          if code.startswith(("CS", "PF1"))])
+        self.assertIn("CS2030S", search_codes("22/23", 2, "UG", "cs2030s"))
+        self.assertEqual(search_codes("2223", "2", "ug", "  "), codes)
+        self.assertEqual(search_codes("2223", "2", "ug", "CC0092"), [])
+
+    def test_search_codes_bad_year(self) -> None:
+        with self.assertRaises(ValueError):
+            search_codes("1819", "2", "ug", "CS")
+
+    def test_search_courses(self) -> None:
+        self.assertEqual(search_courses("programming methodology")[0].code,
+                         "CS2030S")
+        self.assertEqual(search_courses("Program Method", 2223, 2, "ug")[0].code,
+                         "CS2030S")
+        self.assertEqual(search_courses("aviation law")[0].title,
+                         "Aviation Law & Policy")
+
+    def test_search_courses_in_term(self) -> None:
+        codes = _get_set_of_all_codes("2223", "2", "ug")
+        result = search_courses("computing", "22/23", " 2", "UG", limit=1000)
+        self.assertTrue(result)
+        self.assertTrue(all(course.code in codes for course in result))
+        self.assertEqual(len({course.code for course in result}), len(result))
+        self.assertEqual(len(search_courses("computing", limit=3)), 3)
+
+    def test_search_courses_no_match(self) -> None:
+        self.assertEqual(search_courses("programming", "1819"), [])
+        self.assertEqual(search_courses('" OR (*'), [])
+        self.assertEqual(search_courses(""), [])
+
+    def test_course_history(self) -> None:
+        history = get_course_history(" cs2030s")
+        terms = [(entry.year, entry.semester, entry.ug_gd) for entry in history]
+        self.assertIn(("2223", "2", "ug"), terms)
+        self.assertEqual(terms, sorted(terms))
+        for entry in history:
+            self.assertEqual(entry.data, get_data(entry.year, entry.semester,
+                                                  entry.ug_gd, "CS2030S"))
+
+    def test_course_history_bad_course_code(self) -> None:
+        with self.assertRaises(ValueError):
+            get_course_history("CC0092")
+
+    def test_data_many(self) -> None:
+        result = get_data_many("2223", "2", "ug",
+                               ["cs2102 ", "CC0092", "CS2030S", "CS2102"])
+        self.assertEqual(list(result.found), ["CS2102", "CS2030S"])
+        self.assertEqual(result.missing, ["CC0092"])
+        for code, data in result.found.items():
+            self.assertEqual(data, get_data("2223", "2", "ug", code))
+
+    def test_data_many_more_than_max_codes_per_query(self) -> None:
+        codes = sorted(_get_set_of_all_codes("2223", "2", "ug"))
+        with mock.patch("src.history.api.MAX_CODES_PER_QUERY", 7):
+            result = get_data_many("2223", "2", "ug", codes)
+        self.assertEqual(list(result.found.values()),
+                         get_all_data("2223", "2", "ug"))
+        self.assertEqual(result.missing, [])
+
+    def test_data_many_bad_year(self) -> None:
+        result = get_data_many("1819", "2", "ug", ["CS2030S"])
+        self.assertEqual(result.found, {})
+        self.assertEqual(result.missing, ["CS2030S"])
+
+
+class RankingTestCase(unittest.TestCase):
+    def get_expected(self,
+                     metric: str,
+                     faculty: Union[str, None] = None,
+                     ) -> list[tuple[str, str, str, float]]:
+        index = get_round_numbers("2223").index(1)
+        ranked = []
+        for course in get_all_data("2223", "2", "ug"):
+            if faculty is not None and course["faculty"] != faculty:
+                continue
+            for class_name, rounds in course["classes"].items():  # type: ignore[union-attr]
+                demand = rounds[index]["demand"]
+                vacancy = rounds[index]["vacancy"]
+                if metric == "quota_exceeded":
+                    if rounds[index]["quota_exceeded"] == NA:
+                        continue
+                    value = float(rounds[index]["quota_exceeded"])
+                elif vacancy == NA:
+                    continue
+                elif vacancy == INF or (vacancy == 0 and demand <= 0):
+                    value = 0.0
+                elif vacancy == 0:
+                    value = float("inf")
+                else:
+                    value = demand / vacancy
+                ranked.append((str(course["code"]), class_name,
+                               str(course["faculty"]), value))
+        ranked.sort(key=lambda item: (-item[3], item[0], item[1]))
+        return ranked
+
+    def test_top_classes_by_demand_ratio(self) -> None:
+        result = get_top_classes("2223", "2", "ug", 1, k=15)
+        self.assertEqual([tuple(item) for item in result],
+                         self.get_expected("demand_ratio")[:15])
+
+    def test_top_classes_by_quota_exceeded_of_faculty(self) -> None:
+        result = get_top_classes("2223", "2", "ug", 1, "quota_exceeded", 15,
+                                 "School of Computing")
+        self.assertEqual([tuple(item) for item in result],
+                         self.get_expected("quota_exceeded",
+                                           "School of Computing")[:15])
+
+    def test_top_classes_no_pdf(self) -> None:
+        self.assertEqual(get_top_classes("1819", "2", "ug", 1), [])
+
+    def test_top_classes_bad_metric(self) -> None:
+        with self.assertRaises(ValueError):
+            get_top_classes("2223", "2", "ug", 1, "demand")
+
+
+class RoundDeltaTestCase(unittest.TestCase):
+    def get_expected(self, semester: str = "2") -> list[tuple[object, ...]]:
+        round_numbers = get_round_numbers("2223")
+        deltas: list[tuple[object, ...]] = []
+        for course in get_all_data("2223", semester, "ug"):
+            for class_name, rounds in course["classes"].items():  # type: ignore[union-attr]
+                present = [(round_numbers[index], round_data)
+                           for index, round_data in enumerate(rounds)
+                           if round_data != BLANK_ROUND]
+                for (from_round, before), (to_round, after) in zip(
+                        present, present[1:]):
+                    delta: list[object] = [course["code"], class_name,
+                                           from_round, to_round]
+                    for key in ("demand", "vacancy", "quota_exceeded"):
+                        values = (before[key], after[key])
+                        if NA in values or (INF in values
+                                            and values[0] != values[1]):
+                            change = None
+                        else:
+                            change = values[1] - values[0]
+                        delta.extend((*values, change))
+                    deltas.append(tuple(delta))
+        deltas.sort(key=lambda delta: (delta[0], delta[1], delta[3]))
+        return deltas
+
+    def test_round_deltas_of_term(self) -> None:
+        result = get_round_deltas("2223", "2", "ug")
+        self.assertEqual([tuple(delta) for delta in result],
+                         self.get_expected())
+
+    def test_vacancy_dropped_to_zero(self) -> None:
+        result = get_round_deltas("22/23", 1, "UG", from_round=1, to_round=2,
+                                  vacancy_to=0, vacancy_dropped=True)
+        expected = [delta for delta in self.get_expected("1")
+                    if delta[2:4] == (1, 2) and delta[8] == 0
+                    and delta[9] is not None and delta[9] < 0]  # type: ignore[operator]
+        self.assertTrue(expected)
+        self.assertEqual([tuple(delta) for delta in result], expected)
+
+    def test_round_deltas_of_codes(self) -> None:
+        result = get_round_deltas("2223", "2", "ug", codes=["cs2030s"])
+        self.assertEqual([tuple(delta) for delta in result],
+                         [delta for delta in self.get_expected()
+                          if delta[0] == "CS2030S"])
+        self.assertEqual(result[0].class_name, "L1")
+
+    def test_round_deltas_no_pdf(self) -> None:
+        self.assertEqual(get_round_deltas("1819", "2", "ug"), [])
+        self.assertEqual(get_round_deltas("2223", "2", "ug", to_round=5), [])
+
+
+class ProjectionTestCase(unittest.TestCase):
+    FIELDS = ("vacancy", "demand", "ug", "gd")
+
+    def assert_projected(self, result: CourseData, full: CourseData) -> None:
+        self.assertEqual({key: value for key, value in result.items()
+                          if key != "classes"},
+                         {key: value for key, value in full.items()
+                          if key != "classes"})
+        classes = cast(ClassDict, result["classes"])
+        full_classes = cast(ClassDict, full["classes"])
+        self.assertEqual(list(classes), list(full_classes))
+        for class_name, rounds in classes.items():
+            self.assertEqual(
+                rounds,
+                [{field: round_data[field]
+                  for field in ("ug", "gd", "demand", "vacancy")}
+                 for round_data in full_classes[class_name]])
+
+    def test_get_data_fields(self) -> None:
+        result = get_data("2223", "2", "ug", "CS2030S", fields=self.FIELDS)
+        self.assert_projected(result, get_data("2223", "2", "ug", "CS2030S"))
+        rounds = cast(ClassDict, result["classes"])["L1"]
+        self.assertEqual(list(rounds[0]), ["ug", "gd", "demand", "vacancy"])
+        with self.assertRaises(KeyError):
+            rounds[0]["quota_exceeded"]
+
+    def test_get_data_fields_without_payloads(self) -> None:
+        with mock.patch("src.history.api._has_payloads", return_value=False):
+            result = get_data("2223", "2", "ug", "CS2030S",
+                              fields=self.FIELDS)
+        self.assert_projected(result, get_data("2223", "2", "ug", "CS2030S"))
+
+    def test_get_all_data_fields(self) -> None:
+        result = get_all_data("2223", "2", "ug", self.FIELDS)
+        full = get_all_data("2223", "2", "ug")
+        self.assertEqual(len(result), len(full))
+        for course, full_course in zip(result, full):
+            self.assert_projected(course, full_course)
+        self.assertIs(get_all_data("2223", "2", "ug", reversed(self.FIELDS)),
+                      result)
+        self.assertIs(get_all_data("2223", "2", "ug", ROUND_FIELDS), full)
+
+    def test_iter_all_data_fields(self) -> None:
+        for course, full_course in zip(
+                iter_all_data("2223", "2", "ug", fields=self.FIELDS),
+                get_all_data("2223", "2", "ug")):
+            self.assert_projected(course, full_course)
+
+    def test_projected_query(self) -> None:
+        query, _ = _get_courses_query("2223", "2", "ug", (0, 1, 2, 3),
+                                      fields=("demand", "vacancy"))
+        self.assertIn("merged.Demand, merged.Vacancy", query)
+        self.assertNotIn("Quota_Exceeded", query)
+
+    def test_unknown_field(self) -> None:
+        with self.assertRaises(ValueError):
+            get_data("2223", "2", "ug", "CS2030S", fields=["demand", "seats"])
+        with self.assertRaises(ValueError):
+            get_all_data("2223", "2", "ug", ["seats"])
+
+
+class ConnectionPoolTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.pool = ConnectionPool(DATABASE_PATH, max_idle=2)
+
+    def tearDown(self) -> None:
+        self.pool.close()
+
+    def test_reuses_connection(self) -> None:
+        for _ in range(3):
+            with self.pool.connection() as conn:
+                get_data("2223", "2", "ug", "CS2030S", conn)
+        self.assertEqual(self.pool.stats(),
+                         {"opened": 1, "closed": 0, "reused": 2, "idle": 1})
+
+    def test_closes_connections_beyond_max_idle(self) -> None:
+        with self.pool.connection(), self.pool.connection(), \
+                self.pool.connection():
+            pass
+        self.assertEqual(self.pool.stats(),
+                         {"opened": 3, "closed": 1, "reused": 0, "idle": 2})
+
+        self.pool.close()
+        self.assertEqual(self.pool.stats(),
+                         {"opened": 3, "closed": 3, "reused": 0, "idle": 0})
+
+    def test_read_only(self) -> None:
+        with self.pool.connection() as conn, \
+                self.assertRaises(sqlite3.OperationalError):
+            conn.execute("DELETE FROM merged")
+
+    def test_threaded_get_data(self) -> None:
+        expected_data = get_data("2223", "2", "ug", "CS2030S")
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(
+                lambda _: get_data("2223", "2", "ug", "CS2030S"), range(64)))
+        for result in results:
+            self.assertEqual(result, expected_data)
+
+    def test_reads_database_rewritten_in_place(self) -> None:
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = Path(tempdir) / "database.db"
+            shutil.copyfile(DATABASE_PATH, path)
+            pool = ConnectionPool(path, max_idle=2)
+            count_query = "SELECT COUNT(*) FROM merged"
+            with pool.connection() as conn:
+                count = conn.execute(count_query).fetchone()[0]
+
+            # Rewrite the file as the build does, while the connection is idle
+            with sqlite3.connect(path) as writer:
+                writer.execute("DELETE FROM merged WHERE Year != '2223'")
+            writer.execute("VACUUM")
+            writer.close()
+
+            reader = sqlite3.connect(path)
+            expected_count = reader.execute(count_query).fetchone()[0]
+            reader.close()
+
+            with pool.connection() as conn:
+                self.assertEqual(conn.execute(count_query).fetchone()[0],
+                                 expected_count)
+                # Every page is read after the file shrank
+                conn.execute("SELECT * FROM merged").fetchall()
+            self.assertLess(expected_count, count)
+            self.assertEqual(pool.stats()["reused"], 1)
+            pool.close()
+
+    def test_discards_connections_borrowed_before_close(self) -> None:
+        with self.pool.connection():
+            self.pool.close()
+        self.assertEqual(self.pool.stats(),
+                         {"opened": 1, "closed": 1, "reused": 0, "idle": 0})
+
+
+class CatalogTestCase(unittest.TestCase):
+    def test_catalog_matches_pdfs(self) -> None:
+        catalog = get_catalog()
+        self.assertTrue(catalog.is_loaded)
+        for (year, semester, student_type, round_num), entry \
+                in catalog.entries.items():
+            pdf_filepath = get_pdf_filepath(year, semester, student_type, round_num)
+            self.assertEqual(entry.has_pdf, pdf_filepath.is_file())
+
+    def test_round_numbers(self) -> None:
+        self.assertEqual(get_round_numbers("2223"), (0, 1, 2, 3))
+        self.assertEqual(get_round_numbers("2425"), (1, 2, 3))
+        self.assertEqual(get_round_numbers("1819"), (1, 2, 3))
+
+    def test_pdf_exists(self) -> None:
+        self.assertTrue(pdf_exists("22/23", 2, "UG", 0))
+        self.assertFalse(pdf_exists("2223", 3, "ug", 0))
+        self.assertFalse(pdf_exists("2425", 1, "ug", 0))
+
+    def test_no_filesystem_access(self) -> None:
+        get_catalog()
+        with mock.patch.object(Path, "is_file", side_effect=AssertionError):
+            get_data("2223", "2", "ug", "CS2030S")
+            _load_all_data("2223", "2", "ug")
+
+
+def wait_for_waiters(flight: SingleFlight[list[CourseData]],
+                     waiting: int) -> None:
+    deadline = time.monotonic() + 5
+    while flight.stats()["waiting"] < waiting and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+
+class SingleFlightTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.flight: SingleFlight[list[CourseData]] = SingleFlight()
+        self.release = threading.Event()
+        self.computed = 0
+
+    def compute(self) -> list[CourseData]:
+        self.computed += 1
+        self.release.wait(5)
+        return []
+
+    def test_coalesces_concurrent_calls(self) -> None:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            futures = [executor.submit(self.flight.do, "key", self.compute)
+                       for _ in range(8)]
+            wait_for_waiters(self.flight, 7)
+            self.assertEqual(self.flight.stats(),
+                             {"calls": 8, "coalesced": 7, "in_flight": 1,
+                              "waiting": 7})
+            self.release.set()
+            results = [future.result() for future in futures]
+        self.assertEqual(self.computed, 1)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual(self.flight.stats()["in_flight"], 0)
+
+    def test_shares_errors(self) -> None:
+        def fail() -> list[CourseData]:
+            self.release.wait(5)
+            error_msg = "Data not found."
+            raise ValueError(error_msg)
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [executor.submit(self.flight.do, "key", fail)
+                       for _ in range(4)]
+            wait_for_waiters(self.flight, 3)
+            self.release.set()
+            for future in futures:
+                with self.assertRaises(ValueError):
+                    future.result()
+
+    def test_does_not_keep_results(self) -> None:
+        self.release.set()
+        self.flight.do("key", self.compute)
+        self.flight.do("key", self.compute)
+        self.flight.do("other", self.compute)
+        self.assertEqual(self.computed, 3)
+        self.assertEqual(self.flight.stats()["coalesced"], 0)
+
+    def test_term_data_cache_coalesces_misses(self) -> None:
+        cache = TermDataCache(DATABASE_PATH)
+        key = ("2223", "2", "ug", ROUND_FIELDS)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [executor.submit(cache.get, key,
+                                       lambda *_: self.compute())
+                       for _ in range(4)]
+            wait_for_waiters(cache.flights, 3)
+            self.release.set()
+            for future in futures:
+                future.result()
+        self.assertEqual(self.computed, 1)
+        stats = cache.stats()
+        self.assertEqual((stats["misses"], stats["coalesced"], stats["entries"]),
+                         (4, 3, 1))
+
+
+class InMemoryConnectionPoolTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tempdir.name) / "database.db"
+        shutil.copyfile(DATABASE_PATH, self.path)
+        self.pool = InMemoryConnectionPool(self.path, check_interval=0)
+
+    def tearDown(self) -> None:
+        self.pool.close()
+        self.tempdir.cleanup()
+
+    def set_title(self, title: str) -> None:
+        with sqlite3.connect(self.path) as conn:
+            conn.execute("UPDATE courses SET Title = ? WHERE Code = 'CS2030S'",
+                         (title,))
+        conn.close()
+
+    def get_title(self, conn: sqlite3.Connection) -> str:
+        return str(conn.execute("SELECT Title FROM courses WHERE Code = 'CS2030S'")
+                   .fetchone()[0])
+
+    def test_reads_from_memory(self) -> None:
+        with self.pool.connection() as conn:
+            expected = get_data("2223", "2", "ug", "CS2030S", conn)
+        self.path.unlink()
+        with self.pool.connection() as conn:
+            self.assertEqual(get_data("2223", "2", "ug", "CS2030S", conn),
+                             expected)
+        stats = self.pool.stats()
+        self.assertEqual((stats["loads"], stats["opened"], stats["reused"]),
+                         (1, 1, 1))
+        self.assertEqual(stats["bytes"], self.pool.size)
+        self.assertEqual(self.pool.size, DATABASE_PATH.stat().st_size)
+        self.assertGreater(self.pool.load_time, 0)
+
+    def test_reloads_when_file_changes(self) -> None:
+        with self.pool.connection() as old_conn:
+            self.set_title("Renamed")
+            with mock.patch("src.history.api.clear_caches") as clear_caches:
+                with self.pool.connection() as conn:
+                    self.assertEqual(self.get_title(conn), "Renamed")
+                clear_caches.assert_called_once()
+            # A connection borrowed before the reload reads the old copy
+            self.assertNotEqual(self.get_title(old_conn), "Renamed")
+        self.assertEqual(self.pool.stats()["loads"], 2)
+        # and is closed once returned
+        self.assertEqual(self.pool.stats()["idle"], 1)
+        self.assertFalse(self.pool.reload_if_changed())
+
+    def test_concurrent_reloads_load_once(self) -> None:
+        load = self.pool._load  # noqa: SLF001
+        threads = 8
+        barrier = threading.Barrier(threads)
+
+        def slow_load() -> None:
+            time.sleep(0.05)
+            load()
+
+        def reload_if_changed() -> bool:
+            barrier.wait()
+            return self.pool.reload_if_changed()
+
+        self.set_title("Renamed")
+        with mock.patch.object(self.pool, "_load", slow_load), \
+                mock.patch("src.history.api.clear_caches") as clear_caches, \
+                ThreadPoolExecutor(max_workers=threads) as executor:
+            reloaded = list(executor.map(lambda _: reload_if_changed(),
+                                         range(threads)))
+        self.assertEqual(reloaded.count(True), 1)
+        clear_caches.assert_called_once()
+        self.assertEqual(self.pool.stats()["loads"], 2)
+
+    def test_use_in_memory_database(self) -> None:
+        expected = get_data("2223", "2", "ug", "CS2030S")
+        with mock.patch("src.history.api.connection_pool", ConnectionPool(self.path)):
+            pool = use_in_memory_database(self.path)
+            try:
+                self.path.unlink()
+                self.assertEqual(get_data("2223", "2", "ug", "CS2030S"), expected)
+                self.assertGreater(pool.stats()["opened"], 0)
+            finally:
+                pool.close()
+                clear_caches()
+
+
+class LatestTermCacheTestCase(unittest.TestCase):
+    def test_no_probing_within_check_interval(self) -> None:
+        cache = LatestTermCache(check_interval=3600)
+        for _ in range(3):
+            self.assertEqual(cache.get(lambda: ("2223", "2")), ("2223", "2"))
+        self.assertEqual(cache.stats(),
+                         {"hits": 2, "computations": 1, "signature_checks": 1})
+
+    def test_recomputes_when_data_changes(self) -> None:
+        cache = LatestTermCache(check_interval=0)
+        with mock.patch("src.history.api.clear_caches") as clear_caches:
+            with mock.patch("src.history.api._get_data_signature",
+                            side_effect=[(1,), (1,), (2,)]):
+                self.assertEqual(cache.get(lambda: ("2223", "1")), ("2223", "1"))
+                self.assertEqual(cache.get(lambda: ("2223", "2")), ("2223", "1"))
+                self.assertEqual(cache.get(lambda: ("2223", "2")), ("2223", "2"))
+            clear_caches.assert_called_once()
+        self.assertEqual(cache.stats(),
+                         {"hits": 1, "computations": 2, "signature_checks": 3})
+
+    def test_computes_without_lock(self) -> None:
+        cache = LatestTermCache(check_interval=0)
+        computing = threading.Event()
+        release = threading.Event()
+
+        def compute() -> tuple[str, str]:
+            computing.set()
+            release.wait()
+            return ("2223", "2")
+
+        getter = threading.Thread(target=cache.get, args=(compute,))
+        getter.start()
+        computing.wait()
+        # The lock is free while the value is computed
+        stats = threading.Thread(target=cache.stats)
+        stats.start()
+        stats.join(timeout=5)
+        self.assertFalse(stats.is_alive())
+        release.set()
+        getter.join()
+        self.assertEqual(cache.value, ("2223", "2"))
+
+    def test_no_data_raises(self) -> None:
+        with mock.patch("src.history.api.pdf_exists", return_value=False), \
+                self.assertRaises(ValueError):
+            _find_latest_year_and_sem()
+
+
+class TermDataCacheTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tempdir.name) / "database.db"
+        self.path.write_bytes(b"1")
+
+    def tearDown(self) -> None:
+        self.tempdir.cleanup()
+
+    def test_get_all_data_canonical_key(self) -> None:
+        term_data_cache.clear()
+        before = term_data_cache.stats()
+        result = get_all_data("22/23", 2, "UG")
+        self.assertIs(get_all_data(2223, "2", "ug"), result)
+        self.assertIs(get_all_data("2223", " 2", "ug "), result)
+        after = term_data_cache.stats()
+        self.assertEqual(after["hits"] - before["hits"], 2)
+        self.assertEqual(after["misses"] - before["misses"], 1)
+
+    def test_evicts_least_recently_used(self) -> None:
+        courses = get_all_data("2223", "2", "ug")
+        cache = TermDataCache(self.path, max_bytes=2 * _estimate_size(courses))
+        for key in [("2223", "1", "ug", ROUND_FIELDS),
+                    ("2223", "2", "ug", ROUND_FIELDS),
+                    ("2223", "1", "ug", ROUND_FIELDS),
+                    ("2223", "1", "gd", ROUND_FIELDS)]:
+            cache.get(key, lambda *_: courses)
+        self.assertEqual(cache.stats(),
+                         {"hits": 1, "misses": 3, "evictions": 1,
+                          "invalidations": 0, "coalesced": 0, "entries": 2,
+                          "bytes": 2 * _estimate_size(courses)})
+        cache.get(("2223", "2", "ug", ROUND_FIELDS), lambda *_: [])
+        self.assertEqual(cache.stats()["misses"], 4)
+
+    def test_invalidates_when_database_changes(self) -> None:
+        courses = get_all_data("2223", "2", "ug")
+        cache = TermDataCache(self.path)
+        key = ("2223", "2", "ug", ROUND_FIELDS)
+        self.assertEqual(cache.get(key, lambda *_: []), [])
+        with mock.patch("src.history.api.clear_caches") as clear_caches:
+            self.assertEqual(cache.get(key, lambda *_: courses), [])
+            os.utime(self.path, ns=(0, 0))
+            self.assertIs(cache.get(key, lambda *_: courses), courses)
+            clear_caches.assert_called_once()
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["invalidations"]),
+                         (1, 2, 1))
+
+
+class InstrumentationTestCase(unittest.TestCase):
+    def test_get_data_metrics(self) -> None:
+        with instrument() as calls:
+            get_data("2223", "2", "ug", "CS2030S")
+        self.assertEqual(len(calls), 1)
+        metrics = calls[0]
+        self.assertEqual(metrics.function, "get_data")
+        self.assertEqual(metrics.sql_statements, 1)
+        self.assertGreater(metrics.rows, 0)
+        self.assertGreaterEqual(metrics.wall_time, metrics.sql_time)
+        self.assertGreater(metrics.sql_time, 0)
+
+    def test_get_all_data_cache_hits(self) -> None:
+        get_all_data("2223", "2", "ug")
+        with instrument() as calls:
+            get_all_data("2223", "2", "ug")
+            _get_set_of_all_codes("2223", "2", "ug")
+        self.assertEqual([metrics.function for metrics in calls],
+                         ["get_all_data", "_get_set_of_all_codes"])
+        self.assertEqual(calls[0].cache_hits, 1)
+        self.assertEqual(calls[0].stat_calls, 1)
+        self.assertEqual(calls[0].sql_statements, 0)
+        self.assertEqual(calls[1].sql_statements, 1)
+        self.assertEqual(calls[1].rows,
+                         len(_get_set_of_all_codes("2223", "2", "ug")))
+
+    def test_metrics_of_failed_call(self) -> None:
+        with instrument() as calls, self.assertRaises(ValueError):
+            get_data("2223", "2", "ug", "CC0092")
+        self.assertEqual(calls[0].rows, 0)
+        self.assertIn("sql_time", calls[0].as_dict())
+
+    def test_not_recorded_outside_block(self) -> None:
+        with instrument() as calls:
+            pass
+        get_data("2223", "2", "ug", "CS2030S")
+        self.assertEqual(calls, [])
+
 
 if __name__ == "__main__":
     unittest.main()
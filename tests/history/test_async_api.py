@@ -0,0 +1,127 @@
+import asyncio
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from src.history.api import (
+    DATABASE_PATH,
+    ConnectionPool,
+    CourseData,
+    _get_set_of_all_codes,
+    connection_pool,
+    get_all_data,
+    get_course_history,
+    get_data,
+    get_data_many,
+    get_latest_year_and_sem_with_data,
+    pdf_exists,
+    search_courses,
+)
+from src.history.async_api import AsyncHistoryAPI
+
+
+class AsyncHistoryAPITestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.api = AsyncHistoryAPI(max_workers=2, max_pending=3)
+
+    async def asyncTearDown(self) -> None:
+        await self.api.__aexit__(None, None, None)
+
+    async def test_matches_sync_api(self) -> None:
+        self.assertEqual(await self.api.get_data("22/23", 2, "UG", "cs2030s"),
+                         get_data("2223", "2", "ug", "CS2030S"))
+        self.assertEqual(await self.api.get_data_many("2223", "2", "ug",
+                                                      ["CS2102", "CC0092"]),
+                         get_data_many("2223", "2", "ug", ["CS2102", "CC0092"]))
+        self.assertEqual(await self.api.get_all_data(2223, "2", "ug"),
+                         get_all_data("2223", "2", "ug"))
+        self.assertEqual(await self.api.get_course_history("CS2030S"),
+                         get_course_history("CS2030S"))
+        self.assertEqual(await self.api.search_courses("programming"),
+                         search_courses("programming"))
+        self.assertEqual(await self.api.pdf_exists("2223", "2", "ug", 0),
+                         pdf_exists("2223", "2", "ug", 0))
+        self.assertEqual(await self.api.get_latest_year_and_sem_with_data(),
+                         get_latest_year_and_sem_with_data())
+
+    async def test_errors_match_sync_api(self) -> None:
+        with self.assertRaises(ValueError):
+            await self.api.get_data("2223", "2", "ug", "CC0092")
+        with self.assertRaises(ValueError):
+            await self.api.get_all_data("1819", "2", "ug")
+
+    async def test_gather_with_backpressure(self) -> None:
+        codes = sorted(_get_set_of_all_codes("2223", "2", "ug"))[:20]
+        opened = self.api.stats()["opened"]
+        results = await asyncio.gather(
+            *(self.api.get_data("2223", "2", "ug", code) for code in codes))
+        self.assertEqual(results,
+                         [get_data("2223", "2", "ug", code) for code in codes])
+
+        stats = self.api.stats()
+        self.assertEqual(stats["in_flight"], 0)
+        self.assertLessEqual(stats["peak_in_flight"], 3)
+        self.assertGreater(stats["waited"], 0)
+        self.assertLessEqual(stats["opened"] - opened, 2)
+
+    async def test_uses_active_connection_pool(self) -> None:
+        pool = ConnectionPool(DATABASE_PATH)
+        with mock.patch("src.history.api.connection_pool", pool):
+            self.assertIs(self.api.pool, pool)
+            self.assertEqual(await self.api.get_data("2223", "2", "ug", "CS2030S"),
+                             get_data("2223", "2", "ug", "CS2030S"))
+        self.assertGreater(pool.stats()["reused"], 0)
+        pool.close()
+
+    async def test_own_connection_pool(self) -> None:
+        async with AsyncHistoryAPI(path=DATABASE_PATH) as history_api:
+            self.assertIsNot(history_api.pool, connection_pool)
+            await history_api.get_data("2223", "2", "ug", "CS2030S")
+            self.assertEqual(history_api.stats()["opened"], 1)
+
+    async def test_own_database_is_kept_apart(self) -> None:
+        def get_title(courses: list[CourseData]) -> object:
+            return next(course["title"] for course in courses
+                        if course["code"] == "CS2030S")
+
+        expected_title = get_title(get_all_data("2223", "2", "ug"))
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = Path(tempdir) / "database.db"
+            shutil.copyfile(DATABASE_PATH, path)
+            conn = sqlite3.connect(path)
+            conn.execute("DROP TABLE payloads")
+            conn.execute("UPDATE courses SET Title = 'RENAMED' "
+                         "WHERE Code = 'CS2030S'")
+            conn.commit()
+            conn.close()
+
+            async with AsyncHistoryAPI(path=path) as history_api:
+                courses = await history_api.get_all_data("2223", "2", "ug")
+                self.assertEqual(get_title(courses), "RENAMED")
+                self.assertEqual(
+                    (await history_api.get_data("2223", "2", "ug",
+                                                "CS2030S"))["title"],
+                    "RENAMED")
+                self.assertIs(await history_api.get_all_data("2223", "2", "ug"),
+                              courses)
+
+        self.assertEqual(get_title(get_all_data("2223", "2", "ug")),
+                         expected_title)
+
+    async def test_does_not_block_event_loop(self) -> None:
+        release = threading.Event()
+        # _run() is the only way to run a call which blocks until released
+        call = asyncio.ensure_future(self.api._run(release.wait))  # noqa: SLF001
+        # The event loop keeps running while the call blocks its thread
+        await asyncio.sleep(0.01)
+        self.assertFalse(call.done())
+        release.set()
+        self.assertTrue(await call)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from src.history.api import DATABASE_PATH, get_all_data, get_data
+from src.history.columnar import ColumnarStore, export_columns
+
+
+class ColumnarTestCase(unittest.TestCase):
+    tempdir: tempfile.TemporaryDirectory[str]
+    store: ColumnarStore
+
+    @classmethod
+    def setUpClass(cls: type["ColumnarTestCase"]) -> None:
+        cls.tempdir = tempfile.TemporaryDirectory()
+        export_columns(Path(cls.tempdir.name))
+        cls.store = ColumnarStore(Path(cls.tempdir.name))
+
+    @classmethod
+    def tearDownClass(cls: type["ColumnarTestCase"]) -> None:
+        del cls.store
+        cls.tempdir.cleanup()
+
+    def test_get_data(self) -> None:
+        self.assertEqual(self.store.get_data("22/23", 2, "UG", "cs2030s"),
+                         get_data("2223", "2", "ug", "CS2030S"))
+
+    def test_get_data_multiple_class(self) -> None:
+        self.assertEqual(self.store.get_data("2223", "2", "ug", "CS2102"),
+                         get_data("2223", "2", "ug", "CS2102"))
+
+    def test_get_all_data(self) -> None:
+        for year, semester, ug_gd in (("2223", "2", "ug"),
+                                      ("2223", "1", "gd"),
+                                      ("2425", "1", "ug")):
+            self.assertEqual(self.store.get_all_data(year, semester, ug_gd),
+                             get_all_data(year, semester, ug_gd))
+
+    def test_bad_course_code(self) -> None:
+        with self.assertRaises(ValueError):
+            self.store.get_data("2223", "2", "ug", "CC0092")
+
+    def test_bad_year(self) -> None:
+        with self.assertRaises(ValueError):
+            self.store.get_all_data("1819", "2", "ug")
+
+    def test_reads_no_catalog(self) -> None:
+        expected = get_all_data("2223", "2", "ug")
+        with mock.patch("src.history.api.get_catalog",
+                        side_effect=AssertionError):
+            self.assertEqual(self.store.get_all_data("2223", "2", "ug"),
+                             expected)
+
+    def test_refuses_stale_columns(self) -> None:
+        with tempfile.TemporaryDirectory() as tempdir:
+            database_path = Path(tempdir) / "database.db"
+            path = Path(tempdir) / "columns"
+            shutil.copyfile(DATABASE_PATH, database_path)
+            export_columns(path, database_path)
+            store = ColumnarStore(path, database_path)
+            self.assertTrue(store.is_current())
+
+            with sqlite3.connect(database_path) as conn:
+                conn.execute("UPDATE courses SET Title = 'Renamed'")
+            conn.close()
+
+            self.assertFalse(store.is_current())
+            with self.assertRaises(RuntimeError):
+                store.get_data("2223", "2", "ug", "CS2030S")
+            with self.assertRaises(RuntimeError):
+                ColumnarStore(path, database_path)
+            del store
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from src.history.api import (
+    BLANK_ROUND,
+    DATABASE_PATH,
+    _get_set_of_all_codes,
+    _has_payloads,
+    _load_all_data,
+    _query_courses,
+    _query_payloads,
+    connection_pool,
+    get_all_data,
+    get_data,
+    get_data_many,
+    iter_all_data,
+)
+from src.history.payloads import _encode_payload
+
+
+class PayloadsTestCase(unittest.TestCase):
+    def test_has_payloads(self) -> None:
+        self.assertTrue(_has_payloads())
+
+    def test_payloads_match_assembly(self) -> None:
+        with connection_pool.connection() as conn:
+            terms = conn.execute("""
+                SELECT DISTINCT Year, Semester, Student_Type FROM merged
+            """).fetchall()
+            for year, semester, student_type in terms:
+                with self.subTest(term=(year, semester, student_type)):
+                    expected = list(_query_courses(conn, year, semester,
+                                                   student_type))
+                    codes = [str(course["code"]) for course in expected]
+                    self.assertEqual(list(_query_payloads(conn, year, semester,
+                                                          student_type, codes)),
+                                     expected)
+
+    def test_get_data_matches_assembly(self) -> None:
+        codes = sorted(_get_set_of_all_codes("2223", "2", "ug"))
+        with mock.patch("src.history.api._has_payloads", return_value=False):
+            expected = [get_data("2223", "2", "ug", code) for code in codes]
+            expected_many = get_data_many("2223", "2", "ug", codes)
+        self.assertEqual([get_data("2223", "2", "ug", code) for code in codes],
+                         expected)
+        self.assertEqual(get_data_many("2223", "2", "ug", codes), expected_many)
+
+    def test_get_all_data_matches_assembly(self) -> None:
+        fields = ("demand", "vacancy")
+        with mock.patch("src.history.api._has_payloads", return_value=False):
+            expected = _load_all_data("2223", "2", "ug")
+            expected_fields = list(iter_all_data("2223", "2", "ug",
+                                                 fields=fields))
+        with mock.patch("src.history.api._query_courses") as query_courses:
+            self.assertEqual(_load_all_data("2223", "2", "ug"), expected)
+            self.assertEqual(list(iter_all_data("2223", "2", "ug",
+                                                fields=fields)),
+                             expected_fields)
+        query_courses.assert_not_called()
+
+    def test_database_without_payloads(self) -> None:
+        expected = get_data("2223", "2", "ug", "CS2030S")
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = Path(tempdir) / "database.db"
+            shutil.copyfile(DATABASE_PATH, path)
+            conn = sqlite3.connect(path)
+            conn.execute("DROP TABLE payloads")
+            conn.execute("DROP TABLE catalog")
+            conn.execute("UPDATE courses SET Title = 'Renamed' "
+                         "WHERE Code = 'CS2030S'")
+            conn.commit()
+
+            self.assertFalse(_has_payloads(conn))
+            self.assertTrue(_has_payloads())
+            self.assertEqual(get_data("2223", "2", "ug", "CS2030S", conn),
+                             {**expected, "title": "Renamed"})
+            conn.close()
+
+    def test_blank_rounds_are_shared(self) -> None:
+        padded = [course for course in get_all_data("2223", "2", "ug")
+                  if "null" in _encode_payload(course)]
+        self.assertTrue(padded)
+        course = get_data("2223", "2", "ug", str(padded[0]["code"]))
+        self.assertEqual(course, padded[0])
+        self.assertTrue(any(round_data is BLANK_ROUND
+                            for rounds in course["classes"].values()  # type: ignore[union-attr]
+                            for round_data in rounds))
+
+
+if __name__ == "__main__":
+    unittest.main()
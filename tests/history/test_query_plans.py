@@ -0,0 +1,99 @@
+import sqlite3
+import unittest
+from collections.abc import Sequence
+from typing import Union
+
+from src.history.api import (
+    _ALL_CODES_QUERY,
+    _COURSE_HISTORY_QUERY,
+    BASE_DIR,
+    _get_courses_query,
+    _get_deltas_query,
+    _get_payloads_query,
+    _get_top_classes_query,
+)
+
+
+class QueryPlanTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.conn = sqlite3.connect(BASE_DIR / "database.db")
+
+    def tearDown(self) -> None:
+        self.conn.close()
+
+    def get_plan(self, query: str, params: Sequence[Union[str, int]]) -> list[str]:
+        cursor = self.conn.execute(f"EXPLAIN QUERY PLAN {query}", params)
+        return [row[3] for row in cursor.fetchall()]
+
+    def assert_uses_indexes(self, plan: list[str], table: str = "merged") -> None:
+        for detail in plan:
+            # A full scan would read "SCAN merged" without an index
+            if detail.startswith("SCAN"):
+                self.fail(f"Full table scan in query plan: {plan}")
+            self.assertNotIn("TEMP B-TREE", detail)
+        self.assertTrue(any(f"{table} USING PRIMARY KEY" in detail
+                            or f"{table} USING INDEX" in detail
+                            or f"{table} USING COVERING INDEX" in detail
+                            for detail in plan))
+
+    def test_get_data_uses_index(self) -> None:
+        plan = self.get_plan(*_get_courses_query(
+            "2223", "2", "ug", (0, 1, 2, 3), ("CS2030S",)))
+        self.assert_uses_indexes(plan)
+
+    def test_get_all_data_uses_index(self) -> None:
+        plan = self.get_plan(*_get_courses_query(
+            "2223", "2", "ug", (0, 1, 2, 3)))
+        self.assert_uses_indexes(plan)
+
+    def test_get_data_many_uses_index(self) -> None:
+        plan = self.get_plan(*_get_courses_query(
+            "2223", "2", "ug", (0, 1, 2, 3), ("CS2030S", "CS2102", "PF1101")))
+        self.assert_uses_indexes(plan)
+
+    def test_get_set_of_all_codes_uses_index(self) -> None:
+        plan = self.get_plan(_ALL_CODES_QUERY, ("2223", "2", "ug"))
+        self.assert_uses_indexes(plan)
+
+    def test_get_course_history_uses_index(self) -> None:
+        plan = self.get_plan(_COURSE_HISTORY_QUERY, ("CS2030S",))
+        self.assert_uses_indexes(plan)
+
+    def test_get_payloads_uses_index(self) -> None:
+        plan = self.get_plan(*_get_payloads_query(
+            "2223", "2", "ug", ("CS2030S", "CS2102")))
+        self.assert_uses_indexes(plan, "payloads")
+
+    def test_get_payloads_of_term_uses_index(self) -> None:
+        plan = self.get_plan(*_get_payloads_query("2223", "2", "ug"))
+        self.assert_uses_indexes(plan, "payloads")
+
+    def test_get_top_classes_uses_index(self) -> None:
+        plan = self.get_plan(*_get_top_classes_query(
+            "2223", "2", "ug", 1, "demand_ratio", 10))
+        self.assert_uses_indexes(plan, "rankings")
+
+    def test_get_top_classes_of_faculty_uses_index(self) -> None:
+        plan = self.get_plan(*_get_top_classes_query(
+            "2223", "2", "ug", 1, "quota_exceeded", 10, "School of Computing"))
+        self.assert_uses_indexes(plan, "rankings")
+
+    def test_get_round_deltas_uses_index(self) -> None:
+        plan = self.get_plan(*_get_deltas_query(
+            "2223", "2", "ug", (0, 1, 2, 3)))
+        self.assert_uses_indexes(plan, "deltas")
+
+    def test_get_round_deltas_between_rounds_uses_index(self) -> None:
+        plan = self.get_plan(*_get_deltas_query(
+            "2223", "2", "ug", (0, 1, 2, 3), 1, 2, None, 0,
+            vacancy_dropped=True))
+        self.assert_uses_indexes(plan, "deltas")
+
+    def test_get_round_deltas_of_codes_uses_index(self) -> None:
+        plan = self.get_plan(*_get_deltas_query(
+            "2223", "2", "ug", (0, 1, 2, 3), codes=("CS2030S", "CS2102")))
+        self.assert_uses_indexes(plan, "deltas")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import json
+import marshal
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from src.history.api import (
+    DATABASE_PATH,
+    ConnectionPool,
+    _get_snapshot_path,
+    _get_snapshot_version,
+    _hash_database,
+    _load_all_data,
+    _load_snapshot,
+    clear_caches,
+    connection_pool,
+    get_all_data,
+)
+from src.history.snapshots import create_snapshots
+
+
+class SnapshotsTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.path = Path(temp_dir.name)
+        create_snapshots(self.path)
+
+        patcher = mock.patch("src.history.api.SNAPSHOTS_DIR", self.path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(clear_caches)
+        clear_caches()
+
+    def _write_manifest(self, **changes: object) -> None:
+        manifest_path = self.path / "manifest.json"
+        manifest = json.loads(manifest_path.read_text())
+        manifest.update(changes)
+        manifest_path.write_text(json.dumps(manifest))
+        _get_snapshot_version.cache_clear()
+
+    def test_snapshots_match_database(self) -> None:
+        with connection_pool.connection() as conn:
+            terms = conn.execute("""
+                SELECT DISTINCT Year, Semester, Student_Type FROM merged
+            """).fetchall()
+        for year, semester, student_type in terms:
+            with self.subTest(term=(year, semester, student_type)):
+                self.assertEqual(_load_snapshot(year, semester, student_type),
+                                 _load_all_data(year, semester, student_type))
+
+    def test_term_without_data(self) -> None:
+        self.assertFalse(_get_snapshot_path("1819", "2", "ug", self.path).exists())
+        self.assertIsNone(_load_snapshot("1819", "2", "ug"))
+        with self.assertRaises(ValueError):
+            get_all_data("1819", "2", "ug")
+
+    def test_get_all_data_loads_snapshot(self) -> None:
+        fields = ("demand", "vacancy")
+        expected = _load_all_data("2223", "2", "ug")
+        expected_fields = _load_all_data("2223", "2", "ug", fields)
+        clear_caches()
+        with mock.patch("src.history.api._load_all_data") as load_all_data:
+            self.assertEqual(get_all_data("2223", "2", "ug"), expected)
+            self.assertEqual(get_all_data("22/23", 2, "ug", fields),
+                             expected_fields)
+        load_all_data.assert_not_called()
+
+    def test_missing_snapshots(self) -> None:
+        with mock.patch("src.history.api.SNAPSHOTS_DIR", self.path / "missing"):
+            _get_snapshot_version.cache_clear()
+            self.assertIsNone(_load_snapshot("2223", "2", "ug"))
+
+    def test_copied_database_is_hashed(self) -> None:
+        self._write_manifest(mtime_ns=0)
+        with mock.patch("src.history.api._hash_database",
+                        wraps=_hash_database) as hash_database:
+            self.assertIsNotNone(_load_snapshot("2223", "2", "ug"))
+            self.assertIsNotNone(_load_snapshot("2223", "1", "ug"))
+        hash_database.assert_called_once_with(DATABASE_PATH)
+
+    def test_other_database_ignores_snapshots(self) -> None:
+        path = self.path / "copy.db"
+        shutil.copyfile(DATABASE_PATH, path)
+        with mock.patch("src.history.api.connection_pool", ConnectionPool(path)):
+            # A copy has the same hash, so the snapshots still apply
+            self.assertIsNotNone(_load_snapshot("2223", "2", "ug"))
+            path.write_bytes(path.read_bytes() + bytes(4096))
+            _get_snapshot_version.cache_clear()
+            self.assertIsNone(_load_snapshot("2223", "2", "ug"))
+
+    def test_stale_manifest_falls_back(self) -> None:
+        expected = _load_all_data("2223", "2", "ug")
+        self._write_manifest(mtime_ns=0, database="0" * 64)
+        self.assertIsNone(_load_snapshot("2223", "2", "ug"))
+        self.assertEqual(get_all_data("2223", "2", "ug"), expected)
+
+        self._write_manifest(size=0)
+        self.assertIsNone(_load_snapshot("2223", "2", "ug"))
+
+    def test_stale_snapshot_falls_back(self) -> None:
+        snapshot_path = _get_snapshot_path("2223", "2", "ug", self.path)
+        _, courses = marshal.loads(snapshot_path.read_bytes())  # noqa: S302
+        snapshot_path.write_bytes(marshal.dumps(("0" * 64, courses)))
+        self.assertIsNone(_load_snapshot("2223", "2", "ug"))
+
+        snapshot_path.write_bytes(b"not a snapshot")
+        self.assertIsNone(_load_snapshot("2223", "2", "ug"))
+        self.assertTrue(get_all_data("2223", "2", "ug"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,12 @@
+import threading
+import time
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import closing
+from unittest import mock
 
-from src.web.app import app
+from src.history import api
+from src.web.app import _render_history, app, render_flight, stream_history
 
 
 class AppTestCase(unittest.TestCase):
@@ -28,10 +33,74 @@ class AppTestCase(unittest.TestCase):
         response = self.app.post("/", data=data, follow_redirects=True)
         self.assertEqual(response.status_code, 200)
 
+    def test_fallback_renders_are_coalesced(self) -> None:
+        release = threading.Event()
+        renders = []
+
+        def render(*args: str) -> str:
+            renders.append(args)
+            release.wait(5)
+            return "page"
+
+        def post() -> bytes:
+            data = {"year": "1819", "semester": "1", "type": "ug"}
+            return app.test_client().post("/", data=data).get_data()
+
+        requests = 4
+        before = render_flight.stats()["coalesced"]
+        with mock.patch("src.web.app._render_history", render), \
+                ThreadPoolExecutor(max_workers=requests) as executor:
+            futures = [executor.submit(post) for _ in range(requests)]
+            deadline = time.monotonic() + 5
+            while (render_flight.stats()["waiting"] < requests - 1
+                   and time.monotonic() < deadline):
+                time.sleep(0.001)
+            release.set()
+            self.assertEqual([future.result() for future in futures],
+                             [b"page"] * requests)
+        self.assertEqual(renders, [("1819", "1", "ug")])
+        self.assertEqual(render_flight.stats()["coalesced"] - before,
+                         requests - 1)
+
+    def test_fallback_renders_are_cached(self) -> None:
+        data = {"year": "2223", "semester": "2", "type": "ug"}
+        api.clear_caches()
+        page = self.app.post("/", data=data).get_data()
+        hits = api.term_data_cache.stats()["hits"]
+        self.assertEqual(self.app.post("/", data=data).get_data(), page)
+        self.assertEqual(api.term_data_cache.stats()["hits"], hits + 1)
+
+    def test_streamed_page_matches_render(self) -> None:
+        for term in (("2223", "2", "ug"), ("1819", "1", "ug")):
+            data = dict(zip(("year", "semester", "type"), term))
+            with self.subTest(term=term), \
+                    app.test_request_context("/", method="POST", data=data):
+                self.assertEqual("".join(stream_history(*term)),
+                                 _render_history(*term))
+
+    def test_streamed_page_does_not_get_all_data(self) -> None:
+        data = {"year": "2223", "semester": "2", "type": "ug"}
+        with app.test_request_context("/", method="POST", data=data), \
+                mock.patch("src.web.app.get_all_data",
+                           side_effect=AssertionError):
+            self.assertIn("<", "".join(stream_history("2223", "2", "ug")))
+
     def test_serve_pdf(self) -> None:
         with closing(self.app.get("/pdfs/2324/1/ug/round_1.pdf")) as response:
             self.assertEqual(response.status_code, 200)
 
+    def test_search(self) -> None:
+        response = self.app.get("/search?year=2223&semester=2&type=ug&q=cs2030%20pf")
+        self.assertEqual(response.status_code, 200)
+        codes = [course["code"] for course in response.get_json()]
+        self.assertIn("CS2030S", codes)
+        self.assertIn("PF1101", codes)
+        self.assertTrue(all(code.startswith(("CS2030", "PF")) for code in codes))
+
+    def test_search_no_data(self) -> None:
+        response = self.app.get("/search?year=1819&semester=2&type=ug&q=cs")
+        self.assertEqual(response.status_code, 404)
+
     def test_invalid_route(self) -> None:
         response = self.app.get("/invalid_route")
         self.assertEqual(response.status_code, 404)